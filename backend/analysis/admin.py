@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Insight, ChatMessage
+from .models import Insight, ChatMessage, InsightJob, ConversationMemory
 
 @admin.register(Insight)
 class InsightAdmin(admin.ModelAdmin):
@@ -10,3 +10,12 @@ class InsightAdmin(admin.ModelAdmin):
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'role', 'timestamp')
     list_filter  = ('role',)
+
+@admin.register(InsightJob)
+class InsightJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'insight_type', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter  = ('status', 'insight_type')
+
+@admin.register(ConversationMemory)
+class ConversationMemoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'summarized_until', 'updated_at')
@@ -0,0 +1,281 @@
+"""
+Motor local (pandas/NumPy) para os insights de resumo, previsão e anomalia.
+
+Os números vêm daqui, de forma determinística e vetorizada sobre todo o
+histórico do usuário; o Gemini, quando configurado, só escreve o texto.
+
+- Gasto móvel por categoria: soma em janela deslizante sobre os totais
+  diários (DailySummary), comparando a janela atual com a anterior.
+- Previsão sazonal: totais mensais por categoria, nível recente mais
+  tendência, multiplicados pelo índice sazonal do mês (quando há pelo
+  menos dois anos de histórico).
+- Anomalias: z-score e regra do IQR por categoria sobre os valores de
+  todas as despesas, sinalizando as transações recentes fora do padrão.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from finances.models import Category, DailySummary, Transaction
+from finances.services import user_timezone
+
+UNCATEGORIZED = 'Sem categoria'
+
+
+def _config(key):
+    return settings.ANALYTICS[key]
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _rows(queryset):
+    """
+    Executa a query direto no cursor: evita montar um objeto/tupla Django
+    por linha, o que domina o tempo com centenas de milhares de linhas.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def daily_frame(user):
+    """
+    Totais diários de despesas do usuário: DataFrame dia x categoria.
+    """
+    rows = (
+        DailySummary.objects.filter(user=user, type=Category.EXPENSE)
+        .values_list('day', 'category__name', 'total')
+    )
+    frame = pd.DataFrame.from_records(rows, columns=['day', 'category', 'total'])
+    if frame.empty:
+        return pd.DataFrame(dtype=float)
+    frame['category'] = frame['category'].fillna(UNCATEGORIZED)
+    frame['total'] = frame['total'].astype(float)
+    table = frame.pivot_table(index='day', columns='category', values='total', aggfunc='sum', fill_value=0.0)
+    table.index = pd.DatetimeIndex(table.index)
+    return table
+
+
+def rolling_spend(daily, today):
+    """
+    Gasto dos últimos N dias (ANALYTICS['ROLLING_DAYS']) por categoria
+    contra os N dias anteriores.
+    """
+    window = _config('ROLLING_DAYS')
+    if daily.empty:
+        return {'window_days': window, 'categories': []}
+    end = pd.Timestamp(today)
+    days = pd.date_range(end - pd.Timedelta(days=2 * window - 1), end, freq='D')
+    rolling = daily.reindex(days, fill_value=0.0).rolling(window, min_periods=1).sum()
+    current, previous = rolling.iloc[-1].to_numpy(), rolling.iloc[window - 1].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+    order = np.argsort(-current)
+    categories = [
+        {
+            'category': rolling.columns[i],
+            'current': _money(current[i]),
+            'previous': _money(previous[i]),
+            'change_pct': None if np.isnan(change[i]) else round(float(change[i]), 1),
+        }
+        for i in order if current[i] or previous[i]
+    ]
+    return {
+        'window_days': window,
+        'total_current': _money(current.sum()),
+        'total_previous': _money(previous.sum()),
+        'categories': categories,
+    }
+
+
+def seasonal_forecast(daily, today):
+    """
+    Previsão das despesas dos próximos ANALYTICS['FORECAST_MONTHS'] meses
+    por categoria, considerando só os meses já fechados.
+    """
+    horizon = _config('FORECAST_MONTHS')
+    current_month = pd.Period(today, freq='M')
+    if daily.empty:
+        return {'method': 'sem histórico', 'months': [], 'categories': []}
+
+    monthly = daily.groupby(daily.index.to_period('M')).sum()
+    months = pd.period_range(monthly.index.min(), current_month - 1, freq='M')
+    future = pd.period_range(current_month, periods=horizon, freq='M')
+    if len(months) == 0:
+        return {'method': 'sem histórico', 'months': [str(m) for m in future], 'categories': []}
+    values = monthly.reindex(months, fill_value=0.0).to_numpy().T  # categoria x mês
+
+    # Índice sazonal por mês do ano (média do mês / média geral), com 2+ anos
+    month_of_year = months.month.to_numpy() - 1
+    seasonal = np.ones((values.shape[0], 12))
+    if len(months) >= 24:
+        overall = values.mean(axis=1, keepdims=True)
+        for moy in range(12):
+            mask = month_of_year == moy
+            with np.errstate(divide='ignore', invalid='ignore'):
+                seasonal[:, moy] = np.where(overall[:, 0] > 0, values[:, mask].mean(axis=1) / overall[:, 0], 1.0)
+        method = 'nível + tendência com sazonalidade mensal'
+    else:
+        method = 'nível + tendência (histórico curto para sazonalidade)'
+
+    deseasonalized = values / np.take(seasonal, month_of_year, axis=1).clip(min=1e-9)
+    recent = deseasonalized[:, -12:]
+    level = recent[:, -3:].mean(axis=1)
+    x = np.arange(recent.shape[1]) - (recent.shape[1] - 1) / 2
+    slope = (recent - recent.mean(axis=1, keepdims=True)) @ x / (x @ x) if len(x) > 1 else np.zeros(len(level))
+
+    steps = np.arange(1, horizon + 1)
+    forecast = (level[:, None] + slope[:, None] * steps) * seasonal[:, future.month.to_numpy() - 1]
+    forecast = forecast.clip(min=0)
+
+    order = np.argsort(-forecast.sum(axis=1))
+    return {
+        'method': method,
+        'history_months': len(months),
+        'months': [str(m) for m in future],
+        'total': [_money(v) for v in forecast.sum(axis=0)],
+        'categories': [
+            {'category': monthly.columns[i], 'forecast': [_money(v) for v in forecast[i]]}
+            for i in order if forecast[i].any()
+        ],
+    }
+
+
+def _arrays(queryset, columns):
+    """
+    Linhas da query como uma matriz float (uma coluna por campo).
+    """
+    rows = _rows(queryset.values_list(*columns))
+    return np.array(rows, dtype=float).reshape(len(rows), len(columns))
+
+
+def category_stats(categories, amounts):
+    """
+    Média, desvio padrão, quantidade e limite superior do IQR (Q3 + 1,5·IQR)
+    de cada categoria, em uma passada vetorizada sobre todos os valores.
+    """
+    keys, group = np.unique(categories, return_inverse=True)
+    counts = np.bincount(group, minlength=len(keys))
+    mean = np.bincount(group, weights=amounts, minlength=len(keys)) / np.maximum(counts, 1)
+    var = np.bincount(group, weights=amounts ** 2, minlength=len(keys)) / np.maximum(counts, 1) - mean ** 2
+    if len(keys):
+        quartiles = pd.Series(amounts).groupby(group).quantile([0.25, 0.75]).unstack().to_numpy()
+    else:
+        quartiles = np.empty((0, 2))
+    upper = quartiles[:, 1] + 1.5 * (quartiles[:, 1] - quartiles[:, 0])
+    return keys, counts, mean, np.sqrt(np.clip(var, 0, None)), upper
+
+
+def flag_anomalies(stats, categories, amounts):
+    """
+    (z, acima_do_iqr) de cada valor em relação às estatísticas da sua categoria.
+    Categorias com menos de ANALYTICS['ANOMALY_MIN_COUNT'] transações não
+    têm base para comparação e nunca são sinalizadas.
+    """
+    keys, counts, mean, std, upper = stats
+    if len(amounts) == 0 or len(keys) == 0:
+        return np.zeros(len(amounts)), np.zeros(len(amounts), dtype=bool)
+    group = np.searchsorted(keys, categories).clip(max=len(keys) - 1)
+    known = keys[group] == categories
+    enough = known & (counts[group] >= _config('ANOMALY_MIN_COUNT')) & (std[group] > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(enough, (amounts - mean[group]) / std[group], 0.0)
+    return z, enough & (amounts > upper[group])
+
+
+def anomalies(user, today):
+    """
+    Despesas dos últimos ANALYTICS['ANOMALY_DAYS'] dias fora do padrão
+    da categoria, comparadas com todo o histórico.
+    """
+    tz = user_timezone(user)
+    days = _config('ANOMALY_DAYS')
+    since = timezone.make_aware(datetime.combine(today - timedelta(days=days - 1), time.min), tz)
+    expenses = Transaction.objects.filter(user=user, type=Category.EXPENSE)
+
+    # Histórico completo só com (categoria, valor); as recentes vêm pelo índice de data
+    history = _arrays(expenses.annotate(cat=Coalesce('category_id', 0)), ['cat', 'amount'])
+    recent = _arrays(
+        expenses.filter(timestamp__gte=since).annotate(cat=Coalesce('category_id', 0)),
+        ['id', 'cat', 'amount']
+    )
+    stats = category_stats(history[:, 0], history[:, 1])
+    z, above_iqr = flag_anomalies(stats, recent[:, 1], recent[:, 2])
+
+    threshold = _config('ANOMALY_Z')
+    flagged = np.flatnonzero((z >= threshold) | above_iqr)
+    flagged = flagged[np.argsort(-z[flagged], kind='stable')]
+    top = flagged[:_config('ANOMALY_LIMIT')]
+
+    details = {
+        t.id: t for t in Transaction.objects.filter(id__in=recent[top, 0].astype(int).tolist())
+        .select_related('category').only('id', 'timestamp', 'raw_text', 'category__name')
+    }
+    items = []
+    for i in top:
+        t = details[int(recent[i, 0])]
+        reasons = [name for name, hit in (('zscore', z[i] >= threshold), ('iqr', above_iqr[i])) if hit]
+        items.append({
+            'transaction': t.id,
+            'date': timezone.localtime(t.timestamp, tz).date().isoformat(),
+            'category': t.category.name if t.category else UNCATEGORIZED,
+            'amount': _money(recent[i, 2]),
+            'z': round(float(z[i]), 2),
+            'flags': reasons,
+            'text': t.raw_text[:80],
+        })
+    return {
+        'window_days': days,
+        'z_threshold': threshold,
+        'scanned': int(len(history)),
+        'flagged': int(len(flagged)),
+        'items': items,
+    }
+
+
+def analyze(user, insight_type, today=None):
+    """
+    Resultado estruturado (vai em Insight.data) para o tipo de insight.
+    """
+    today = today or timezone.localdate(timezone=user_timezone(user))
+    if insight_type == 'anomaly':
+        return anomalies(user, today)
+    daily = daily_frame(user)
+    if insight_type == 'forecast':
+        return seasonal_forecast(daily, today)
+    return rolling_spend(daily, today)
+
+
+def describe(insight_type, data) -> str:
+    """
+    Texto curto gerado localmente, usado quando o Gemini não está disponível.
+    """
+    if insight_type == 'anomaly':
+        if not data['items']:
+            return f"Nenhuma despesa fora do padrão nos últimos {data['window_days']} dias."
+        first = data['items'][0]
+        return (
+            f"{data['flagged']} despesa(s) fora do padrão nos últimos {data['window_days']} dias. "
+            f"A maior: R$ {first['amount']:.2f} em {first['category']} ({first['date']})."
+        )
+    if insight_type == 'forecast':
+        if not data['categories']:
+            return "Ainda não há histórico suficiente para uma previsão."
+        return f"Despesas previstas para {data['months'][0]}: R$ {data['total'][0]:.2f}."
+    if not data['categories']:
+        return "Nenhuma despesa registrada no período."
+    top = data['categories'][0]
+    return (
+        f"Nos últimos {data['window_days']} dias você gastou R$ {data['total_current']:.2f} "
+        f"(antes: R$ {data['total_previous']:.2f}). Maior categoria: {top['category']} "
+        f"com R$ {top['current']:.2f}."
+    )
@@ -0,0 +1,143 @@
+"""
+Fila de geração de insights guardada no banco (InsightJob).
+
+A API só enfileira o pedido; o comando run_insight_worker reserva os jobs
+e chama o Gemini em threads próprias. A reserva é um UPDATE condicional
+(funciona em SQLite e Postgres) que grava um token e um prazo (lease): se
+o worker morrer, o job volta a ficar disponível quando o prazo vencer, e
+o resultado só é gravado se o token ainda for o dele. Assim uma nova
+tentativa nunca gera um segundo insight para o mesmo job.
+"""
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core import gemini, metrics
+from .models import Insight, InsightJob
+from .services import compose_insight
+
+logger = logging.getLogger(__name__)
+
+
+def _config(key):
+    return settings.INSIGHT_JOBS[key]
+
+
+def enqueue_insight(user, insight_type: str):
+    """
+    Cria um job pendente, ou devolve o job ativo que já existe para o
+    mesmo usuário e tipo (pedidos repetidos não duplicam o trabalho).
+    Retorna (job, created).
+    """
+    active = InsightJob.objects.filter(
+        user=user, insight_type=insight_type, status__in=InsightJob.ACTIVE_STATUSES
+    )
+    job = active.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = InsightJob.objects.create(user=user, insight_type=insight_type)
+    except IntegrityError:
+        # Outra requisição criou o job ao mesmo tempo
+        return active.get(), False
+    metrics.incr('insight_jobs.enqueued')
+    return job, True
+
+
+def claim_job():
+    """
+    Reserva o próximo job disponível: pendente e liberado, ou em execução
+    com o lease vencido. Retorna o job (com lease_token preenchido) ou None.
+    Jobs com lease vencido que já usaram MAX_ATTEMPTS (o worker morreu ou
+    travou em todas) são marcados como falhos em vez de reservados.
+    """
+    now = timezone.now()
+    expired = Q(status=InsightJob.RUNNING, lease_expires_at__lt=now)
+    exhausted = InsightJob.objects.filter(expired, attempts__gte=_config('MAX_ATTEMPTS')).update(
+        status=InsightJob.FAILED,
+        error='Prazo do worker vencido em todas as tentativas.',
+        finished_at=now,
+    )
+    if exhausted:
+        logger.warning("%s insight job(s) falharam por lease vencido após %s tentativas", exhausted, _config('MAX_ATTEMPTS'))
+        metrics.incr('insight_jobs.failed', exhausted)
+    available = InsightJob.objects.filter(
+        Q(status=InsightJob.PENDING, available_at__lte=now)
+        | (expired & Q(attempts__lt=_config('MAX_ATTEMPTS')))
+    )
+    for job_id in available.order_by('available_at', 'id').values_list('id', flat=True)[:10]:
+        token = uuid.uuid4().hex
+        claimed = available.filter(id=job_id).update(
+            status=InsightJob.RUNNING,
+            lease_token=token,
+            lease_expires_at=now + timedelta(seconds=_config('LEASE_SECONDS')),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return InsightJob.objects.select_related('user').get(id=job_id)
+        # Outro worker pegou este job primeiro: tenta o próximo
+    return None
+
+
+def _owned(job):
+    return InsightJob.objects.filter(id=job.id, status=InsightJob.RUNNING, lease_token=job.lease_token)
+
+
+def run_job(job):
+    """
+    Gera o insight de um job reservado por claim_job. Falhas temporárias
+    voltam para a fila com atraso; GeminiUnavailable ou o limite de
+    tentativas marcam o job como falho.
+    """
+    try:
+        content, data = compose_insight(job.user, job.insight_type)
+    except Exception as exc:
+        retry = not isinstance(exc, gemini.GeminiUnavailable) and job.attempts < _config('MAX_ATTEMPTS')
+        logger.warning("Insight job %s falhou (tentativa %s): %s", job.id, job.attempts, exc)
+        if retry:
+            updated = _owned(job).update(
+                status=InsightJob.PENDING,
+                error=str(exc),
+                available_at=timezone.now() + timedelta(seconds=_config('RETRY_DELAY_SECONDS') * job.attempts),
+            )
+            metrics.incr('insight_jobs.retried', updated)
+        else:
+            updated = _owned(job).update(status=InsightJob.FAILED, error=str(exc), finished_at=timezone.now())
+            metrics.incr('insight_jobs.failed', updated)
+        return False
+
+    with transaction.atomic():
+        insight = Insight.objects.create(user=job.user, insight_type=job.insight_type, content=content, data=data)
+        updated = _owned(job).update(
+            status=InsightJob.DONE, insight=insight, error='', finished_at=timezone.now()
+        )
+        if not updated:
+            # O lease venceu e outro worker assumiu o job: descarta este resultado
+            transaction.set_rollback(True)
+            metrics.incr('insight_jobs.discarded')
+            return False
+    metrics.incr('insight_jobs.done')
+    return True
+
+
+def run_worker(stop_event: threading.Event, once=False):
+    """
+    Laço de um worker: reserva e executa jobs até stop_event ser acionado
+    (ou até a fila esvaziar, com once=True).
+    """
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_job()
+        if job is None:
+            if once:
+                break
+            stop_event.wait(_config('POLL_INTERVAL'))
+            continue
+        run_job(job)
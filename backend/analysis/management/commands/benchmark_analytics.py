@@ -0,0 +1,88 @@
+import json
+import random
+import resource
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from analysis import analytics
+from finances.models import Category, Transaction
+from finances.services import rebuild_daily_summary
+
+SEED_CHUNK = 50_000
+
+
+def seed(user, rows, categories, years, seed=42):
+    """
+    Cria `rows` despesas espalhadas pelos últimos `years` anos, com um
+    padrão sazonal e alguns valores bem acima da média.
+    """
+    rng = random.Random(seed)
+    cats = [
+        Category.objects.create(user=user, name=f'Categoria {i}', type=Category.EXPENSE)
+        for i in range(categories)
+    ]
+    now = timezone.now()
+    minutes = years * 365 * 24 * 60
+    for start in range(0, rows, SEED_CHUNK):
+        batch = []
+        for _ in range(start, min(start + SEED_CHUNK, rows)):
+            ts = now - timedelta(minutes=rng.randrange(minutes))
+            amount = rng.lognormvariate(3, 0.6) * (1.3 if ts.month in (11, 12) else 1)
+            if rng.random() < 0.001:
+                amount *= 40
+            batch.append(Transaction(
+                user=user, category=rng.choice(cats), type=Category.EXPENSE,
+                amount=round(amount, 2), raw_text='benchmark', timestamp=ts
+            ))
+        Transaction.objects.bulk_create(batch, batch_size=5000)
+    rebuild_daily_summary(user)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede, em um banco de teste temporário, o tempo do motor de análise "
+        "(analysis.analytics) para um usuário com N transações (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=30)
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = get_user_model().objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+            started = time.perf_counter()
+            seed(user, options['rows'], options['categories'], options['years'])
+            seed_seconds = time.perf_counter() - started
+
+            timings = {}
+            for insight_type in ('summary', 'forecast', 'anomaly'):
+                samples = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    data = analytics.analyze(user, insight_type)
+                    samples.append(time.perf_counter() - started)
+                timings[insight_type] = round(statistics.median(samples), 3)
+            flagged = data['flagged']
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(json.dumps({
+            'rows': options['rows'],
+            'categories': options['categories'],
+            'seed_seconds': round(seed_seconds, 1),
+            'seconds_per_user': timings,
+            'total_seconds': round(sum(timings.values()), 3),
+            'anomalies_flagged': flagged,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }, indent=2))
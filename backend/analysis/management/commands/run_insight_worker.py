@@ -0,0 +1,40 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from analysis.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de insights (InsightJob) com N threads até receber SIGINT/SIGTERM."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Número de threads de trabalho (padrão: 4).')
+        parser.add_argument('--once', action='store_true', help='Sai quando a fila estiver vazia.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: stop.set())
+
+        def work():
+            try:
+                run_worker(stop, once=options['once'])
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=work, name=f'insight-worker-{i}', daemon=True)
+            for i in range(max(options['threads'], 1))
+        ]
+        self.stdout.write(f'Processando insights com {len(threads)} thread(s)...')
+        for thread in threads:
+            thread.start()
+        # join com timeout para que o sinal seja atendido na thread principal
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+        self.stdout.write(self.style.SUCCESS('Worker de insights encerrado.'))
@@ -0,0 +1,163 @@
+"""
+Memória limitada do chat com o agente.
+
+O contexto enviado ao Gemini é: um resumo das mensagens antigas (guardado
+em ConversationMemory) + as últimas mensagens na íntegra. O resumo só é
+refeito quando a janela anda CHAT_MEMORY['SUMMARY_BATCH'] mensagens; até
+lá as mensagens que saíram da janela continuam indo na íntegra. Assim o
+custo por mensagem não cresce com o tamanho da conversa.
+
+O resumo é atualizado depois que a resposta é salva, numa thread em
+segundo plano (schedule_fold): a requisição do chat nunca espera essa
+segunda chamada ao Gemini.
+"""
+import logging
+import math
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from core import gemini
+from .models import ChatMessage, ConversationMemory
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_folding = set()  # usuários com resumo sendo atualizado neste processo
+
+SYSTEM_INSTRUCTION = "Você é um assistente financeiro."
+
+
+def _config(key):
+    return settings.CHAT_MEMORY[key]
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def _turn(message):
+    role = 'user' if message.role == ChatMessage.USER else 'model'
+    return {'role': role, 'parts': [{'text': message.message}]}
+
+
+def _transcript(messages):
+    return '\n'.join(
+        f"{'Usuário' if m.role == ChatMessage.USER else 'Agente'}: {m.message}" for m in messages
+    )
+
+
+def _recent_messages(user_id, memory):
+    """
+    Mensagens ainda não resumidas, das mais antigas às mais novas, limitadas
+    à janela mais um lote. Só passa disso se o resumo vinha falhando; nesse
+    caso as excedentes mais antigas ficam de fora.
+    """
+    limit = _config('WINDOW_MESSAGES') + _config('SUMMARY_BATCH')
+    recent = list(
+        ChatMessage.objects.filter(user_id=user_id, id__gt=memory.summarized_until)
+        .order_by('-id').only('id', 'role', 'message')[:limit]
+    )
+    recent.reverse()
+    return recent
+
+
+def _fold(memory, messages):
+    """
+    Incorpora `messages` ao resumo guardado. Em caso de erro do Gemini
+    mantém o resumo anterior (as mensagens serão resumidas na próxima vez).
+    """
+    prompt = (
+        f"Resumo atual da conversa:\n{memory.summary or '(vazio)'}\n\n"
+        f"Novas mensagens:\n{_transcript(messages)}\n\n"
+        "Atualize o resumo em português, em no máximo "
+        f"{_config('SUMMARY_MAX_TOKENS') * 3} caracteres, mantendo valores, metas e "
+        "preferências citadas pelo usuário."
+    )
+    try:
+        summary = gemini.generate_text(
+            prompt,
+            system_instruction="Você resume conversas de forma fiel e concisa.",
+            max_output_tokens=_config('SUMMARY_MAX_TOKENS'),
+            temperature=0.2,
+            purpose='summary',
+        )
+    except Exception as exc:
+        logger.warning("Falha ao atualizar o resumo do chat do usuário %s: %s", memory.user_id, exc)
+        return False
+    memory.summary = (summary or '').strip()
+    memory.summarized_until = messages[-1].id
+    memory.save(update_fields=['summary', 'summarized_until', 'updated_at'])
+    return True
+
+
+def fold_pending(user_id):
+    """
+    Se a janela andou um lote inteiro, leva as mensagens mais antigas para
+    o resumo. Retorna True se o resumo foi atualizado.
+    """
+    memory, _ = ConversationMemory.objects.get_or_create(user_id=user_id)
+    messages = _recent_messages(user_id, memory)
+    overflow = len(messages) - _config('WINDOW_MESSAGES')
+    return overflow >= _config('SUMMARY_BATCH') and _fold(memory, messages[:overflow])
+
+
+def _fold_in_background(user_id):
+    try:
+        fold_pending(user_id)
+    except Exception:
+        logger.exception("Falha ao resumir o chat do usuário %s", user_id)
+    finally:
+        with _lock:
+            _folding.discard(user_id)
+        close_old_connections()
+
+
+def _start_fold(user_id):
+    with _lock:
+        if user_id in _folding:
+            return
+        _folding.add(user_id)
+    threading.Thread(target=_fold_in_background, args=(user_id,), name='chat-summary', daemon=True).start()
+
+
+def schedule_fold(user):
+    """
+    Chamado depois de salvar a resposta do agente: atualiza o resumo, se
+    preciso, em segundo plano e após o commit.
+    """
+    transaction.on_commit(lambda: _start_fold(user.pk))
+
+
+def build_context(user):
+    """
+    Retorna (contents, system_instruction, info) para a próxima resposta do
+    agente. A última mensagem do usuário já deve estar gravada. Não chama o
+    Gemini: usa o resumo guardado e as mensagens ainda não resumidas, que
+    _recent_messages limita à janela mais um lote.
+    """
+    memory, _ = ConversationMemory.objects.get_or_create(user=user)
+    messages = _recent_messages(user.pk, memory)
+
+    system_instruction = SYSTEM_INSTRUCTION
+    if memory.summary:
+        system_instruction += f"\n\nResumo da conversa até aqui:\n{memory.summary}"
+
+    # Corta as mensagens mais antigas da janela se passar do orçamento
+    budget = _config('MAX_TOKENS') - estimate_tokens(system_instruction)
+    kept = []
+    for message in reversed(messages):
+        cost = estimate_tokens(message.message)
+        if kept and cost > budget:
+            break
+        kept.append(message)
+        budget -= cost
+    kept.reverse()
+
+    info = {
+        'summarized_until': memory.summarized_until,
+        'window': len(kept),
+        'context_tokens': _config('MAX_TOKENS') - budget,
+    }
+    return [_turn(m) for m in kept], system_instruction, info
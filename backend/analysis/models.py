@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Insight(models.Model):
     SUMMARY = 'summary'
@@ -13,6 +14,11 @@ class Insight(models.Model):
     content = models.TextField()
     data = models.JSONField(default=dict)  # detalhes estruturados
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='insight_user_created_idx'),
+        ]
+
 class ChatMessage(models.Model):
     USER = 'user'
     AGENT = 'agent'
@@ -22,4 +28,58 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     role = models.CharField(max_length=5, choices=ROLE_CHOICES)
     message = models.TextField()
-    metadata = models.JSONField(default=dict)
\ No newline at end of file
+    metadata = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'timestamp', 'id'], name='chat_message_user_ts_idx'),
+        ]
+
+class ConversationMemory(models.Model):
+    """
+    Resumo incremental das mensagens antigas do chat do usuário, usado
+    junto com as últimas mensagens como contexto do agente.
+    `summarized_until` é o id da última ChatMessage incluída no resumo.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_memory')
+    summary = models.TextField(blank=True)
+    summarized_until = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class InsightJob(models.Model):
+    """
+    Pedido de geração de insight, processado fora da requisição pelo
+    comando run_insight_worker. Só pode haver um job ativo (pendente ou
+    em execução) por usuário e tipo de insight.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pendente'), (RUNNING, 'Em execução'), (DONE, 'Concluído'), (FAILED, 'Falhou')]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    insight_type = models.CharField(max_length=10, choices=Insight.TYPE_CHOICES)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    insight = models.OneToOneField(Insight, on_delete=models.SET_NULL, null=True, blank=True, related_name='job')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Token do worker que está com o job; só ele pode concluí-lo
+    lease_token = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='insight_job_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'insight_type'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='insight_job_one_active',
+            ),
+        ]
@@ -0,0 +1,249 @@
+"""
+Resumo do histórico financeiro enviado ao Gemini nos insights.
+
+Em vez de serializar todas as transações, condensa o histórico com
+pandas/NumPy em totais mensais por categoria, percentis, tendência e
+maiores outliers, e reduz o nível de detalhe até caber no orçamento de
+tokens (INSIGHT_PAYLOAD['MAX_TOKENS']). O tamanho do prompt fica
+praticamente o mesmo com 100 ou 1.000.000 de transações.
+
+A memória também: os totais vêm de DailySummary, e as transações só são
+lidas até SAMPLE_ROWS (acima disso, uma amostra aleatória) para os
+percentis e as medianas por categoria. Os outliers são buscados no banco
+com esses limites, entre todas as transações do período.
+"""
+import json
+import math
+from datetime import datetime, time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Case, FloatField, Min, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from finances.models import Category, DailySummary, Goal, Transaction
+from finances.services import user_timezone
+
+UNCATEGORIZED = 'Sem categoria'
+PERCENTILES = (25, 50, 75, 90, 99)
+# Outlier: desvio robusto (mediana/MAD) acima deste limite dentro da categoria
+OUTLIER_Z = 3.5
+
+
+def _config(key):
+    return settings.INSIGHT_PAYLOAD[key]
+
+
+def estimate_tokens(payload) -> int:
+    """
+    Estimativa simples (~4 caracteres por token) do JSON compacto.
+    """
+    return math.ceil(len(dumps(payload)) / 4)
+
+
+def dumps(payload) -> str:
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def _month_start(day, months_back=0):
+    index = day.year * 12 + day.month - 1 - months_back
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _trend(matrix):
+    """
+    Inclinação (mínimos quadrados) de cada linha de `matrix` contra o
+    índice do mês, calculada de uma vez para todas as categorias.
+    """
+    months = matrix.shape[1]
+    if months < 2:
+        return np.zeros(matrix.shape[0])
+    x = np.arange(months) - (months - 1) / 2
+    return (matrix - matrix.mean(axis=1, keepdims=True)) @ x / (x @ x)
+
+
+def _load_daily(user, start_day):
+    daily = pd.DataFrame.from_records(
+        DailySummary.objects.filter(user=user, day__gte=start_day)
+        .values_list('day', 'category__name', 'type', 'total', 'count'),
+        columns=['day', 'category', 'type', 'total', 'count'],
+    )
+    daily['category'] = daily['category'].fillna(UNCATEGORIZED)
+    daily['total'] = daily['total'].astype(float)
+    return daily
+
+
+def _period_transactions(user, start):
+    return Transaction.objects.filter(user=user, timestamp__gte=start).annotate(
+        category_label=Coalesce('category__name', Value(UNCATEGORIZED))
+    )
+
+
+def _sample(user, start, count):
+    """
+    Valores das transações do período: todas até SAMPLE_ROWS; acima disso,
+    uma amostra aleatória de SAMPLE_ROWS linhas, sorteada pelo banco.
+    """
+    qs = _period_transactions(user, start)
+    if count > _config('SAMPLE_ROWS'):
+        qs = qs.order_by('?')[:_config('SAMPLE_ROWS')]
+    txs = pd.DataFrame.from_records(
+        qs.values_list('category_label', 'type', 'amount'), columns=['category', 'type', 'amount']
+    )
+    txs['amount'] = txs['amount'].astype(float)
+    return txs
+
+
+def _monthly(daily, months):
+    """
+    Matriz categoria x mês com os totais, na ordem dos meses do período.
+    """
+    daily = daily.assign(month=pd.to_datetime(daily['day']).dt.to_period('M'))
+    table = daily.pivot_table(
+        index=['type', 'category'], columns='month', values='total', aggfunc='sum', fill_value=0.0
+    )
+    return table.reindex(columns=months, fill_value=0.0)
+
+
+def _percentiles(txs):
+    result = {}
+    for kind, amounts in txs.groupby('type')['amount']:
+        values = np.percentile(amounts.to_numpy(), PERCENTILES)
+        result[kind] = {f'p{p}': _money(v) for p, v in zip(PERCENTILES, values)}
+    return result
+
+
+def _outliers(user, start, txs, tz, limit):
+    """
+    Despesas mais fora do padrão da própria categoria (z robusto), já
+    renderizadas. Mediana e MAD vêm da amostra; a busca é no banco, sobre
+    todas as transações do período, com uma única consulta.
+    """
+    expenses = txs[txs['type'] == Category.EXPENSE]
+    if expenses.empty or not limit:
+        return []
+    by_category = expenses.groupby('category')['amount']
+    median = by_category.median()
+    mad = (expenses['amount'] - expenses['category'].map(median)).abs().groupby(expenses['category']).median()
+    scale = (0.6745 / mad[mad > 0]).to_dict()
+    if not scale:
+        return []
+    z = Case(
+        *[
+            When(category_label=category, then=(Cast('amount', FloatField()) - float(median[category])) * factor)
+            for category, factor in scale.items()
+        ],
+        output_field=FloatField(),
+    )
+    rows = (
+        _period_transactions(user, start)
+        .filter(type=Category.EXPENSE)
+        .annotate(z=z)
+        .filter(z__gt=OUTLIER_Z)
+        .order_by('-z')
+        .values_list('timestamp', 'category_label', 'amount', 'z')[:limit]
+    )
+    return [
+        {
+            'date': timezone.localtime(timestamp, tz).date().isoformat(),
+            'category': category,
+            'amount': _money(amount),
+            'z': round(float(score), 1),
+        }
+        for timestamp, category, amount, score in rows
+    ]
+
+
+def _goals(user, today):
+    goals = (
+        Goal.objects.filter(user=user, end_date__gte=today)
+        .order_by('end_date')
+        .values('name', 'target_amount', 'start_date', 'end_date', 'frequency')[:_config('MAX_GOALS')]
+    )
+    return [{**goal, 'target_amount': _money(goal['target_amount'])} for goal in goals]
+
+
+def _render(base, table, months, outliers, top_categories, top_outliers, series_months):
+    totals = table.sum(axis=1)
+    order = totals.sort_values(ascending=False).index
+    kept, rest = order[:top_categories], order[top_categories:]
+    shown = months[-series_months:]
+    # O mês corrente está incompleto: a tendência usa só os meses fechados
+    slopes = pd.Series(_trend(table.to_numpy()[:, :-1]), index=table.index)
+
+    payload = dict(base)
+    payload['categories'] = [
+        {
+            'name': category,
+            'type': kind,
+            'total': _money(totals[(kind, category)]),
+            'monthly': [_money(v) for v in table.loc[(kind, category), shown]],
+            'trend_per_month': _money(slopes[(kind, category)]),
+        }
+        for kind, category in kept
+    ]
+    if len(rest):
+        payload['other_categories'] = {'count': len(rest), 'total': _money(totals[rest].sum())}
+    payload['outliers'] = outliers[:top_outliers]
+    return payload
+
+
+def _detail_levels():
+    """
+    Níveis de detalhe, do mais completo ao mínimo: (categorias, outliers, meses da série).
+    """
+    categories, outliers, months = _config('TOP_CATEGORIES'), _config('TOP_OUTLIERS'), _config('MONTHS')
+    while True:
+        yield categories, outliers, months
+        if (categories, outliers, months) == (1, 0, 1):
+            return
+        categories = max(categories // 2, 1)
+        outliers //= 2
+        months = max(months // 2, 1)
+
+
+def build_insight_payload(user, max_tokens=None, today=None) -> dict:
+    """
+    Retorna o resumo (dict serializável) do histórico do usuário para o
+    prompt de insight, dentro de `max_tokens` (padrão: INSIGHT_PAYLOAD['MAX_TOKENS']).
+    """
+    max_tokens = max_tokens or _config('MAX_TOKENS')
+    tz = user_timezone(user)
+    today = today or timezone.localdate(timezone=tz)
+    start_day = _month_start(today, _config('MONTHS') - 1)
+    months = pd.period_range(start_day, today, freq='M')
+
+    daily = _load_daily(user, start_day)
+    start = timezone.make_aware(datetime.combine(start_day, time.min), tz)
+    txs = _sample(user, start, int(daily['count'].sum()))
+    table = _monthly(daily, months)
+    by_type = table.groupby(level='type').sum()
+    all_time = (
+        DailySummary.objects.filter(user=user)
+        .values('type').annotate(total=Sum('total'), first_day=Min('day'))
+    )
+
+    base = {
+        'period': {'start': start_day.isoformat(), 'end': today.isoformat()},
+        'all_time': {row['type']: {'total': _money(row['total']), 'since': row['first_day'].isoformat()} for row in all_time},
+        'monthly_totals': [
+            {'month': str(month), **{kind: _money(by_type.loc[kind, month]) for kind in by_type.index}}
+            for month in months
+        ],
+        'transaction_count': int(daily['count'].sum()),
+        'amount_percentiles': _percentiles(txs),
+        'goals': _goals(user, today),
+    }
+    outliers = _outliers(user, start, txs, tz, _config('TOP_OUTLIERS'))
+
+    for level in _detail_levels():
+        payload = _render(base, table, months, outliers, *level)
+        if estimate_tokens(payload) <= max_tokens:
+            break
+    return payload
@@ -1,11 +1,26 @@
 from rest_framework import serializers
-from .models import Insight, ChatMessage
+from .models import Insight, ChatMessage, InsightJob
 
 class InsightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Insight
         fields = '__all__'
 
+class InsightJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InsightJob
+        fields = [
+            'id',
+            'insight_type',
+            'status',
+            'insight',
+            'attempts',
+            'error',
+            'created_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
@@ -1,82 +1,126 @@
-import os, json
-from google import genai
-from google.genai import types
+import logging
+
+from asgiref.sync import sync_to_async
+from core import gemini
 from .models import Insight, ChatMessage
-from finances.models import Transaction, Goal
+from . import memory
+
+logger = logging.getLogger(__name__)
+
+def _analytics():
+    """
+    analysis.analytics, importado no primeiro insight: ele e analysis.payload
+    carregam pandas/NumPy, que a maioria das requisições não usa.
+    """
+    from . import analytics
+    return analytics
 
-MODEL_ID = 'gemini-2.0-flash'
+def _payload():
+    from . import payload
+    return payload
 
 def generate_insight_for_user(user, insight_type: str) -> Insight:
     """
-    Lê transações e metas do usuário, pede ao Gemini um insight e salva no banco.
+    Calcula o insight do usuário (números locais, texto do Gemini) e salva no banco.
     insight_type: 'summary' | 'forecast' | 'anomaly'
     """
-    # 1. Coleta dados
-    txs   = list(Transaction.objects.filter(user=user).values(
-                'amount', 'timestamp', 'category__name'))
-    goals = list(Goal.objects.filter(user=user).values(
-                'name', 'target_amount', 'start_date', 'end_date'))
+    content, data = compose_insight(user, insight_type)
+    return Insight.objects.create(
+        user=user,
+        insight_type=insight_type,
+        content=content,
+        data=data
+    )
+
+def compose_insight(user, insight_type: str):
+    """
+    Monta o insight (content, data) sem gravar nada; usado também pelos
+    jobs em segundo plano, que salvam o resultado junto com o status.
+    Os números (data) vêm do motor local em analysis.analytics; o Gemini
+    só redige o texto. Sem Gemini configurado ou disponível, usa um texto local.
+    """
+    # 1. Calcula os resultados localmente (determinístico)
+    analytics = _analytics()
+    data = analytics.analyze(user, insight_type)
+    if not gemini.is_configured():
+        return analytics.describe(insight_type, data), data
 
-    # 2. Monta prompt
+    # 2. Monta prompt com os resultados e o resumo do histórico (tamanho limitado)
+    payload_module = _payload()
+    payload = payload_module.build_insight_payload(user)
     prompt = (
         f"Tipo de insight: {insight_type}\n\n"
-        f"Transações:\n{json.dumps(txs, default=str)}\n\n"
-        f"Metas:\n{json.dumps(goals, default=str)}\n\n"
-        "Gere um JSON com chaves 'content' (string) e 'data' (objeto com valores)."
+        f"Resultados calculados (use estes números, não recalcule):\n{payload_module.dumps(data)}\n\n"
+        f"Resumo financeiro do usuário (valores em R$):\n{payload_module.dumps(payload)}\n\n"
+        "Escreva um parágrafo curto em português explicando os resultados ao usuário."
     )
 
-    # 3. Chama Gemini
-    api_key = os.getenv('GOOGLE_API_KEY')
-    client = genai.Client(api_key=api_key)
-    config = types.GenerateContentConfig(
-        system_instruction="Você é um analista financeiro.",
-        max_output_tokens=512,
-        temperature=0.5
-    )
-    chat = client.chats.create(model=MODEL_ID, config=config)
-    raw = chat.send_message(prompt).text
-
-    # 4. Parseia e salva
+    # 3. Chama Gemini só para o texto; se ele não responder, usa o texto local
     try:
-        result = json.loads(raw)
-        content = result.get('content', '')
-        data    = result.get('data', {})
-    except json.JSONDecodeError:
-        content, data = raw, {}
-
-    insight = Insight.objects.create(
-        user=user,
-        insight_type=insight_type,
-        content=content,
-        data=data
-    )
-    return insight
+        content = gemini.generate_text(
+            prompt,
+            system_instruction="Você é um analista financeiro.",
+            max_output_tokens=512,
+            temperature=0.5,
+            purpose='insight'
+        )
+    except gemini.GeminiUnavailable as exc:
+        logger.warning("Insight %s sem Gemini: %s", insight_type, exc)
+        return analytics.describe(insight_type, data), data
+    return content.strip(), data
 
 def chat_with_agent(user, message_text: str) -> ChatMessage:
     """
     Registra user->agent e agent->user no ChatMessage.
+    O Gemini recebe o resumo da conversa e as últimas mensagens (analysis.memory).
+    """
+    # 1. Salva mensagem do usuário e monta o contexto limitado da conversa
+    contents, system_instruction, context = prepare_chat(user, message_text)
+
+    # 2. Envia ao Gemini
+    response_text = gemini.generate_text(
+        contents,
+        system_instruction=system_instruction,
+        purpose='chat'
+    )
+
+    # 3. Salva resposta do agente
+    return save_agent_message(user, response_text, {'context': context})
+
+def prepare_chat(user, message_text: str):
     """
-    # 1. Salva mensagem do usuário
-    user_msg = ChatMessage.objects.create(
+    Salva a mensagem do usuário e retorna (contents, system_instruction, context)
+    para a resposta do agente.
+    """
+    ChatMessage.objects.create(
         user=user,
         role=ChatMessage.USER,
         message=message_text,
         metadata={}
     )
+    return memory.build_context(user)
 
-    # 2. Cria e envia ao Gemini
-    api_key = os.getenv('GOOGLE_API_KEY')
-    client = genai.Client(api_key=api_key)
-    system = "Você é um assistente financeiro."
-    config = types.GenerateContentConfig(system_instruction=system)
-    chat = client.chats.create(model=MODEL_ID, config=config)
-    response_text = chat.send_message(message_text).text
-
-    # 3. Salva resposta do agente
-    agent_msg = ChatMessage.objects.create(
+def save_agent_message(user, response_text: str, metadata: dict) -> ChatMessage:
+    message = ChatMessage.objects.create(
         user=user,
         role=ChatMessage.AGENT,
         message=response_text,
-        metadata={}
+        metadata=metadata
+    )
+    # O resumo da conversa é atualizado fora da requisição
+    memory.schedule_fold(user)
+    return message
+
+async def stream_agent_reply(user, contents, system_instruction, context):
+    """
+    Gera a resposta do agente em pedaços: ('token', texto) conforme chegam do
+    Gemini e, ao final, ('done', ChatMessage) com a resposta completa já salva.
+    """
+    parts = []
+    async for text in gemini.stream_text(contents, system_instruction=system_instruction, purpose='chat'):
+        parts.append(text)
+        yield 'token', text
+    agent_msg = await sync_to_async(save_agent_message)(
+        user, ''.join(parts).strip(), {'context': context, 'streamed': True}
     )
-    return agent_msg
+    yield 'done', agent_msg
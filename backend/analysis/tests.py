@@ -1,17 +1,40 @@
 import json
-from django.test import TestCase
+import warnings
+from io import StringIO
+from datetime import date, datetime, timedelta
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 from unittest.mock import patch, MagicMock
 
+from analysis.jobs import claim_job, run_job
+from analysis import analytics, memory, payload
+from core import gemini
+from core.fake_gemini import FakeGeminiServer
+from analysis.models import Insight, InsightJob, ChatMessage, ConversationMemory
+from analysis.payload import build_insight_payload, estimate_tokens
+from analysis.services import compose_insight, chat_with_agent
+from finances import parse_cache
+from finances.models import Category, Transaction
+from finances.services import rebuild_daily_summary
 from finances.services import (
     parse_transaction_text,
     parse_goal_text
 )
 
 class ParseServicesTestCase(TestCase):
+    def setUp(self):
+        parse_cache.clear()
+
     def test_parse_transaction_no_api_key(self):
         # Sem GOOGLE_API_KEY -> retorna dict com None
-        with patch('finances.services.os.getenv', return_value=None):
-            result = parse_transaction_text("gastei 15 reais na padaria")
+        with patch('core.gemini.os.getenv', return_value=None):
+            result = parse_transaction_text("gastei 15 reais naquele lugar")
         self.assertEqual(result, {
             'amount': None,
             'date': None,
@@ -20,8 +43,8 @@ class ParseServicesTestCase(TestCase):
             'type': None
         })
 
-    @patch('finances.services.genai.Client')
-    def test_parse_transaction_success(self, mock_Client):
+    @patch('core.gemini.get_client')
+    def test_parse_transaction_success(self, mock_get_client):
         # Com API_KEY e resposta JSON válida
         dummy = {
             'amount': 23.5,
@@ -31,26 +54,22 @@ class ParseServicesTestCase(TestCase):
             'type': 'expense'
         }
         # mock os.getenv para retornar uma chave qualquer
-        with patch('finances.services.os.getenv', return_value='fake-key'):
-            # configura o client e o chat
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
+            # configura o client
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': json.dumps(dummy)})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(dummy)})()
+            mock_get_client.return_value = inst
 
-            result = parse_transaction_text("gastei 23.5 na padaria")
-        self.assertEqual(result, dummy)
+            result = parse_transaction_text("gastei 23.5 naquele lugar")
+        self.assertEqual(result, {**dummy, 'parser': 'llm'})
 
-    @patch('finances.services.genai.Client')
-    def test_parse_transaction_invalid_json(self, mock_Client):
+    @patch('core.gemini.get_client')
+    def test_parse_transaction_invalid_json(self, mock_get_client):
         # Com API_KEY mas resposta inválida (JSONDecodeError)
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': 'não é JSON'})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': 'não é JSON'})()
+            mock_get_client.return_value = inst
 
             result = parse_transaction_text("algo estranho")
         self.assertEqual(result, {
@@ -63,7 +82,7 @@ class ParseServicesTestCase(TestCase):
 
     def test_parse_goal_no_api_key(self):
         # Sem API_KEY -> dict de None
-        with patch('finances.services.os.getenv', return_value=None):
+        with patch('core.gemini.os.getenv', return_value=None):
             result = parse_goal_text("quero poupar 1000 até fim do ano mensalmente")
         self.assertEqual(result, {
             'target_amount': None,
@@ -73,8 +92,8 @@ class ParseServicesTestCase(TestCase):
             'name': None
         })
 
-    @patch('finances.services.genai.Client')
-    def test_parse_goal_success(self, mock_Client):
+    @patch('core.gemini.get_client')
+    def test_parse_goal_success(self, mock_get_client):
         # Com API_KEY e JSON válido
         dummy = {
             'target_amount': 1000.0,
@@ -83,24 +102,20 @@ class ParseServicesTestCase(TestCase):
             'frequency': 'monthly',
             'name': 'Poupança Anual'
         }
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': json.dumps(dummy)})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(dummy)})()
+            mock_get_client.return_value = inst
 
             result = parse_goal_text("quero poupar 1000 até dezembro de forma mensal")
         self.assertEqual(result, dummy)
 
-    @patch('finances.services.genai.Client')
-    def test_parse_goal_invalid_json(self, mock_Client):
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+    @patch('core.gemini.get_client')
+    def test_parse_goal_invalid_json(self, mock_get_client):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': 'oops'})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': 'oops'})()
+            mock_get_client.return_value = inst
 
             result = parse_goal_text("texto irreconhecível")
         self.assertEqual(result, {
@@ -110,3 +125,352 @@ class ParseServicesTestCase(TestCase):
             'frequency': None,
             'name': None
         })
+
+
+class InsightJobTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('job', 'job@x.com', 'pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_generate_returns_202_and_deduplicates(self):
+        resp = self.client.post('/analysis/insights/generate/summary/')
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.data['status'], 'pending')
+        self.assertTrue(resp['Location'].endswith(f"/analysis/insight-jobs/{resp.data['id']}/"))
+
+        again = self.client.post('/analysis/insights/generate/summary/')
+        self.assertEqual(again.data['id'], resp.data['id'])
+        self.assertEqual(InsightJob.objects.count(), 1)
+        self.assertEqual(self.client.post('/analysis/insights/generate/nada/').status_code, 400)
+
+    @patch.dict('rest_framework.throttling.SimpleRateThrottle.THROTTLE_RATES', {'llm_burst': '2/min'})
+    def test_generate_has_llm_rate_limit(self):
+        cache.clear()
+        codes = [self.client.post('/analysis/insights/generate/summary/').status_code for _ in range(3)]
+        self.assertEqual(codes, [202, 202, 429])
+        self.assertIn('Retry-After', self.client.post('/analysis/insights/generate/forecast/'))
+        # Leituras não entram no limite dos endpoints de LLM
+        self.assertEqual(self.client.get('/analysis/insights/').status_code, 200)
+
+    @patch('analysis.jobs.compose_insight', side_effect=RuntimeError('timeout'))
+    def test_failure_is_retried_then_failed(self, mock_compose):
+        job = InsightJob.objects.create(user=self.user, insight_type='summary')
+        with self.settings(INSIGHT_JOBS={'LEASE_SECONDS': 60, 'MAX_ATTEMPTS': 2, 'RETRY_DELAY_SECONDS': 0, 'POLL_INTERVAL': 0}):
+            run_job(claim_job())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.error), ('pending', 1, 'timeout'))
+            run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    @patch('analysis.jobs.compose_insight', return_value=('x', {}))
+    def test_expired_lease_does_not_duplicate_insight(self, mock_compose):
+        InsightJob.objects.create(user=self.user, insight_type='summary')
+        stale = claim_job()
+        InsightJob.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        fresh = claim_job()  # outro worker assume o job vencido
+        self.assertEqual(fresh.id, stale.id)
+
+        self.assertTrue(run_job(fresh))
+        self.assertFalse(run_job(stale))
+        self.assertEqual(Insight.objects.count(), 1)
+        self.assertIsNone(claim_job())
+
+
+    @patch('analysis.jobs.compose_insight', return_value=('x', {}))
+    def test_job_that_keeps_killing_its_worker_fails(self, mock_compose):
+        job = InsightJob.objects.create(user=self.user, insight_type='summary')
+        with self.settings(INSIGHT_JOBS={**settings.INSIGHT_JOBS, 'MAX_ATTEMPTS': 2}):
+            # Duas tentativas cujo worker morre sem concluir (o lease vence)
+            for _ in range(2):
+                self.assertIsNotNone(claim_job())
+                InsightJob.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+            self.assertIsNone(claim_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        mock_compose.assert_not_called()
+        # O tipo fica livre para um novo pedido
+        resp = self.client.post('/analysis/insights/generate/summary/')
+        self.assertNotEqual(resp.data['id'], job.id)
+
+
+class InsightWorkerCommandTestCase(TransactionTestCase):
+    @patch('analysis.jobs.compose_insight', return_value=('Tudo certo', {'total': 10}))
+    def test_worker_completes_job(self, mock_compose):
+        user = get_user_model().objects.create_user('worker', 'worker@x.com', 'pass')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        job_id = client.post('/analysis/insights/generate/summary/').data['id']
+
+        # As threads do worker usam conexões próprias: por isso TransactionTestCase
+        call_command('run_insight_worker', threads=1, once=True, stdout=StringIO())
+
+        resp = client.get(f'/analysis/insight-jobs/{job_id}/')
+        self.assertEqual(resp.data['status'], 'done')
+        insight = Insight.objects.get(id=resp.data['insight'])
+        self.assertEqual((insight.content, insight.data), ('Tudo certo', {'total': 10}))
+        mock_compose.assert_called_once()
+
+
+class InsightPayloadTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('pay', 'pay@x.com', 'pass')
+        self.categories = [
+            Category.objects.create(user=self.user, name=f'Categoria {i}', type='expense') for i in range(30)
+        ]
+
+    def add_transactions(self, count):
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=self.categories[i % 30], type='expense',
+                amount=10 + i % 7, raw_text=f'gasto {i}', timestamp=now - timedelta(days=i % 300)
+            )
+            for i in range(count)
+        ])
+        rebuild_daily_summary(self.user)
+
+    def test_payload_respects_token_budget(self):
+        self.add_transactions(600)
+        payload = build_insight_payload(self.user, max_tokens=600)
+        self.assertLessEqual(estimate_tokens(payload), 600)
+        self.assertLess(len(payload['categories']), 30)
+        self.assertEqual(payload['transaction_count'], 600)
+        self.assertEqual(
+            payload['other_categories']['count'] + len(payload['categories']), 30
+        )
+
+    def test_payload_size_does_not_grow_with_history(self):
+        self.add_transactions(60)
+        small = estimate_tokens(build_insight_payload(self.user))
+        self.add_transactions(3000)
+        large = estimate_tokens(build_insight_payload(self.user))
+        self.assertLess(large, small * 1.5)
+
+    def test_outlier_is_reported(self):
+        self.add_transactions(300)
+        Transaction.objects.create(
+            user=self.user, category=self.categories[0], type='expense', amount=5000, raw_text='tv nova'
+        )
+        outliers = build_insight_payload(self.user)['outliers']
+        self.assertEqual((outliers[0]['category'], outliers[0]['amount']), ('Categoria 0', 5000.0))
+
+    def test_large_history_reads_a_bounded_sample(self):
+        self.add_transactions(3000)
+        Transaction.objects.create(
+            user=self.user, category=self.categories[0], type='expense', amount=5000, raw_text='tv nova'
+        )
+        with self.settings(INSIGHT_PAYLOAD={**settings.INSIGHT_PAYLOAD, 'SAMPLE_ROWS': 500}):
+            sample = payload._sample(self.user, timezone.now() - timedelta(days=400), 3001)
+            outliers = build_insight_payload(self.user)['outliers']
+        self.assertEqual(len(sample), 500)
+        # O outlier é buscado no banco mesmo fora da amostra
+        self.assertEqual((outliers[0]['category'], outliers[0]['amount']), ('Categoria 0', 5000.0))
+
+    @patch('analysis.services.gemini.generate_text', return_value='Texto do analista.')
+    def test_prompt_uses_summary_instead_of_raw_transactions(self, mock_generate):
+        self.add_transactions(50)
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
+            content, data = compose_insight(self.user, 'summary')
+        self.assertEqual(content, 'Texto do analista.')
+        self.assertEqual(data['window_days'], 30)
+        prompt = mock_generate.call_args.args[0]
+        self.assertIn('monthly_totals', prompt)
+        self.assertNotIn('gasto 1', prompt)
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('ana', 'ana@x.com', 'pass')
+        self.food = Category.objects.create(user=self.user, name='Alimentação', type='expense')
+        self.home = Category.objects.create(user=self.user, name='Moradia', type='expense')
+        self.today = timezone.localdate()
+
+    def add(self, category, amount, days_ago=0, when=None):
+        when = when or timezone.now() - timedelta(days=days_ago)
+        return Transaction(user=self.user, category=category, type='expense', amount=amount, raw_text='t', timestamp=when)
+
+    def save(self, transactions):
+        Transaction.objects.bulk_create(transactions)
+        rebuild_daily_summary(self.user)
+
+    def test_rolling_spend_compares_windows(self):
+        self.save([self.add(self.food, 10, d) for d in range(0, 60)] + [self.add(self.home, 900, 45)])
+        data = analytics.analyze(self.user, 'summary', today=self.today)
+        by_category = {c['category']: c for c in data['categories']}
+        self.assertEqual((by_category['Alimentação']['current'], by_category['Alimentação']['previous']), (300.0, 300.0))
+        self.assertEqual((by_category['Moradia']['current'], by_category['Moradia']['change_pct']), (0.0, -100.0))
+        self.assertEqual(data['total_current'], 300.0)
+
+    def test_forecast_uses_seasonality(self):
+        tz = timezone.get_current_timezone()
+        transactions = []
+        for month in pd.period_range('2023-09', '2025-10', freq='M'):
+            amount = 300 if month.month == 12 else 100
+            when = timezone.make_aware(datetime(month.year, month.month, 10, 12), tz)
+            transactions.append(self.add(self.food, amount, when=when))
+        self.save(transactions)
+
+        data = analytics.analyze(self.user, 'forecast', today=date(2025, 11, 15))
+        self.assertEqual(data['months'], ['2025-11', '2025-12', '2026-01'])
+        self.assertEqual(data['history_months'], 26)
+        november, december, january = data['categories'][0]['forecast']
+        self.assertGreater(december, 2 * november)
+        self.assertAlmostEqual(november, january, delta=5)
+
+    def test_anomaly_flags_outlier(self):
+        transactions = [self.add(self.food, 40 + i % 5, i) for i in range(40)]
+        outlier = self.add(self.food, 2000, 1)
+        self.save(transactions + [outlier, self.add(self.food, 2500, 200)])
+
+        data = analytics.analyze(self.user, 'anomaly', today=self.today)
+        self.assertEqual(data['scanned'], 42)
+        self.assertEqual(len(data['items']), 1)  # o de 200 dias atrás fica fora da janela
+        self.assertEqual(data['items'][0]['amount'], 2000.0)
+        self.assertEqual(data['items'][0]['flags'], ['zscore', 'iqr'])
+
+    def test_without_gemini_uses_local_text(self):
+        self.save([self.add(self.food, 25, 1)])
+        with patch('core.gemini.os.getenv', return_value=None):
+            content, data = compose_insight(self.user, 'summary')
+        self.assertIn('R$ 25.00', content)
+        self.assertEqual(data['categories'][0]['category'], 'Alimentação')
+
+
+class ChatMemoryTestCase(TestCase):
+    memory_settings = {'WINDOW_MESSAGES': 4, 'SUMMARY_BATCH': 4, 'MAX_TOKENS': 3000, 'SUMMARY_MAX_TOKENS': 100}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('mem', 'mem@x.com', 'pass')
+        self.replies = []
+        self.summaries = []
+
+        def fake_generate(prompt, system_instruction=None, **kwargs):
+            if system_instruction.startswith('Você resume'):
+                self.summaries.append(prompt)
+                return f'resumo {len(self.summaries)}'
+            self.replies.append((prompt, system_instruction))
+            return f'resposta {len(self.replies)}'
+
+        patcher = patch('core.gemini.generate_text', side_effect=fake_generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Sem thread no teste: o resumo roda no commit, depois da resposta
+        fold = patch('analysis.memory._start_fold', side_effect=memory.fold_pending)
+        self.start_fold = fold.start()
+        self.addCleanup(fold.stop)
+
+    def chat(self, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return chat_with_agent(self.user, text)
+
+    def test_context_keeps_window_and_rolling_summary(self):
+        with self.settings(CHAT_MEMORY=self.memory_settings):
+            first = self.chat('mensagem 1')
+            self.assertEqual(self.replies[0][0], [{'role': 'user', 'parts': [{'text': 'mensagem 1'}]}])
+            self.assertEqual(first.metadata['context']['window'], 1)
+
+            for i in range(2, 11):
+                self.chat(f'mensagem {i}')
+
+        # Janela nunca passa de janela + lote, e o resumo é refeito a cada lote
+        self.assertTrue(all(len(contents) <= 8 for contents, _ in self.replies))
+        self.assertEqual(len(self.summaries), 4)
+        contents, system_instruction = self.replies[-1]
+        self.assertEqual(contents[-1]['parts'][0]['text'], 'mensagem 10')
+        self.assertIn('resumo 3', system_instruction)
+        self.assertIn('resumo 3', self.summaries[-1])  # o novo resumo parte do anterior
+
+        memory = ConversationMemory.objects.get(user=self.user)
+        self.assertEqual(memory.summary, 'resumo 4')
+        self.assertLess(memory.summarized_until, ChatMessage.objects.get(message='mensagem 10').id)
+
+    def test_summary_failure_keeps_previous_summary(self):
+        ConversationMemory.objects.create(user=self.user, summary='antigo', summarized_until=0)
+        for i in range(4):
+            ChatMessage.objects.create(user=self.user, role='user', message=f'm{i}')
+            ChatMessage.objects.create(user=self.user, role='agent', message=f'r{i}')
+
+        with self.settings(CHAT_MEMORY=self.memory_settings), \
+             patch('analysis.memory.gemini.generate_text', side_effect=['ok', RuntimeError('fora do ar')]):
+            reply = self.chat('nova')
+        self.assertEqual(reply.message, 'ok')
+        memory = ConversationMemory.objects.get(user=self.user)
+        self.assertEqual((memory.summary, memory.summarized_until), ('antigo', 0))
+
+    def test_summary_is_not_made_inside_the_request(self):
+        self.start_fold.side_effect = None
+        with self.settings(CHAT_MEMORY=self.memory_settings):
+            for i in range(10):
+                self.chat(f'mensagem {i}')
+        # Uma só chamada ao Gemini por mensagem; o resumo fica para depois da resposta
+        self.assertEqual((len(self.replies), len(self.summaries)), (10, 0))
+        self.assertEqual(self.start_fold.call_count, 10)
+        self.assertTrue(all(len(contents) <= 8 for contents, _ in self.replies))
+
+
+class ChatStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('sse', 'sse@x.com', 'pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.server = FakeGeminiServer(reply='Gaste menos com delivery.').start()
+        overrides = override_settings(GEMINI={**settings.GEMINI, 'BASE_URL': self.server.base_url})
+        overrides.enable()
+        env = patch.dict('os.environ', {'GOOGLE_API_KEY': 'fake-key'})
+        env.start()
+        gemini.reset_client()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(overrides.disable)
+        self.addCleanup(env.stop)
+        self.addCleanup(gemini.reset_client)
+
+    def events(self, resp):
+        # O test client é síncrono: consome o stream assíncrono (e avisa que faz isso)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            body = b''.join(resp).decode('utf-8')
+        return [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.strip().split('\n\n')
+        ]
+
+    def test_streams_tokens_and_saves_message(self):
+        resp = self.client.post('/analysis/chats/chat/stream/', {'message': 'como economizar?'},
+                                format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        events = self.events(resp)
+
+        tokens = [data['text'] for event, data in events if event == 'token']
+        self.assertEqual(len(tokens), 4)
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['message'], 'Gaste menos com delivery.')
+        saved = ChatMessage.objects.get(id=events[-1][1]['id'])
+        self.assertTrue(saved.metadata['streamed'])
+        self.assertEqual(ChatMessage.objects.filter(user=self.user).count(), 2)
+
+    def test_stream_error_event(self):
+        async def broken(*args, **kwargs):
+            raise RuntimeError('falhou')
+            yield  # pragma: no cover
+
+        with patch('core.gemini.stream_text', broken):
+            resp = self.client.post('/analysis/chats/chat/stream/', {'message': 'oi'}, format='json')
+            events = self.events(resp)  # o stream só roda ao ser consumido
+        self.assertEqual(events, [('error', {'detail': 'Falha ao gerar a resposta.'})])
+        self.assertFalse(ChatMessage.objects.filter(role='agent').exists())
+
+    def test_chat_list_is_paginated(self):
+        for i in range(3):
+            ChatMessage.objects.create(user=self.user, role='user', message=f'm{i}')
+        resp = self.client.get('/analysis/chats/?page_size=2')
+        self.assertEqual([m['message'] for m in resp.data['results']], ['m2', 'm1'])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([m['message'] for m in resp.data['results']], ['m0'])
+        self.assertIsNone(resp.data['next'])
+
+    def test_missing_message(self):
+        resp = self.client.post('/analysis/chats/chat/stream/', {}, format='json')
+        self.assertEqual(resp.status_code, 400)
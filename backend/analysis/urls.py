@@ -1,8 +1,9 @@
 from rest_framework.routers import DefaultRouter
-from .views import InsightViewSet, ChatMessageViewSet
+from .views import InsightViewSet, ChatMessageViewSet, InsightJobViewSet
 
 router = DefaultRouter()
 router.register(r'insights', InsightViewSet, basename='insight')
+router.register(r'insight-jobs', InsightJobViewSet, basename='insight-job')
 router.register(r'chats', ChatMessageViewSet, basename='chat')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -1,26 +1,74 @@
-from rest_framework import viewsets, permissions
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
-from .models import Insight, ChatMessage
-from .serializers import InsightSerializer, ChatMessageSerializer
-from .services import generate_insight_for_user, chat_with_agent
+from rest_framework.reverse import reverse
+from core import gemini
+from core.pagination import KeysetPagination, CreatedAtKeysetPagination
+from core.throttling import LLMThrottleMixin
+from .models import Insight, ChatMessage, InsightJob
+from .serializers import InsightSerializer, ChatMessageSerializer, InsightJobSerializer
+from .services import chat_with_agent, prepare_chat, stream_agent_reply
+from .jobs import enqueue_insight
+
+logger = logging.getLogger(__name__)
+
+def sse_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode('utf-8')
 
-class InsightViewSet(viewsets.ReadOnlyModelViewSet):
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite `Accept: text/event-stream` nas actions de streaming; respostas
+    de erro comuns saem como JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, default=str).encode('utf-8')
+
+class InsightViewSet(LLMThrottleMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class   = InsightSerializer
+    pagination_class   = CreatedAtKeysetPagination
+    llm_actions        = ('generate',)
     
     def get_queryset(self):
         return Insight.objects.filter(user=self.request.user)
     
     @action(detail=False, methods=['post'], url_path='generate/(?P<insight_type>[^/.]+)')
     def generate(self, request, insight_type=None):
-        insight = generate_insight_for_user(request.user, insight_type)
-        return Response(InsightSerializer(insight).data, status=201)
+        """
+        Enfileira a geração do insight e responde 202 com o job; o resultado
+        é acompanhado em /analysis/insight-jobs/{id}/. Se já houver um job
+        ativo do mesmo tipo, ele é devolvido em vez de criar outro.
+        """
+        if insight_type not in dict(Insight.TYPE_CHOICES):
+            return Response({'detail': 'Tipo de insight inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        job, _ = enqueue_insight(request.user, insight_type)
+        return Response(
+            InsightJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('insight-job-detail', args=[job.id], request=request)}
+        )
+
+class InsightJobViewSet(viewsets.ReadOnlyModelViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class   = InsightJobSerializer
+
+    def get_queryset(self):
+        return InsightJob.objects.filter(user=self.request.user).order_by('-id')
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(LLMThrottleMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class   = ChatMessageSerializer
+    pagination_class   = KeysetPagination
+    llm_actions        = ('chat', 'chat_stream')
 
     def get_queryset(self):
         return ChatMessage.objects.filter(user=self.request.user)
@@ -31,5 +79,44 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='chat')
     def chat(self, request):
         text = request.data.get('message')
-        agent_msg = chat_with_agent(request.user, text)
+        try:
+            agent_msg = chat_with_agent(request.user, text)
+        except gemini.GeminiUnavailable as exc:
+            logger.warning("Chat sem Gemini: %s", exc)
+            return Response(
+                {'detail': 'O assistente está indisponível no momento. Tente novamente em instantes.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(gemini.retry_after())},
+            )
         return Response(self.get_serializer(agent_msg).data, status=201)
+
+    @action(detail=False, methods=['post'], url_path='chat/stream',
+            renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def chat_stream(self, request):
+        """
+        Como /chat/, mas responde em server-sent events: um evento `token` por
+        pedaço de texto recebido do Gemini e, no fim, `done` com a mensagem
+        salva (ou `error`). Sob ASGI o stream roda no event loop, sem prender
+        uma thread síncrona enquanto o modelo responde.
+        """
+        text = request.data.get('message')
+        if not text:
+            return Response({'message': ['Este campo é obrigatório.']}, status=status.HTTP_400_BAD_REQUEST)
+        contents, system_instruction, context = prepare_chat(request.user, text)
+        events = self._sse(stream_agent_reply(request.user, contents, system_instruction, context))
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # desliga o buffer de proxies (nginx)
+        return response
+
+    async def _sse(self, reply):
+        try:
+            async for event, payload in reply:
+                if event == 'done':
+                    payload = self.get_serializer(payload).data
+                else:
+                    payload = {'text': payload}
+                yield sse_event(event, payload)
+        except Exception as exc:
+            logger.warning("Falha no stream do chat: %s", exc)
+            yield sse_event('error', {'detail': 'Falha ao gerar a resposta.'})
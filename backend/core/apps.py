@@ -7,3 +7,7 @@ class CoreConfig(AppConfig):
     def ready(self):
         # importa o módulo que registra o plugin no plugin_dir
         import core.healthchecks  
+        # conecta os signals que invalidam o cache de usuários autenticados
+        import core.authentication
+        # conecta o timer de consultas usado no perfil das requisições
+        import core.profiling
@@ -1,9 +1,71 @@
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import metrics
+
+# Usuários já resolvidos por jti do access token. Em memória, por processo:
+# a invalidação abaixo só alcança o processo atual, então o TTL curto é o
+# limite de tempo em que outro processo pode servir um usuário desatualizado.
+_users = None
+_lock = threading.Lock()
+# Incrementado a cada invalidação: um usuário lido do banco antes dela não entra no cache
+_generation = 0
+
+
+def _cache():
+    global _users
+    with _lock:
+        if _users is None:
+            _users = TTLCache(maxsize=settings.AUTH_CACHE['MAXSIZE'], ttl=settings.AUTH_CACHE['TTL'])
+        return _users
+
+
+def forget_token(validated_token):
+    """
+    Remove do cache o usuário resolvido para este token.
+    """
+    global _generation
+    if validated_token is not None:
+        users = _cache()
+        with _lock:
+            users.pop(validated_token.get(api_settings.JTI_CLAIM), None)
+            _generation += 1
+
+
+def forget_user(user_id):
+    """
+    Remove do cache todas as entradas do usuário (perfil alterado, logout, blacklist).
+    """
+    global _generation
+    users = _cache()
+    with _lock:
+        _generation += 1
+        for jti in [jti for jti, user in users.items() if user.pk == user_id]:
+            users.pop(jti, None)
+
+
+def reset_cache():
+    global _users
+    with _lock:
+        _users = None
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     """
     Autenticação via JWT buscando primeiro no header Authorization,
     e em seguida no cookie 'access'.
+
+    Com AUTH_CACHE['ENABLED'], o usuário resolvido fica em cache pelo jti do
+    token, e as requisições seguintes com o mesmo token não consultam o banco.
     """
     def authenticate(self, request):
         # Primeiro tenta o header padrão
@@ -18,5 +80,34 @@ class CookieJWTAuthentication(JWTAuthentication):
             return None
 
         validated = self.get_validated_token(raw_token)
-        user = self.get_user(validated)
+        user = self.get_cached_user(validated)
         return user, validated
+
+    def get_cached_user(self, validated_token):
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if not settings.AUTH_CACHE['ENABLED'] or jti is None:
+            return self.get_user(validated_token)
+
+        users = _cache()
+        with _lock:
+            user, generation = users.get(jti), _generation
+        if user is None:
+            metrics.incr('auth_cache.miss')
+            user = self.get_user(validated_token)
+            with _lock:
+                if generation == _generation:
+                    users[jti] = user
+        else:
+            metrics.incr('auth_cache.hit')
+        # Cópia rasa: a view pode alterar atributos sem afetar a entrada do cache
+        return copy.copy(user)
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def forget_blacklisted_user(sender, instance, **kwargs):
+    forget_user(instance.token.user_id)
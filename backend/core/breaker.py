@@ -0,0 +1,88 @@
+"""
+Circuit breaker simples, por processo.
+
+Fechado: as chamadas passam e o resultado de cada uma entra numa janela das
+últimas N. Se a taxa de falhas da janela passa do limite, abre: as chamadas
+são recusadas na hora durante OPEN_SECONDS. Depois disso fica meio-aberto e
+deixa passar uma única chamada de teste; se ela der certo, fecha de novo,
+senão volta a abrir.
+"""
+import threading
+import time
+from collections import deque
+
+from . import metrics
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, window, min_calls, failure_rate, open_seconds, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._results = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._opened_at = None
+        self._probing = False
+        self._set_state(self.CLOSED)
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.set_gauge(f'{self.name}.breaker.state', state)
+        metrics.incr(f'{self.name}.breaker.{state}')
+
+    def allow(self) -> bool:
+        """
+        True se a chamada pode seguir. Quem recebe True deve chamar record()
+        (ou cancel(), se desistir antes de chamar o serviço).
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def remaining(self) -> float:
+        """
+        Segundos até o circuito aberto aceitar a chamada de teste (0 se não estiver aberto).
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(self.open_seconds - (self.clock() - self._opened_at), 0.0)
+
+    def cancel(self):
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._results.clear()
+                    self._set_state(self.CLOSED)
+                else:
+                    self._open()
+                return
+            if self.state == self.OPEN:
+                return  # chamada que começou antes de abrir
+            self._results.append(ok)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self._opened_at = self.clock()
+        self._results.clear()
+        self._set_state(self.OPEN)
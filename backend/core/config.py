@@ -9,6 +9,86 @@ class EnvSettings(BaseSettings):
         None,
         description="Chave da API do Google Gemini."
     )
+    GEMINI_BASE_URL: Optional[str] = Field(
+        None,
+        description="URL base alternativa da API Gemini (ex.: servidor fake local)."
+    )
+    GEMINI_TIMEOUT_MS: int = Field(
+        30000,
+        description="Timeout de cada chamada ao Gemini, em milissegundos."
+    )
+    GEMINI_MAX_CONCURRENCY: int = Field(
+        8,
+        description="Máximo de chamadas simultâneas ao Gemini por processo."
+    )
+    GEMINI_MAX_KEEPALIVE: int = Field(
+        10,
+        description="Conexões HTTP mantidas abertas para reutilização."
+    )
+    GEMINI_ACQUIRE_TIMEOUT_MS: int = Field(
+        2000,
+        description="Espera máxima (ms) por uma vaga entre as chamadas simultâneas ao Gemini."
+    )
+    CACHE_BACKEND: str = Field(
+        'django.core.cache.backends.locmem.LocMemCache',
+        description="Backend do cache do Django; em produção use um compartilhado (ex.: Redis)."
+    )
+    CACHE_LOCATION: str = Field(
+        '',
+        description="Localização do cache (ex.: redis://127.0.0.1:6379/1)."
+    )
+    THROTTLE_STORE: str = Field(
+        'cache',
+        description="Onde ficam os contadores de throttling: 'cache' ou 'sqlite' (arquivo local)."
+    )
+    DATABASE_ENGINE: str = Field(
+        'sqlite',
+        description="Banco de dados: 'sqlite' (arquivo local) ou 'postgres'."
+    )
+    DATABASE_NAME: str = Field(
+        'finance',
+        description="Nome do banco Postgres (no SQLite o arquivo é sempre db.sqlite3)."
+    )
+    DATABASE_USER: str = Field('finance', description="Usuário do Postgres.")
+    DATABASE_PASSWORD: str = Field('', description="Senha do Postgres.")
+    DATABASE_HOST: str = Field('localhost', description="Host do Postgres.")
+    DATABASE_PORT: int = Field(5432, description="Porta do Postgres.")
+    DATABASE_CONN_MAX_AGE: int = Field(
+        60,
+        description="Segundos que uma conexão persistente é reaproveitada (0 fecha a cada requisição)."
+    )
+    DATABASE_POOL_MAX_SIZE: int = Field(
+        0,
+        description="Postgres: tamanho máximo do pool de conexões do psycopg (0 desliga o pool)."
+    )
+    DATABASE_POOL_MIN_SIZE: int = Field(
+        2,
+        description="Postgres: conexões mantidas abertas no pool."
+    )
+    DATABASE_POOL_TIMEOUT: int = Field(
+        10,
+        description="Postgres: segundos esperando uma conexão livre no pool."
+    )
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(
+        5000,
+        description="SQLite: quanto uma escrita espera pelo lock antes de falhar."
+    )
+    LOG_LEVEL: str = Field(
+        'INFO',
+        description="Nível do log raiz (DEBUG, INFO, WARNING...)."
+    )
+    PROFILING_SAMPLE_RATE: float = Field(
+        0.1,
+        description="Fração das requisições com perfil (log e, se permitido, Server-Timing); 0 desliga."
+    )
+    PROFILING_SERVER_TIMING: bool = Field(
+        False,
+        description="Envia o header Server-Timing a todos; sem isso, só a usuários staff."
+    )
+    PROFILING_SLOW_MS: Optional[int] = Field(
+        1000,
+        description="Requisições acima deste tempo logam suas consultas mais lentas."
+    )
 
 # Carrega sem exception
 env_settings = EnvSettings()
@@ -0,0 +1,109 @@
+"""
+Cache de respostas por versão dos dados do usuário.
+
+Cada usuário tem um contador de versão no cache do Django, incrementado a
+cada escrita em Transaction, Category ou Goal (signals em finances). As
+respostas ficam em cache sob chaves que incluem a versão, então uma
+escrita invalida tudo do usuário sem precisar apagar chave por chave.
+O ETag também deriva da versão: um `If-None-Match` igual responde 304
+consultando só o cache, sem tocar no banco.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+
+
+def _version_key(user_id):
+    return f'data-version:{user_id}'
+
+
+def data_version(user_id) -> int:
+    """
+    Versão atual dos dados do usuário. Se a chave sumiu do cache (expirou ou
+    foi despejada), começa de um valor novo baseado no relógio, para nunca
+    reaproveitar uma versão antiga.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def bump_data_version(user_id):
+    """
+    Invalida as respostas em cache do usuário. Incrementa já e de novo no
+    commit, para que nada calculado antes do commit fique com a versão nova.
+    """
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def _record(outcome):
+    metrics.incr(f'data_cache.{outcome}')
+    hits = metrics.counter('data_cache.hit') + metrics.counter('data_cache.not_modified')
+    metrics.set_gauge('data_cache.hit_ratio', metrics.ratio(hits, metrics.counter('data_cache.miss')))
+
+
+def _etag(name, request, version):
+    from finances.services import user_today  # finances importa este módulo
+
+    # A data local do usuário entra na chave: relatórios "dos últimos 30 dias"
+    # mudam à meia-noite no fuso dele
+    raw = '|'.join([
+        name, str(request.user.pk), str(version), request.get_host(),
+        request.get_full_path(), user_today(request.user).isoformat(),
+    ])
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+def cache_by_data_version(name):
+    """
+    Decorator para métodos de ViewSet (list ou actions GET) cujo resultado
+    depende só dos dados do usuário e da URL.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag = _etag(name, request, data_version(request.user.pk))
+            if _matches(request, etag):
+                _record('not_modified')
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            key = f'data-cache:{etag}'
+            data = cache.get(key)
+            if data is not None:
+                _record('hit')
+                response = Response(data)
+            else:
+                _record('miss')
+                response = method(self, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, response.data, settings.DATA_CACHE['TIMEOUT'])
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+                response['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
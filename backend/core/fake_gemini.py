@@ -0,0 +1,97 @@
+"""
+Servidor HTTP local que imita os endpoints do Gemini usados pelo projeto.
+
+Permite medir latência e testar o cliente sem rede: aponte GEMINI_BASE_URL
+para ele (ex.: http://127.0.0.1:8765/) com qualquer GOOGLE_API_KEY.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # mantém a conexão aberta (keep-alive)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _candidate(self, text):
+        return {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'finishReason': 'STOP',
+            }],
+        }
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if '/models' in self.path:
+            self._send_json({'models': [{'name': 'models/gemini-2.0-flash'}]})
+        else:
+            self._send_json({'error': {'code': 404, 'message': 'not found'}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.server.requests.append(json.loads(self.rfile.read(length) or b'{}'))
+        time.sleep(self.server.latency)
+        reply = self.server.reply
+        if self.server.status != 200:
+            self._send_json({'error': {'code': self.server.status, 'message': 'fake error'}}, status=self.server.status)
+        elif ':streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for word in reply.split(' '):
+                chunk = json.dumps(self._candidate(word + ' '))
+                self.wfile.write(f'data: {chunk}\r\n\r\n'.encode('utf-8'))
+                self.wfile.flush()
+            self.close_connection = True
+        elif ':generateContent' in self.path:
+            self._send_json(self._candidate(reply))
+        else:
+            self._send_json({'error': {'code': 404, 'message': 'not found'}}, status=404)
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, reply='{}', status=200):
+        super().__init__(address, FakeGeminiHandler)
+        self.latency = latency
+        self.reply = reply
+        self.status = status  # != 200: responde erro em generateContent
+        self.requests = []
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        """
+        Sobe o servidor em uma thread daemon e o retorna.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # Cliente que desistiu (ex.: prazo estourado) não é erro do servidor
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
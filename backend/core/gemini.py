@@ -0,0 +1,315 @@
+"""
+Cliente Google Gemini compartilhado pelo processo.
+
+O `genai.Client` (e o pool de conexões HTTP por trás dele) é criado uma única
+vez, na primeira chamada, e reutilizado por todos os serviços. Toda chamada
+passa pela mesma proteção:
+
+- circuit breaker (core.breaker): com muitas falhas recentes, recusa na hora;
+- bulkhead: no máximo MAX_CONCURRENCY chamadas simultâneas, e quem não
+  consegue vaga em ACQUIRE_TIMEOUT_MS desiste, sem prender o worker;
+- prazo por finalidade (DEADLINES_MS): parse, chat, insight...
+
+Os três casos levantam GeminiUnavailable, que os serviços tratam com o
+caminho sem LLM (parse vazio, texto local do insight, 503 no chat).
+
+O SDK (google.genai, com o httpx) só é importado na primeira chamada, por
+sdk(): processos que nunca falam com o Gemini não pagam essa importação.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics, profiling
+from .breaker import CircuitBreaker
+
+
+class GeminiUnavailable(Exception):
+    """O Gemini não pode ser usado agora (sem GOOGLE_API_KEY, circuito aberto, sem vaga ou falha)."""
+
+
+class GeminiCircuitOpen(GeminiUnavailable):
+    """Muitas falhas recentes: a chamada foi recusada sem tentar."""
+
+
+class GeminiBusy(GeminiUnavailable):
+    """Nenhuma vaga no limite de chamadas simultâneas dentro do prazo."""
+
+
+class GeminiCallFailed(GeminiUnavailable):
+    """A chamada ao Gemini falhou (erro da API, rede ou prazo)."""
+
+
+class GeminiTimeout(GeminiCallFailed):
+    """A chamada passou do prazo."""
+
+
+_client = None
+_client_lock = threading.Lock()
+_slots = None
+_breaker = None
+
+
+def _config(key):
+    return settings.GEMINI[key]
+
+
+def sdk():
+    """
+    Módulo google.genai (com .types e .errors), importado no primeiro uso.
+    """
+    from google import genai
+    return genai
+
+
+def _httpx():
+    import httpx
+    return httpx
+
+
+def model_id():
+    return _config('MODEL_ID')
+
+
+def is_configured():
+    return bool(os.getenv('GOOGLE_API_KEY'))
+
+
+def get_client():
+    """
+    Retorna o cliente do processo, criando-o na primeira chamada.
+    Devolve None se não houver GOOGLE_API_KEY.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    if not is_configured():
+        return None
+    with _client_lock:
+        if _client is None:
+            genai = sdk()
+            limits = _httpx().Limits(
+                max_connections=_config('MAX_CONCURRENCY'),
+                max_keepalive_connections=_config('MAX_KEEPALIVE'),
+            )
+            http_options = genai.types.HttpOptions(
+                base_url=_config('BASE_URL'),
+                timeout=_config('TIMEOUT_MS'),
+                client_args={'limits': limits},
+                async_client_args={'limits': limits},
+            )
+            _client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'), http_options=http_options)
+    return _client
+
+
+def reset_client():
+    """
+    Descarta o cliente atual (ex.: após mudar a configuração em testes).
+    """
+    global _client, _slots, _breaker
+    with _client_lock:
+        _client = None
+        _slots = None
+        _breaker = None
+
+
+def _call_slots():
+    """
+    Semáforo que limita as chamadas simultâneas ao Gemini neste processo.
+    """
+    global _slots
+    if _slots is None:
+        with _client_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(_config('MAX_CONCURRENCY'))
+    return _slots
+
+
+def breaker():
+    global _breaker
+    if _breaker is None:
+        with _client_lock:
+            if _breaker is None:
+                config = _config('BREAKER')
+                _breaker = CircuitBreaker(
+                    'gemini', window=config['WINDOW'], min_calls=config['MIN_CALLS'],
+                    failure_rate=config['FAILURE_RATE'], open_seconds=config['OPEN_SECONDS'],
+                )
+    return _breaker
+
+
+def retry_after():
+    """
+    Segundos sugeridos ao cliente (header Retry-After) quando o Gemini não responde.
+    """
+    return max(math.ceil(breaker().remaining()), 1)
+
+
+def _require_client():
+    client = get_client()
+    if client is None:
+        raise GeminiUnavailable("GOOGLE_API_KEY não está definido")
+    return client
+
+
+def _deadline(purpose):
+    return _config('DEADLINES_MS').get(purpose, _config('TIMEOUT_MS'))
+
+
+def _admit(purpose):
+    """
+    Passa pelo circuit breaker. Levanta GeminiCircuitOpen se estiver aberto.
+    """
+    if not breaker().allow():
+        metrics.incr('gemini.rejected.breaker')
+        raise GeminiCircuitOpen(f"Gemini indisponível (circuito aberto), chamada '{purpose}' recusada")
+
+
+def _provider_failed(exc):
+    # Erros 4xx (exceto 429) são do pedido, não do serviço: não abrem o circuito
+    return not (isinstance(exc, sdk().errors.ClientError) and exc.code != 429)
+
+
+def _outcome(purpose, exc):
+    """
+    Registra o resultado no breaker e nas métricas; devolve a exceção a levantar.
+    """
+    if exc is None:
+        breaker().record(True)
+        metrics.incr('gemini.calls.ok')
+        return None
+    breaker().record(not _provider_failed(exc))
+    if isinstance(exc, (_httpx().TimeoutException, TimeoutError)):
+        metrics.incr('gemini.calls.timeout')
+        return GeminiTimeout(f"Gemini passou do prazo de {_deadline(purpose)} ms ('{purpose}')")
+    metrics.incr('gemini.calls.failed')
+    return GeminiCallFailed(f"Falha na chamada ao Gemini ('{purpose}'): {exc}")
+
+
+@contextmanager
+def _guarded(purpose):
+    """
+    Breaker + vaga no bulkhead + registro do resultado de uma chamada síncrona.
+    """
+    _admit(purpose)
+    slots = _call_slots()
+    if not slots.acquire(timeout=_config('ACQUIRE_TIMEOUT_MS') / 1000):
+        breaker().cancel()
+        metrics.incr('gemini.rejected.busy')
+        raise GeminiBusy(f"Sem vaga para chamar o Gemini ('{purpose}')")
+    try:
+        with profiling.llm_call():
+            yield
+    except GeminiUnavailable:
+        breaker().cancel()
+        raise
+    except Exception as exc:
+        raise _outcome(purpose, exc) from exc
+    else:
+        _outcome(purpose, None)
+    finally:
+        slots.release()
+
+
+def _config_for(purpose, system_instruction, max_output_tokens, temperature):
+    types = sdk().types
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        max_output_tokens=max_output_tokens,
+        temperature=temperature,
+        http_options=types.HttpOptions(timeout=_deadline(purpose)),
+    )
+
+
+def generate_text(prompt, *, system_instruction=None, max_output_tokens=None, temperature=None, purpose='default'):
+    """
+    Envia o prompt e retorna o texto da resposta. `prompt` pode ser um texto
+    (turno único) ou uma lista de turnos {'role': 'user'|'model', 'parts': [...]}.
+    `purpose` escolhe o prazo em GEMINI['DEADLINES_MS'].
+    """
+    client = _require_client()
+    config = _config_for(purpose, system_instruction, max_output_tokens, temperature)
+    with _guarded(purpose):
+        response = client.models.generate_content(model=model_id(), contents=prompt, config=config)
+    return response.text
+
+
+async def _acquire_slot(slots):
+    """
+    Espera uma vaga numa thread, sem travar o event loop. Se a espera for
+    cancelada, a vaga que a thread ainda conseguir é devolvida.
+    """
+    waiter = asyncio.ensure_future(
+        asyncio.to_thread(slots.acquire, True, _config('ACQUIRE_TIMEOUT_MS') / 1000)
+    )
+    try:
+        return await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        waiter.add_done_callback(
+            lambda done: not done.cancelled() and done.result() and slots.release()
+        )
+        raise
+
+
+async def stream_text(prompt, *, system_instruction=None, max_output_tokens=None, temperature=None, purpose='chat'):
+    """
+    Versão assíncrona e em streaming de generate_text: gera os pedaços de
+    texto conforme chegam, sem ocupar uma thread durante a resposta (só
+    enquanto espera uma vaga no limite de chamadas simultâneas). O prazo
+    vale para o stream inteiro.
+    """
+    client = _require_client()
+    config = _config_for(purpose, system_instruction, max_output_tokens, temperature)
+    _admit(purpose)
+    try:
+        slots = _call_slots()
+        acquired = await _acquire_slot(slots)
+    except BaseException:
+        # Cancelado na fila: a chamada de teste do breaker não aconteceu
+        breaker().cancel()
+        raise
+    if not acquired:
+        breaker().cancel()
+        metrics.incr('gemini.rejected.busy')
+        raise GeminiBusy(f"Sem vaga para chamar o Gemini ('{purpose}')")
+    deadline = time.monotonic() + _deadline(purpose) / 1000
+    error = None
+    try:
+        with profiling.llm_call():
+            stream = await asyncio.wait_for(
+                client.aio.models.generate_content_stream(model=model_id(), contents=prompt, config=config),
+                deadline - time.monotonic(),
+            )
+            chunks = aiter(stream)
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), deadline - time.monotonic())
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    yield chunk.text
+    except (GeneratorExit, asyncio.CancelledError):
+        # O cliente desconectou: não é falha do Gemini
+        breaker().cancel()
+        raise
+    except Exception as exc:
+        error = exc
+    finally:
+        slots.release()
+    if error is not None:
+        raise _outcome(purpose, error) from error
+    _outcome(purpose, None)
+
+
+def list_models():
+    """
+    Chamada leve usada pelo health check: busca a primeira página de modelos.
+    """
+    client = _require_client()
+    with _guarded('health'):
+        return client.models.list(config={'page_size': 1, 'http_options': {'timeout': _deadline('health')}})
@@ -1,27 +1,100 @@
-import os
-from google import genai
+"""
+Health check do Gemini para o django-health-check.
+
+O teste de rede (listar 1 modelo) não roda a cada requisição de /health/:
+o resultado fica guardado por GEMINI_HEALTH['TTL_SECONDS'] e, depois disso,
+a próxima verificação devolve o resultado guardado e dispara uma atualização
+em segundo plano. Só a primeira verificação do processo espera a chamada.
+Um resultado mais velho que MAX_AGE_SECONDS (a atualização não volta) conta
+como erro.
+"""
+import threading
+import time
+
+from django.conf import settings
 from health_check.backends import BaseHealthCheckBackend
 from health_check.exceptions import HealthCheckException
-from health_check.plugins import plugin_dir 
-from .config import env_settings
+from health_check.plugins import plugin_dir
+
+from . import gemini, metrics
+
+_lock = threading.Lock()
+_result = None  # (momento do teste, mensagem de erro ou None)
+_worker = None
+
+
+def _config(key):
+    return settings.GEMINI_HEALTH[key]
+
+
+def _probe():
+    if not gemini.is_configured():
+        return "GOOGLE_API_KEY não está definido"
+    try:
+        # chamada leve: lista apenas 1 modelo, pelo cliente compartilhado
+        gemini.list_models()
+    except Exception as e:
+        return f"Erro conectando ao Gemini: {e!r}"
+    return None
+
+
+def refresh():
+    """
+    Testa o Gemini agora e guarda o resultado. Devolve o erro (None se ok).
+    """
+    global _result
+    error = _probe()
+    metrics.incr('health.gemini.refresh')
+    with _lock:
+        _result = (time.monotonic(), error)
+    return error
+
+
+def _refresh_in_background():
+    global _worker
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=refresh, name='gemini-health', daemon=True)
+        _worker.start()
+
+
+def gemini_status():
+    """
+    Erro do último teste do Gemini (None se ok), sem esperar a rede exceto
+    na primeira vez.
+    """
+    with _lock:
+        result = _result
+    if result is None:
+        return refresh()
+    checked_at, error = result
+    age = time.monotonic() - checked_at
+    if age >= _config('TTL_SECONDS'):
+        _refresh_in_background()
+    if age >= _config('MAX_AGE_SECONDS'):
+        return f"Último teste do Gemini há {age:.0f} s"
+    return error
+
+
+def reset():
+    """
+    Descarta o resultado guardado (usado nos testes).
+    """
+    global _result
+    with _lock:
+        _result = None
+
 
 class GeminiHealthCheck(BaseHealthCheckBackend):
     """Verifica se conseguimos conversar com a API Google Gemini."""
     def check_status(self):
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise HealthCheckException("GOOGLE_API_KEY não está definido")
-        try:
-            client = genai.Client(api_key=api_key)
-            # chamada leve: lista apenas 1 modelo
-            models = client.models.list()
-            if not models:
-                # se a lista vier vazia, OK também, mas você pode opcionalmente checar conteúdo
-                return
-        except Exception as e:
-            raise HealthCheckException(f"Erro conectando ao Gemini: {e!r}")
+        error = gemini_status()
+        if error is not None:
+            raise HealthCheckException(error)
 
     def identifier(self):
         return "Google Gemini API"
-    
-plugin_dir.register(GeminiHealthCheck)
\ No newline at end of file
+
+
+plugin_dir.register(GeminiHealthCheck)
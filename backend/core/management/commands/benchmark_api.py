@@ -0,0 +1,227 @@
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import time
+import warnings
+from collections import Counter
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analysis.jobs import claim_job, run_job
+from analysis.models import ChatMessage, Insight
+from core import gemini
+from core.fake_gemini import FakeGeminiServer
+from core.throttling import SlidingWindowRateThrottle
+from finances.models import Category, Goal, Transaction
+from finances.services import rebuild_daily_summary
+
+EXPENSES = {
+    # categoria: (peso, valor mediano)
+    'Alimentação': (30, 35), 'Mercado': (15, 180), 'Transporte': (20, 22), 'Lazer': (8, 60),
+    'Saúde': (4, 120), 'Moradia': (2, 1500), 'Educação': (2, 400), 'Assinaturas': (5, 40),
+    'Vestuário': (4, 150), 'Outros': (10, 50),
+}
+INCOMES = {'Salário': 5000, 'Freelance': 1200}
+CHAT_TEXTS = ['quanto gastei com mercado?', 'como economizar no transporte?', 'resuma meu mês']
+CREATE_TEXTS = ['uber 18', 'almoço 35 reais ontem', 'paguei a conta de luz', 'mercado 230,50', 'presente da tia']
+# Resposta do Gemini fake: serve tanto para o parse (JSON) quanto como texto livre
+STUB_REPLY = json.dumps({
+    'amount': 42.5, 'date': None, 'category': 'Outros', 'location': None, 'type': 'expense'
+})
+
+
+def seed_user(user, transactions, rng):
+    """
+    Um ano de histórico: despesas com valores log-normais por categoria,
+    salário mensal e freelas esporádicos, metas, insights e conversa.
+    """
+    cats = {
+        name: Category.objects.create(user=user, name=name, type=Category.EXPENSE) for name in EXPENSES
+    }
+    incomes = {
+        name: Category.objects.create(user=user, name=name, type=Category.INCOME) for name in INCOMES
+    }
+    now = timezone.now()
+    names, weights = zip(*((name, weight) for name, (weight, _) in EXPENSES.items()))
+    rows = []
+    for month in range(12):
+        rows.append(Transaction(
+            user=user, category=incomes['Salário'], type=Category.INCOME, amount=INCOMES['Salário'],
+            raw_text='salário', timestamp=now - timedelta(days=30 * month + 1)
+        ))
+        if rng.random() < 0.3:
+            rows.append(Transaction(
+                user=user, category=incomes['Freelance'], type=Category.INCOME,
+                amount=round(rng.lognormvariate(math.log(INCOMES['Freelance']), 0.4), 2),
+                raw_text='freela', timestamp=now - timedelta(days=30 * month + rng.randrange(30))
+            ))
+    for _ in range(max(transactions - len(rows), 0)):
+        name = rng.choices(names, weights)[0]
+        rows.append(Transaction(
+            user=user, category=cats[name], type=Category.EXPENSE,
+            amount=round(rng.lognormvariate(math.log(EXPENSES[name][1]), 0.5), 2),
+            raw_text=name.lower(), timestamp=now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        ))
+    Transaction.objects.bulk_create(rows, batch_size=5000)
+    rebuild_daily_summary(user)
+
+    today = timezone.localdate()
+    Goal.objects.bulk_create([
+        Goal(user=user, name=f'Meta {i}', target_amount=1000 * (i + 1), start_date=today,
+             end_date=today + timedelta(days=90 * (i + 1)), frequency='monthly')
+        for i in range(3)
+    ])
+    Insight.objects.bulk_create([
+        Insight(user=user, insight_type=rng.choice(['summary', 'forecast', 'anomaly']), content='...')
+        for _ in range(20)
+    ])
+    ChatMessage.objects.bulk_create([
+        ChatMessage(user=user, role=ChatMessage.USER if i % 2 == 0 else ChatMessage.AGENT,
+                    message=rng.choice(CHAT_TEXTS))
+        for i in range(40)
+    ])
+
+
+def _percentile(samples, pct):
+    return samples[max(math.ceil(len(samples) * pct / 100) - 1, 0)]
+
+
+def _summary(latencies, queries, statuses):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'status': dict(Counter(statuses)),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'queries_mean': round(statistics.mean(queries), 1),
+        'queries_max': max(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco de teste temporário com N usuários e M transações cada, "
+        "chama cada endpoint com o Gemini substituído pelo servidor fake e mede "
+        "p50/p95/p99, consultas por requisição e pico de memória (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--transactions', type=int, default=2000, help='Transações por usuário.')
+        parser.add_argument('--requests', type=int, default=30, help='Requisições por endpoint.')
+        parser.add_argument('--llm-latency-ms', type=float, default=0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Também grava o JSON neste arquivo.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        server = FakeGeminiServer(latency=options['llm_latency_ms'] / 1000, reply=STUB_REPLY).start()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            users = []
+            for i in range(options['users']):
+                user = get_user_model().objects.create_user(f'bench{i}', f'bench{i}@example.com', 'bench')
+                seed_user(user, options['transactions'], rng)
+                users.append(user)
+            seed_seconds = time.perf_counter() - started
+
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                GEMINI={**settings.GEMINI, 'BASE_URL': server.base_url},
+            ), patch.dict(os.environ, {'GOOGLE_API_KEY': 'fake-key'}), \
+                    patch.object(SlidingWindowRateThrottle, 'allow_request', return_value=True):
+                gemini.reset_client()
+                cache.clear()
+                endpoints = self.drive(users, options['requests'], rng)
+                gemini.reset_client()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            server.stop()
+
+        result = json.dumps({
+            'users': options['users'],
+            'transactions_per_user': options['transactions'],
+            'requests_per_endpoint': options['requests'],
+            'llm_latency_ms': options['llm_latency_ms'],
+            'seed_seconds': round(seed_seconds, 1),
+            'endpoints': endpoints,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(result)
+        self.stdout.write(result)
+
+    def _login(self, user):
+        client = APIClient()
+        resp = client.post('/user/users/login/', {'username': user.username, 'password': 'bench'}, format='json')
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {resp.data['access']}")
+        return client
+
+    def drive(self, users, requests, rng):
+        clients = [self._login(user) for user in users]
+        endpoints = {
+            'transactions_list': lambda c: c.get('/finances/transactions/'),
+            'transactions_create': lambda c: c.post(
+                '/finances/transactions/', {'raw_text': rng.choice(CREATE_TEXTS), 'amount': 1}, format='json'
+            ),
+            'report_30days': lambda c: c.get('/finances/transactions/report_30days/'),
+            'report_year_daily': lambda c: c.get('/finances/transactions/report/', {
+                'start': (timezone.localdate() - timedelta(days=364)).isoformat(), 'granularity': 'day',
+            }),
+            'export_csv': lambda c: c.get('/finances/transactions/export_csv/'),
+            'export_pdf': lambda c: c.get('/finances/transactions/export_pdf/'),
+            'categories_list': lambda c: c.get('/finances/categories/'),
+            'goals_list': lambda c: c.get('/finances/goals/'),
+            'insights_list': lambda c: c.get('/analysis/insights/'),
+            'insights_generate': lambda c: c.post(f"/analysis/insights/generate/{rng.choice(['summary', 'forecast', 'anomaly'])}/"),
+            'chat_list': lambda c: c.get('/analysis/chats/'),
+            'chat': lambda c: c.post('/analysis/chats/chat/', {'message': rng.choice(CHAT_TEXTS)}, format='json'),
+            'chat_stream': lambda c: c.post('/analysis/chats/chat/stream/', {'message': rng.choice(CHAT_TEXTS)}, format='json'),
+        }
+        results = {}
+        for name, call in endpoints.items():
+            latencies, queries, statuses = [], [], []
+            for i in range(requests):
+                client = clients[i % len(clients)]
+                with CaptureQueriesContext(connection) as ctx, warnings.catch_warnings():
+                    # O cliente de teste consome respostas em streaming assíncronas com um aviso
+                    warnings.simplefilter('ignore')
+                    started = time.perf_counter()
+                    response = call(client)
+                    if response.streaming:
+                        b''.join(response)
+                    latencies.append(time.perf_counter() - started)
+                queries.append(len(ctx.captured_queries))
+                statuses.append(response.status_code)
+            results[name] = _summary(latencies, queries, statuses)
+
+        # O cálculo do insight roda no worker: mede os jobs enfileirados acima
+        latencies, queries = [], []
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                job = claim_job()
+                if job is None:
+                    break
+                run_job(job)
+                latencies.append(time.perf_counter() - started)
+            queries.append(len(ctx.captured_queries))
+        if latencies:
+            results['insight_worker'] = _summary(latencies, queries, ['done'] * len(latencies))
+        return results
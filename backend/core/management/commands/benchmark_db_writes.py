@@ -0,0 +1,132 @@
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.backends.signals import connection_created
+
+from finances.models import Category, Transaction
+
+# Modos do SQLite comparados; no Postgres roda só a configuração atual
+SQLITE_MODES = {
+    'sqlite_default': {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'sqlite_tuned': None,  # o que estiver em settings.DATABASES
+}
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'p95_ms': round(samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000, 2),
+        'p99_ms': round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede, em um banco de teste temporário, a vazão de escritas com vários "
+        "clientes em paralelo, como o perform_create de transações (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help='Escritas por cliente.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            modes = SQLITE_MODES
+        else:
+            modes = {f'{connection.vendor}_current': None}
+
+        results = {}
+        original = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'OPTIONS')}
+        for name, overrides in modes.items():
+            connection.settings_dict.update(original)
+            connection.settings_dict.update(overrides or {})
+            results[name] = self.run_mode(options['clients'], options['writes'])
+        connection.settings_dict.update(original)
+
+        self.stdout.write(json.dumps({
+            'vendor': connection.vendor,
+            'clients': options['clients'],
+            'writes_per_client': options['writes'],
+            'modes': results,
+        }, indent=2))
+
+    def run_mode(self, clients, writes):
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                # Banco em arquivo: o de teste em memória não tem disputa de lock real
+                connection.settings_dict['TEST'] = {
+                    **connection.settings_dict.get('TEST', {}), 'NAME': os.path.join(tmp, 'bench.sqlite3')
+                }
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                users = [
+                    get_user_model().objects.create_user(f'bench{i}', f'bench{i}@example.com', 'bench')
+                    for i in range(clients)
+                ]
+                categories = [
+                    Category.objects.create(user=user, name='Mercado', type=Category.EXPENSE) for user in users
+                ]
+                connection.close()
+                return self._drive(users, categories, writes)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _drive(self, users, categories, writes):
+        latencies, errors, opened = [], [], []
+        lock = threading.Lock()
+
+        def on_connect(sender, connection, **kwargs):
+            with lock:
+                opened.append(1)
+
+        def client(user, category):
+            local, failed = [], 0
+            for i in range(writes):
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        Transaction.objects.create(
+                            user=user, category=category, type=Category.EXPENSE,
+                            amount=10 + i % 50, raw_text='benchmark'
+                        )
+                    local.append(time.perf_counter() - started)
+                except OperationalError:
+                    failed += 1
+                # Fim da "requisição": fecha a conexão se CONN_MAX_AGE mandar
+                close_old_connections()
+            connection.close()
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        connection_created.connect(on_connect)
+        threads = [threading.Thread(target=client, args=pair) for pair in zip(users, categories)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        connection_created.disconnect(on_connect)
+
+        return {
+            'seconds': round(elapsed, 2),
+            'writes_per_second': round(len(latencies) / elapsed, 1),
+            'failed_writes': sum(errors),
+            'connections_opened': len(opened),
+            'latency': _summary(latencies),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        }
@@ -0,0 +1,66 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from google import genai
+from google.genai import types
+
+from core import gemini
+from core.fake_gemini import FakeGeminiServer
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': round(statistics.mean(samples) * 1000, 2),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara, contra o Gemini fake local, a latência de criar um cliente "
+        "por chamada com a do cliente compartilhado do processo (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=50)
+        parser.add_argument('--latency-ms', type=float, default=20)
+
+    def handle(self, *args, **options):
+        server = FakeGeminiServer(latency=options['latency_ms'] / 1000, reply='{"ok": true}').start()
+        os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+        http_options = types.HttpOptions(base_url=server.base_url)
+        config = types.GenerateContentConfig(max_output_tokens=256, temperature=0)
+
+        per_call = []
+        for _ in range(options['calls']):
+            started = time.perf_counter()
+            client = genai.Client(api_key=os.environ['GOOGLE_API_KEY'], http_options=http_options)
+            chat = client.chats.create(model=gemini.model_id(), config=config)
+            chat.send_message('Texto: "uber 18"')
+            per_call.append(time.perf_counter() - started)
+
+        shared = []
+        with override_settings(GEMINI={**settings.GEMINI, 'BASE_URL': server.base_url}):
+            gemini.reset_client()
+            try:
+                for _ in range(options['calls']):
+                    started = time.perf_counter()
+                    gemini.generate_text('Texto: "uber 18"', max_output_tokens=256, temperature=0)
+                    shared.append(time.perf_counter() - started)
+            finally:
+                gemini.reset_client()
+        server.stop()
+
+        self.stdout.write(json.dumps({
+            'calls': options['calls'],
+            'server_latency_ms': options['latency_ms'],
+            'client_per_call': _summary(per_call),
+            'shared_client': _summary(shared),
+        }, indent=2))
@@ -0,0 +1,115 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Dependências pesadas que só devem ser importadas no primeiro uso
+HEAVY_MODULES = ('google.genai', 'httpx', 'reportlab', 'pandas', 'numpy')
+
+# Roda em um processo novo: sobe o Django como um worker (settings, apps,
+# URLs e handler WSGI) e depois faz o primeiro uso de cada dependência pesada
+BOOT_SCRIPT = """
+import json, resource, sys, time
+
+def rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+get_resolver().url_patterns
+WSGIHandler()
+result = {
+    'boot_ms': (time.perf_counter() - started) * 1000,
+    'rss_mb': rss_mb(),
+    'loaded': sorted(m for m in %(heavy)r if m in sys.modules),
+    'first_use': {},
+}
+
+from analysis import services as analysis_services
+from core import gemini
+from finances import services as finances_services
+for name, load in [
+    ('gemini', gemini.sdk),
+    ('reportlab', finances_services._reportlab),
+    ('analytics', analysis_services._analytics),
+]:
+    started = time.perf_counter()
+    load()
+    result['first_use'][name] = {'ms': (time.perf_counter() - started) * 1000, 'rss_mb': rss_mb()}
+print(json.dumps(result))
+"""
+
+
+def _import_times(stderr):
+    """
+    Tempo acumulado (µs) dos imports de primeiro nível na saída de
+    `python -X importtime`, somado pelo pacote raiz. Os imports aninhados já
+    entram no acumulado de quem os importou.
+    """
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('  ') or not cumulative.strip().isdigit():
+            continue  # aninhado ou cabeçalho
+        totals[name.strip().split('.')[0]] += int(cumulative)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a partida a frio de um worker em processos novos: tempo de boot do "
+        "Django, memória (RSS), dependências pesadas já carregadas, os pacotes "
+        "mais caros segundo `python -X importtime` e o custo do primeiro uso de "
+        "cada dependência adiada (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Processos medidos.')
+        parser.add_argument('--top', type=int, default=10, help='Pacotes listados por tempo de importação.')
+        parser.add_argument('--output', help='Também grava o JSON neste arquivo.')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+        script = BOOT_SCRIPT % {'heavy': HEAVY_MODULES}
+        runs, import_totals = [], defaultdict(list)
+        for _ in range(options['runs']):
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', script],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            for name, micros in _import_times(proc.stderr).items():
+                import_totals[name].append(micros)
+
+        top = sorted(import_totals.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        result = json.dumps({
+            'runs': options['runs'],
+            'boot_ms_median': round(statistics.median(run['boot_ms'] for run in runs), 1),
+            'boot_ms_min': round(min(run['boot_ms'] for run in runs), 1),
+            'rss_mb_median': statistics.median(run['rss_mb'] for run in runs),
+            'heavy_loaded_at_boot': runs[0]['loaded'],
+            'first_use': {
+                name: {
+                    'ms_median': round(statistics.median(run['first_use'][name]['ms'] for run in runs), 1),
+                    'rss_mb_after': statistics.median(run['first_use'][name]['rss_mb'] for run in runs),
+                }
+                for name in runs[0]['first_use']
+            },
+            'slowest_imports_ms': {
+                name: round(statistics.median(samples) / 1000, 1) for name, samples in top[:options['top']]
+            },
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(result)
+        self.stdout.write(result)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.fake_gemini import FakeGeminiServer
+
+
+class Command(BaseCommand):
+    help = "Sobe um servidor local que imita a API do Gemini (use com GEMINI_BASE_URL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=300, help='Atraso de cada resposta.')
+        parser.add_argument('--reply', default='{}', help='Texto devolvido em cada resposta.')
+
+    def handle(self, *args, **options):
+        server = FakeGeminiServer(
+            ('127.0.0.1', options['port']),
+            latency=options['latency_ms'] / 1000,
+            reply=options['reply'],
+        )
+        self.stdout.write(f'Fake Gemini em {server.base_url} (Ctrl+C para sair)')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
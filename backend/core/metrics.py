@@ -0,0 +1,46 @@
+"""
+Contadores e medidores simples do processo, expostos em /metrics/.
+
+São locais a cada processo (cada worker reporta os seus) e pensados para
+leitura humana ou para um coletor que some os workers.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def counter(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+def snapshot():
+    """
+    Cópia dos contadores e medidores atuais.
+    """
+    with _lock:
+        return {'counters': dict(_counters), 'gauges': dict(_gauges)}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
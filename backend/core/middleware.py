@@ -0,0 +1,119 @@
+"""
+Perfil das requisições (core.profiling) em uma fração PROFILING['SAMPLE_RATE'].
+
+Cada requisição amostrada gera uma linha de log em JSON. Acima de
+PROFILING['SLOW_MS'], a linha sai como WARNING com as consultas mais lentas.
+O header `Server-Timing` (banco, Gemini, renderização, trechos nomeados e
+total) expõe detalhes internos, então só vai para usuários staff, ou para
+todos com PROFILING['SERVER_TIMING'].
+
+Em respostas em streaming (CSV, SSE) só conta o que roda até os headers
+saírem; o corpo é gerado depois que o middleware já terminou.
+"""
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def _config(key):
+    return settings.PROFILING[key]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        rate = _config('SAMPLE_RATE')
+        return _config('ENABLED') and rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        profile = profiling.Profile(capture_sql=_config('SLOW_MS') is not None)
+        token = profiling.activate(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiling.deactivate(token)
+        self.finish(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        profile = profiling.Profile(capture_sql=_config('SLOW_MS') is not None)
+        token = profiling.activate(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiling.deactivate(token)
+        self.finish(request, response, profile)
+        return response
+
+    def process_template_response(self, request, response):
+        # Respostas do DRF são renderizadas depois da view: mede esse trecho
+        profile = profiling.current()
+        if profile is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: profile.add_span('render', time.perf_counter() - started)
+            )
+        return response
+
+    def _exposes_timing(self, request):
+        user = getattr(request, 'user', None)
+        return _config('SERVER_TIMING') or bool(user is not None and user.is_staff)
+
+    def finish(self, request, response, profile):
+        total = profile.elapsed()
+        if self._exposes_timing(request):
+            timings = [
+                f'db;dur={_ms(profile.db_seconds)};desc="{profile.queries} queries"',
+                f'llm;dur={_ms(profile.llm_seconds)};desc="{profile.llm_calls} calls"',
+                *(f'{name};dur={_ms(seconds)}' for name, seconds in profile.spans.items()),
+                f'total;dur={_ms(total)}',
+            ]
+            response['Server-Timing'] = ', '.join(timings)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': _ms(total),
+            'queries': profile.queries,
+            'db_ms': _ms(profile.db_seconds),
+            'llm_calls': profile.llm_calls,
+            'llm_ms': _ms(profile.llm_seconds),
+            **{f'{name}_ms': _ms(seconds) for name, seconds in profile.spans.items()},
+        }
+        slow_ms = _config('SLOW_MS')
+        if slow_ms is not None and fields['total_ms'] >= slow_ms:
+            slowest = sorted(profile.sql, key=lambda item: item[0], reverse=True)[:_config('MAX_SQL')]
+            fields['slow'] = True
+            fields['sql'] = [{'ms': _ms(seconds), 'sql': sql} for seconds, sql in slowest]
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(fields, ensure_ascii=False), extra={'profile': fields})
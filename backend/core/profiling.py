@@ -0,0 +1,127 @@
+"""
+Perfil por requisição: consultas e tempo de banco, chamadas e tempo do
+Gemini, renderização e trechos nomeados (ex.: geração de PDF).
+
+O perfil da requisição atual fica em uma ContextVar, preenchida pelo
+RequestProfilingMiddleware só nas requisições amostradas. Os ganchos abaixo
+olham essa variável e não fazem nada quando ela está vazia, então o custo
+fora da amostra é uma leitura de ContextVar por consulta ou chamada.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_current = ContextVar('request_profile', default=None)
+
+
+class Profile:
+    def __init__(self, capture_sql=False):
+        self.started = time.perf_counter()
+        self.capture_sql = capture_sql
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.spans = {}
+        self.sql = []
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+            if self.capture_sql:
+                self.sql.append((seconds, sql))
+
+    def add_llm(self, seconds):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    return _current.get()
+
+
+def activate(profile):
+    return _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def in_profile(fn):
+    """
+    Leva o perfil atual para `fn` quando ela roda em outra thread (ex.: em
+    um ThreadPoolExecutor, que não copia o contexto).
+    """
+    profile = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(profile)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+@contextmanager
+def span(name):
+    """
+    Soma o tempo do bloco ao trecho `name` do perfil atual, se houver.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, time.perf_counter() - started)
+
+
+@contextmanager
+def llm_call():
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_llm(time.perf_counter() - started)
+
+
+def _time_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Um wrapper por conexão, em qualquer thread; as consultas só são
+    # contadas quando há um perfil ativo no contexto que as executa. Fica no
+    # início da lista porque connection.execute_wrapper() remove o último.
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
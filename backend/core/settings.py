@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
-from core.config import GOOGLE_API_KEY
+from core.config import GOOGLE_API_KEY, env_settings
 
 if GOOGLE_API_KEY:
     os.environ.setdefault('GOOGLE_API_KEY', GOOGLE_API_KEY)
@@ -62,6 +62,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'user.User'
 
 MIDDLEWARE = [
+    # Primeiro da lista: o tempo total inclui os outros middlewares
+    'core.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -104,13 +106,81 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# DATABASE_ENGINE escolhe entre SQLite (padrão, desenvolvimento) e Postgres.
+
+# SQLite: WAL deixa leituras rodarem durante uma escrita; busy_timeout faz a
+# escrita esperar o lock em vez de falhar na hora; transações IMMEDIATE pegam
+# o lock de escrita no BEGIN, evitando o "database is locked" de quem começou
+# lendo e tentou escrever depois.
+SQLITE_PRAGMAS = {
+    'busy_timeout': env_settings.SQLITE_BUSY_TIMEOUT_MS,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',        # com WAL, seguro contra corrupção; só perde o último commit numa queda de energia
+    'temp_store': 'MEMORY',
+    'cache_size': -32000,           # 32 MB de cache de páginas por conexão
+    'mmap_size': 134217728,         # 128 MB lidos via mmap
+}
+
+if env_settings.DATABASE_ENGINE == 'postgres':
+    _pool = env_settings.DATABASE_POOL_MAX_SIZE > 0
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env_settings.DATABASE_NAME,
+            'USER': env_settings.DATABASE_USER,
+            'PASSWORD': env_settings.DATABASE_PASSWORD,
+            'HOST': env_settings.DATABASE_HOST,
+            'PORT': env_settings.DATABASE_PORT,
+            # Com pool as conexões já são reaproveitadas; o Django exige CONN_MAX_AGE = 0
+            'CONN_MAX_AGE': 0 if _pool else env_settings.DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': env_settings.DATABASE_POOL_MIN_SIZE,
+                    'max_size': env_settings.DATABASE_POOL_MAX_SIZE,
+                    'timeout': env_settings.DATABASE_POOL_TIMEOUT,
+                },
+            } if _pool else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': env_settings.DATABASE_CONN_MAX_AGE,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': env_settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+    }
+
+
+# Cache
+# Com vários processos, use um backend compartilhado (Redis/Memcached): as
+# versões de dados por usuário (core.datacache) precisam ser as mesmas em todos.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': env_settings.CACHE_BACKEND,
+        'LOCATION': env_settings.CACHE_LOCATION,
     }
 }
 
+# Cache em memória dos usuários autenticados por jti do token (core.authentication)
+AUTH_CACHE = {
+    'ENABLED': True,
+    'TTL': 60,          # segundos; limita o atraso entre processos após alterar o usuário
+    'MAXSIZE': 10000,   # tokens em cache por processo
+}
+
+# Respostas em cache por versão de dados do usuário (core.datacache)
+DATA_CACHE = {
+    'TIMEOUT': 600,   # validade de cada resposta em cache, em segundos
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,18 +220,136 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     # Throttling / Rate Limiting
+    # Janela deslizante aproximada, com contadores em THROTTLE['STORE'] (core.throttling)
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "core.throttling.AnonSlidingRateThrottle",
+        "core.throttling.UserSlidingRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         # até 100 requisições anônimas por dia
         "anon": "100/day",
         # até 1000 requisições de usuário autenticado por dia
         "user": "1000/day",
+        # endpoints que chamam o Gemini (parse, chat, insights), por usuário
+        "llm_burst": "10/min",
+        "llm_sustained": "200/day",
+    },
+}
+
+# Armazenamento dos contadores de throttling (core.throttling)
+THROTTLE = {
+    'STORE': env_settings.THROTTLE_STORE,   # 'cache' (CACHES['default']) ou 'sqlite'
+    'SQLITE_PATH': BASE_DIR / 'throttle.sqlite3',
+}
+
+# Checagens de saúde (django-health-check). /health/ roda todas, inclusive o
+# Gemini; /health/ready/ só as dependências locais (banco e cache), para que uma
+# queda do Gemini não tire todas as instâncias do balanceador.
+# /health/live/ (core/views.py) não faz nenhuma I/O.
+HEALTH_CHECK = {
+    'SUBSETS': {
+        'ready': ['DatabaseBackend', 'Cache backend: default'],
     },
 }
 
+# Resultado do teste do Gemini em /health/ (core/healthchecks.py)
+GEMINI_HEALTH = {
+    'TTL_SECONDS': 30,       # depois disso, atualiza em segundo plano
+    'MAX_AGE_SECONDS': 300,  # resultado mais velho que isso conta como erro
+}
+
+# Cliente Gemini compartilhado (core/gemini.py)
+GEMINI = {
+    'MODEL_ID': 'gemini-2.0-flash',
+    'BASE_URL': env_settings.GEMINI_BASE_URL,
+    'TIMEOUT_MS': env_settings.GEMINI_TIMEOUT_MS,
+    'MAX_CONCURRENCY': env_settings.GEMINI_MAX_CONCURRENCY,
+    'MAX_KEEPALIVE': env_settings.GEMINI_MAX_KEEPALIVE,
+    # Espera máxima por uma vaga entre as MAX_CONCURRENCY chamadas simultâneas
+    'ACQUIRE_TIMEOUT_MS': env_settings.GEMINI_ACQUIRE_TIMEOUT_MS,
+    # Prazo de cada chamada por finalidade (as demais usam TIMEOUT_MS)
+    'DEADLINES_MS': {
+        'parse': 8000,
+        'insight': 20000,
+        'chat': 30000,
+        'summary': 15000,
+        'health': 5000,
+    },
+    # Circuit breaker (core/breaker.py): abre com FAILURE_RATE de falhas nas
+    # últimas WINDOW chamadas (mínimo MIN_CALLS) e recusa por OPEN_SECONDS
+    'BREAKER': {
+        'WINDOW': 20,
+        'MIN_CALLS': 5,
+        'FAILURE_RATE': 0.5,
+        'OPEN_SECONDS': 30,
+    },
+}
+
+# Cache dos parses de texto (finances/parse_cache.py)
+PARSE_CACHE = {
+    'LRU_SIZE': 4096,          # entradas em memória por processo
+    'TTL_SECONDS': 24 * 3600,  # validade de cada resultado
+    'MAX_ENTRIES': 100_000,    # tamanho máximo da tabela
+    'EVICT_EVERY': 200,        # verifica o tamanho a cada N gravações
+}
+
+# Fila de insights (analysis.jobs), processada por `manage.py run_insight_worker`
+INSIGHT_JOBS = {
+    'LEASE_SECONDS': 300,        # prazo de um worker para concluir o job
+    'MAX_ATTEMPTS': 3,           # tentativas antes de marcar como falho
+    'RETRY_DELAY_SECONDS': 30,   # atraso da nova tentativa (multiplicado pela tentativa)
+    'POLL_INTERVAL': 1.0,        # espera do worker com a fila vazia
+}
+
+# Resumo do histórico enviado ao Gemini nos insights (analysis.payload)
+INSIGHT_PAYLOAD = {
+    'MAX_TOKENS': 2000,     # orçamento do resumo no prompt
+    'MONTHS': 12,           # meses detalhados
+    'TOP_CATEGORIES': 15,   # categorias listadas (o resto vai somado)
+    'TOP_OUTLIERS': 10,     # maiores transações fora do padrão
+    'MAX_GOALS': 10,        # metas em andamento
+    'SAMPLE_ROWS': 20000,   # transações lidas para percentis e medianas
+}
+
+# Motor local dos insights (analysis.analytics)
+ANALYTICS = {
+    'ROLLING_DAYS': 30,        # janela do gasto móvel por categoria
+    'FORECAST_MONTHS': 3,      # meses previstos
+    'ANOMALY_DAYS': 30,        # período em que as anomalias são sinalizadas
+    'ANOMALY_Z': 3.0,          # z-score mínimo para sinalizar
+    'ANOMALY_MIN_COUNT': 8,    # transações mínimas na categoria para comparar
+    'ANOMALY_LIMIT': 20,       # anomalias listadas
+}
+
+# Memória do chat com o agente (analysis.memory)
+CHAT_MEMORY = {
+    'WINDOW_MESSAGES': 12,      # últimas mensagens enviadas na íntegra
+    'SUMMARY_BATCH': 6,         # mensagens acumuladas fora da janela antes de resumir
+    'MAX_TOKENS': 3000,         # orçamento de contexto (resumo + mensagens)
+    'SUMMARY_MAX_TOKENS': 400,  # tamanho máximo do resumo
+}
+
+# Mapa em memória das categorias de cada usuário (finances.category_cache)
+CATEGORY_CACHE = {
+    'USERS': 2000,        # usuários com mapa carregado por processo
+    'TTL_SECONDS': 300,   # após isso, recarrega (mudanças de outros processos já vêm pela versão)
+}
+
+# Perfil por requisição (core.middleware): header Server-Timing e log em JSON
+PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': env_settings.PROFILING_SAMPLE_RATE,   # fração das requisições perfiladas
+    'SLOW_MS': env_settings.PROFILING_SLOW_MS,           # acima disso loga as consultas (None desliga)
+    'MAX_SQL': 10,                                       # consultas mais lentas no log de requisição lenta
+    'SERVER_TIMING': env_settings.PROFILING_SERVER_TIMING,  # header para todos (senão só staff)
+}
+
+# Paginação por cursor (core.pagination) de transações, chats e insights
+PAGINATION = {
+    'PAGE_SIZE': 50,        # padrão, se o cliente não enviar ?page_size=
+    'MAX_PAGE_SIZE': 200,   # limite de ?page_size=
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Finance API',
     'DESCRIPTION': 'Documentação das rotas REST do sistema de financas',
@@ -209,6 +397,16 @@ LOGGING = {
     },
     "root": {
         "handlers": ["console"],
-        "level": "DEBUG",
+        "level": env_settings.LOG_LEVEL,
+    },
+    "loggers": {
+        # Bibliotecas que em DEBUG logam cada consulta ou requisição HTTP
+        "django.db.backends": {"level": "WARNING"},
+        "httpx": {"level": "WARNING"},
+        "httpcore": {"level": "WARNING"},
+        "urllib3": {"level": "WARNING"},
+        "google_genai": {"level": "WARNING"},
+        # Uma linha por requisição amostrada (core.middleware)
+        "core.middleware": {"level": "INFO"},
     },
 }
\ No newline at end of file
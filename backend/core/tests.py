@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import gemini, healthchecks, metrics, throttling
+from core.breaker import CircuitBreaker
+from core.management.commands.benchmark_startup import HEAVY_MODULES
+from core.fake_gemini import FakeGeminiServer
+from finances.models import Category
+from finances.services import parse_transaction_text
+
+
+class GeminiClientTestCase(SimpleTestCase):
+    """
+    Exercita o cliente compartilhado contra o servidor fake local.
+    """
+    def setUp(self):
+        self.server = FakeGeminiServer(reply='{"ok": true}').start()
+        self.settings_override = override_settings(
+            GEMINI={**settings.GEMINI, 'BASE_URL': self.server.base_url, 'MAX_CONCURRENCY': 1}
+        )
+        self.settings_override.enable()
+        self.env = patch.dict('os.environ', {'GOOGLE_API_KEY': 'fake-key'})
+        self.env.start()
+        gemini.reset_client()
+
+    def tearDown(self):
+        gemini.reset_client()
+        self.env.stop()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_client_is_shared(self):
+        self.assertIs(gemini.get_client(), gemini.get_client())
+
+    def test_generate_text_through_fake_endpoint(self):
+        text = gemini.generate_text('Texto: "uber 18"', system_instruction='parser', temperature=0)
+        self.assertEqual(text, '{"ok": true}')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn('uber 18', str(self.server.requests[0]['contents']))
+
+    def test_concurrent_calls_are_capped(self):
+        self.server.latency = 0.2
+        threads = [threading.Thread(target=gemini.generate_text, args=('oi',)) for _ in range(2)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Com MAX_CONCURRENCY=1 as duas chamadas rodam em série
+        self.assertGreaterEqual(time.perf_counter() - started, 0.4)
+
+    def test_not_configured(self):
+        with patch.dict('os.environ', {'GOOGLE_API_KEY': ''}):
+            gemini.reset_client()
+            self.assertIsNone(gemini.get_client())
+            with self.assertRaises(gemini.GeminiUnavailable):
+                gemini.generate_text('oi')
+
+
+class GeminiResilienceTestCase(TestCase):
+    """
+    Prazo, bulkhead e circuit breaker contra o servidor fake lento.
+    """
+    def setUp(self):
+        self.server = FakeGeminiServer(reply='{"ok": true}').start()
+        self.settings_override = override_settings(GEMINI={
+            **settings.GEMINI,
+            'BASE_URL': self.server.base_url,
+            'MAX_CONCURRENCY': 1,
+            'ACQUIRE_TIMEOUT_MS': 50,
+            'DEADLINES_MS': {**settings.GEMINI['DEADLINES_MS'], 'parse': 200},
+            'BREAKER': {'WINDOW': 4, 'MIN_CALLS': 2, 'FAILURE_RATE': 0.5, 'OPEN_SECONDS': 30},
+        })
+        self.settings_override.enable()
+        self.env = patch.dict('os.environ', {'GOOGLE_API_KEY': 'fake-key'})
+        self.env.start()
+        gemini.reset_client()
+        metrics.reset()
+
+    def tearDown(self):
+        gemini.reset_client()
+        self.env.stop()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_slow_call_times_out(self):
+        self.server.latency = 1
+        started = time.perf_counter()
+        with self.assertRaises(gemini.GeminiTimeout):
+            gemini.generate_text('oi', purpose='parse')
+        self.assertLess(time.perf_counter() - started, 0.9)
+        self.assertEqual(metrics.counter('gemini.calls.timeout'), 1)
+
+    def test_slow_stream_times_out(self):
+        self.server.latency = 1
+
+        async def consume():
+            return [text async for text in gemini.stream_text('oi', purpose='parse')]
+
+        with self.assertRaises(gemini.GeminiTimeout):
+            asyncio.run(consume())
+
+    def test_cancelled_queued_stream_frees_its_slot(self):
+        slots = gemini._call_slots()
+        slots.acquire()
+
+        async def cancel_while_queued():
+            task = asyncio.create_task(anext(gemini.stream_text('oi', purpose='parse')))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            slots.release()
+            await asyncio.sleep(0.2)
+
+        with self.settings(GEMINI={**settings.GEMINI, 'ACQUIRE_TIMEOUT_MS': 1000}):
+            asyncio.run(cancel_while_queued())
+        # A thread pegou a vaga depois do cancelamento e a devolveu
+        self.assertTrue(slots.acquire(timeout=1))
+        slots.release()
+
+    def test_cancelled_half_open_probe_releases_breaker(self):
+        breaker = gemini.breaker()
+        breaker.record(False)
+        breaker.record(False)
+        breaker._opened_at -= 60
+        slots = gemini._call_slots()
+        slots.acquire()
+
+        async def cancel_while_queued():
+            task = asyncio.create_task(anext(gemini.stream_text('oi', purpose='parse')))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            slots.release()
+            await asyncio.sleep(0.2)
+
+        with self.settings(GEMINI={**settings.GEMINI, 'ACQUIRE_TIMEOUT_MS': 1000}):
+            asyncio.run(cancel_while_queued())
+        # A próxima chamada ainda pode ser a de teste do meio-aberto
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+
+    def test_slow_parse_falls_back_to_empty_result(self):
+        self.server.latency = 1
+        result = parse_transaction_text('presente da tia')
+        self.assertIsNone(result['amount'])
+        self.assertEqual(metrics.counter('parser.unparsed'), 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        self.server.status = 503
+        for _ in range(2):
+            with self.assertRaises(gemini.GeminiCallFailed):
+                gemini.generate_text('oi')
+        self.assertEqual(metrics.snapshot()['gauges']['gemini.breaker.state'], 'open')
+
+        with self.assertRaises(gemini.GeminiCircuitOpen):
+            gemini.generate_text('oi')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(metrics.counter('gemini.rejected.breaker'), 1)
+        self.assertGreater(gemini.retry_after(), 1)
+
+    def test_client_errors_do_not_open_breaker(self):
+        self.server.status = 400
+        for _ in range(3):
+            with self.assertRaises(gemini.GeminiCallFailed):
+                gemini.generate_text('oi')
+        self.assertEqual(gemini.breaker().state, 'closed')
+
+    def test_bulkhead_rejects_when_full(self):
+        self.server.latency = 0.3
+        worker = threading.Thread(target=gemini.generate_text, args=('oi',))
+        worker.start()
+        time.sleep(0.1)
+        with self.assertRaises(gemini.GeminiBusy):
+            gemini.generate_text('oi')
+        worker.join()
+        self.assertEqual(metrics.counter('gemini.rejected.busy'), 1)
+        self.assertEqual(gemini.breaker().state, 'closed')
+
+    def test_chat_returns_503_when_unavailable(self):
+        user = get_user_model().objects.create_user('u', 'u@example.com', 'pw')
+        client = APIClient()
+        client.force_authenticate(user)
+        with patch('analysis.services.gemini.generate_text', side_effect=gemini.GeminiCircuitOpen('aberto')):
+            resp = client.post('/analysis/chats/chat/', {'message': 'oi'}, format='json')
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn('Retry-After', resp)
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(
+            'test', window=4, min_calls=2, failure_rate=0.5, open_seconds=10, clock=lambda: self.now
+        )
+
+    def test_stays_closed_below_min_calls(self):
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_probe_closes_on_success(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.assertFalse(self.breaker.allow())
+        self.now = 11
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half_open')
+        # Só uma chamada de teste por vez
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_probe_reopens_on_failure(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.now = 11
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.remaining(), 10)
+
+
+class SlidingWindowThrottleTestCase(SimpleTestCase):
+    """
+    Contagem aproximada por janela deslizante, nos dois armazenamentos.
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        cache.clear()
+        throttling.reset_store()
+        self.request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=42), META={})
+
+    def tearDown(self):
+        throttling.reset_store()
+        self.tmp.cleanup()
+
+    def _throttle(self, now):
+        throttle = throttling.UserSlidingRateThrottle()
+        throttle.rate, (throttle.num_requests, throttle.duration) = '4/min', (4, 60)
+        throttle.timer = lambda: now
+        return throttle
+
+    def _allowed(self, now, count):
+        return sum(self._throttle(now).allow_request(self.request, None) for _ in range(count))
+
+    def _check_window(self):
+        self.assertEqual(self._allowed(60 * 100 + 10, 6), 4)
+        # Metade da janela seguinte: ainda conta metade das 4 anteriores
+        self.assertEqual(self._allowed(60 * 101 + 30, 6), 2)
+        throttle = self._throttle(60 * 101 + 30)
+        self.assertFalse(throttle.allow_request(self.request, None))
+        self.assertGreater(throttle.wait(), 0)
+        # Duas janelas depois, a contagem zera
+        self.assertEqual(self._allowed(60 * 103, 6), 4)
+
+    def test_cache_store(self):
+        self._check_window()
+
+    def test_sqlite_store_is_shared(self):
+        path = os.path.join(self.tmp.name, 'throttle.sqlite3')
+        with override_settings(THROTTLE={**settings.THROTTLE, 'STORE': 'sqlite', 'SQLITE_PATH': path}):
+            self._check_window()
+            # Outra instância (como outro processo) vê os mesmos contadores
+            other = throttling.SQLiteThrottleStore(path)
+            self.assertEqual(other.get('throttle_user_42:' + str(103)), 4)
+
+
+@override_settings(PROFILING={**settings.PROFILING, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': False})
+class RequestProfilingTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('prof', 'prof@x.com', 'pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Category.objects.create(user=self.user, name='Mercado', type='expense')
+
+    def _timings(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            resp = self.client.get('/finances/categories/')
+        timings = self._timings(resp)
+        self.assertIn('desc="1 queries"', timings['db'])
+        self.assertIn('desc="0 calls"', timings['llm'])
+        self.assertIn('render', timings)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['path'], line['status'], line['queries']), ('/finances/categories/', 200, 1))
+        self.assertNotIn('sql', line)
+
+    @patch('core.gemini.os.getenv', return_value='fake-key')
+    @patch('core.gemini.get_client')
+    def test_llm_calls_are_counted(self, mock_client, mock_getenv):
+        mock_client.return_value.models.generate_content.return_value = type('R', (), {'text': 'Oi!'})()
+        resp = self.client.post('/analysis/chats/chat/', {'message': 'oi'}, format='json')
+        self.assertIn('desc="1 calls"', self._timings(resp)['llm'])
+
+    def test_slow_request_logs_sql(self):
+        with override_settings(PROFILING={**settings.PROFILING, 'SLOW_MS': 0}), \
+                self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/finances/categories/')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertTrue(line['slow'])
+        self.assertIn('finances_category', line['sql'][0]['sql'])
+
+    def test_server_timing_only_for_staff(self):
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+        with self.assertLogs('core.middleware', 'INFO'):
+            resp = self.client.get('/finances/categories/')
+        self.assertNotIn('Server-Timing', resp)
+
+        with override_settings(PROFILING={**settings.PROFILING, 'SERVER_TIMING': True}):
+            self.assertIn('Server-Timing', self.client.get('/finances/categories/'))
+
+    def test_not_sampled(self):
+        with override_settings(PROFILING={**settings.PROFILING, 'SAMPLE_RATE': 0}):
+            resp = self.client.get('/finances/categories/')
+        self.assertNotIn('Server-Timing', resp)
+
+
+class HealthCheckTestCase(TestCase):
+    def setUp(self):
+        healthchecks.reset()
+        self.addCleanup(healthchecks.reset)
+        self.env = patch.dict('os.environ', {'GOOGLE_API_KEY': 'fake-key'})
+        self.env.start()
+        self.addCleanup(self.env.stop)
+
+    def test_liveness_does_no_io(self):
+        with patch('core.gemini.list_models') as list_models, self.assertNumQueries(0):
+            resp = self.client.get('/health/live/')
+        self.assertEqual(resp.status_code, 200)
+        list_models.assert_not_called()
+
+    @patch('core.gemini.list_models')
+    def test_gemini_result_is_cached(self, list_models):
+        for _ in range(3):
+            self.assertIsNone(healthchecks.gemini_status())
+        self.assertEqual(list_models.call_count, 1)
+
+    @patch('core.gemini.list_models')
+    def test_stale_result_refreshes_in_background(self, list_models):
+        healthchecks.gemini_status()
+        list_models.side_effect = RuntimeError('fora do ar')
+        with override_settings(GEMINI_HEALTH={**settings.GEMINI_HEALTH, 'TTL_SECONDS': 0}):
+            # Devolve o resultado guardado e atualiza em segundo plano
+            self.assertIsNone(healthchecks.gemini_status())
+            healthchecks._worker.join()
+        self.assertIn('fora do ar', healthchecks.gemini_status())
+        self.assertEqual(list_models.call_count, 2)
+
+    @patch('core.gemini.list_models')
+    @patch.dict('health_check.conf.HEALTH_CHECK', {'DISABLE_THREADING': True})
+    def test_readiness_subset(self, list_models):
+        # Gemini fora do ar não tira a instância do balanceador
+        list_models.side_effect = RuntimeError('fora do ar')
+        # Sem threads: as checagens usam a mesma conexão do teste
+        resp = self.client.get('/health/ready/', HTTP_ACCEPT='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()), {'DatabaseBackend', 'Cache backend: default'})
+        list_models.assert_not_called()
+
+
+class LazyImportTestCase(SimpleTestCase):
+    def test_boot_does_not_import_heavy_dependencies(self):
+        script = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            f"print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        )
+        proc = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'core.settings'},
+        )
+        self.assertEqual(proc.stdout.strip().splitlines()[-1], '[]')
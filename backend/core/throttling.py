@@ -0,0 +1,193 @@
+"""
+Throttling por janela deslizante aproximada, com armazenamento compartilhado.
+
+O throttle padrão do DRF guarda por chave a lista de horários de todas as
+requisições da janela e a regrava a cada requisição; o custo cresce com a
+taxa e, no LocMem, cada processo conta sozinho. Aqui cada chave tem só
+dois contadores (janela fixa atual e anterior) e a contagem estimada é
+
+    atual + anterior * (fração da janela anterior ainda dentro do período)
+
+Os contadores ficam no THROTTLE['STORE']:
+- 'cache': cache do Django (CACHES['default']); com Redis/Memcached é
+  compartilhado entre processos e o incremento é atômico.
+- 'sqlite': arquivo SQLite local (THROTTLE['SQLITE_PATH']), para testar
+  vários processos na mesma máquina sem um cache externo.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import metrics
+
+
+class CacheThrottleStore:
+    def get(self, key):
+        return cache.get(key, 0)
+
+    def incr(self, key, ttl):
+        cache.add(key, 0, ttl)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # A chave expirou entre o add e o incr
+            cache.set(key, 1, ttl)
+            return 1
+
+
+class SQLiteThrottleStore:
+    # Fração dos incrementos que também apaga os contadores expirados
+    PURGE_PROBABILITY = 0.01
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS throttle ('
+                'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT count FROM throttle WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key, ttl):
+        now = time.time()
+        conn = self._connection()
+        if random.random() < self.PURGE_PROBABILITY:
+            conn.execute('DELETE FROM throttle WHERE expires <= ?', (now,))
+        # Um único statement: atômico entre processos
+        return conn.execute(
+            'INSERT INTO throttle (key, count, expires) VALUES (?, 1, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'count = CASE WHEN expires > ? THEN count + 1 ELSE 1 END, expires = excluded.expires '
+            'RETURNING count',
+            (key, now + ttl, now)
+        ).fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = settings.THROTTLE
+            if config['STORE'] == 'sqlite':
+                _store = SQLiteThrottleStore(config['SQLITE_PATH'])
+            else:
+                _store = CacheThrottleStore()
+        return _store
+
+
+def reset_store():
+    global _store
+    with _store_lock:
+        _store = None
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Base dos throttles do projeto: mesma interface do SimpleRateThrottle
+    (scope, rate, get_cache_key), com contagem por janela deslizante aproximada.
+    """
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        window = int(window)
+        self.elapsed = offset / self.duration
+        store = get_store()
+        current_key = f'{self.key}:{window}'
+        self.current = store.get(current_key)
+        self.previous = store.get(f'{self.key}:{window - 1}')
+
+        if self.estimate() + 1 > self.num_requests:
+            metrics.incr(f'throttle.{self.scope}.rejected')
+            return False
+        # Só requisições aceitas contam; o excesso de uma corrida é de no máximo uma por processo
+        self.current = store.incr(current_key, 2 * self.duration)
+        return True
+
+    def estimate(self):
+        return self.current + self.previous * (1 - self.elapsed)
+
+    def wait(self):
+        """
+        Segundos até a estimativa abrir espaço para mais uma requisição.
+        """
+        free = self.num_requests - 1 - self.current
+        if free >= 0 and self.previous:
+            # A parcela da janela anterior cai linearmente até o fim da janela atual
+            fraction = 1 - free / self.previous
+            return max((fraction - self.elapsed) * self.duration, 0)
+        # A janela atual já estourou: depois que ela virar, a contagem dela passa a cair
+        remaining = (1 - self.elapsed) * self.duration
+        if self.current:
+            remaining += self.duration * (1 - (self.num_requests - 1) / self.current)
+        return max(remaining, 0)
+
+
+class AnonSlidingRateThrottle(SlidingWindowRateThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserSlidingRateThrottle(SlidingWindowRateThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LLMBurstRateThrottle(UserSlidingRateThrottle):
+    scope = 'llm_burst'
+
+
+class LLMSustainedRateThrottle(UserSlidingRateThrottle):
+    scope = 'llm_sustained'
+
+
+class LLMThrottleMixin:
+    """
+    Aplica os limites dos endpoints que chamam o Gemini às actions listadas
+    em `llm_actions`, além dos throttles padrão.
+    """
+    llm_actions = ()
+    llm_throttle_classes = (LLMBurstRateThrottle, LLMSustainedRateThrottle)
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action in self.llm_actions:
+            throttles += [throttle() for throttle in self.llm_throttle_classes]
+        return throttles
@@ -15,8 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from core.views import liveness_view, metrics_view
 
 urlpatterns = [
     path('user/', include('user.urls'), name='user'),
@@ -28,5 +30,10 @@ urlpatterns = [
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 
+    path('health/live/', liveness_view, name='liveness'),
     path("health/", include("health_check.urls")),
-]
\ No newline at end of file
+    path('metrics/', metrics_view, name='metrics'),
+]
+
+# Sob uvicorn não há o runserver para servir o CSS do admin (só com DEBUG)
+urlpatterns += staticfiles_urlpatterns()
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import metrics
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """
+    GET /metrics/
+    Contadores e medidores deste processo (cache, parser, LLM...).
+    """
+    return Response(metrics.snapshot())
+
+
+def liveness_view(request):
+    """
+    GET /health/live/
+    Só indica que o processo responde: não toca banco, cache nem rede.
+    """
+    return HttpResponse('ok', content_type='text/plain')
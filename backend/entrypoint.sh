@@ -1,6 +1,12 @@
 #!/bin/bash
 set -e
 
+# Com um comando (ex.: o serviço worker do docker-compose), só executa ele:
+# migrações e superusuário ficam a cargo do serviço backend
+if [ "$#" -gt 0 ]; then
+  exec "$@"
+fi
+
 echo "Executando makemigrations (caso haja alterações nos modelos)..."
 python manage.py makemigrations
 
@@ -28,5 +34,7 @@ if not User.objects.filter(username="${DJANGO_SUPERUSER_USERNAME}").exists():
 EOF
 fi
 
-echo "Iniciando o servidor Django..."
-exec python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# ASGI: sob WSGI (runserver) o Django junta o stream inteiro antes de enviar,
+# e o chat em /analysis/chats/chat/stream/ só chegaria no fim da resposta
+echo "Iniciando o servidor Django (uvicorn, ASGI)..."
+exec uvicorn core.asgi:application --host 0.0.0.0 --port 8000
\ No newline at end of file
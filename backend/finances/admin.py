@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Transaction, Goal
+from .models import Category, Transaction, Goal, DailySummary
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -18,3 +18,8 @@ class GoalAdmin(admin.ModelAdmin):
         'end_date', 'frequency'
     )
     list_filter  = ('frequency',)
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'day', 'category', 'type', 'total', 'count')
+    list_filter  = ('type',)
@@ -0,0 +1,173 @@
+"""
+Mapa em memória, por usuário, das categorias indexadas por (nome
+normalizado, tipo), usado ao criar transações.
+
+O mapa de um usuário é carregado com um SELECT e depois mantido pelos
+signals de Category neste processo: criação entra no mapa (após o commit),
+renomeação e exclusão descartam o mapa do usuário e incrementam a versão
+das categorias dele no cache compartilhado (como em core.datacache). Cada
+uso confere essa versão, então os outros processos recarregam o mapa logo
+depois de uma renomeação ou exclusão. Categorias criadas em outro processo
+aparecem quando um nome não é encontrado, o que força uma recarga antes de
+criar.
+
+Nomes são comparados sem diferenciar maiúsculas, acentos e espaços
+repetidos: "Alimentação", "alimentacao" e "ALIMENTAÇÃO " são a mesma
+categoria, e vale a mais antiga.
+"""
+import threading
+import time
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import metrics
+from . import services
+from .models import Category
+
+_lock = threading.RLock()
+_maps = None
+
+
+def _config(key):
+    return settings.CATEGORY_CACHE[key]
+
+
+def _cache():
+    global _maps
+    with _lock:
+        if _maps is None:
+            _maps = TTLCache(maxsize=_config('USERS'), ttl=_config('TTL_SECONDS'))
+        return _maps
+
+
+def normalize_name(name):
+    return ' '.join(services.strip_accents(name).split())
+
+
+def _key(name, kind):
+    return normalize_name(name), kind
+
+
+def _version_key(user_id):
+    return f'category-version:{user_id}'
+
+
+def _version(user_id):
+    """
+    Versão das categorias do usuário no cache compartilhado. Se a chave
+    sumiu, começa de um valor novo baseado no relógio.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _load(user_id):
+    # A versão é lida antes do SELECT: uma mudança no meio invalida o mapa
+    version = _version(user_id)
+    mapping = {}
+    for category in Category.objects.filter(user_id=user_id).order_by('id'):
+        mapping.setdefault(_key(category.name, category.type), category)
+    metrics.incr('category_cache.load')
+    with _lock:
+        _cache()[user_id] = (version, mapping)
+    return mapping
+
+
+def _mapping(user_id):
+    with _lock:
+        entry = _cache().get(user_id)
+    if entry is not None and entry[0] == _version(user_id):
+        return entry[1]
+    return _load(user_id)
+
+
+def categories(user):
+    """
+    Categorias do usuário, uma por nome normalizado e tipo.
+    """
+    mapping = _mapping(user.pk)
+    with _lock:
+        return list(mapping.values())
+
+
+def _lookup(mapping, keys):
+    with _lock:
+        return {key: mapping[_key(*key)] for key in keys if _key(*key) in mapping}
+
+
+def resolve_many(user, keys) -> dict:
+    """
+    Categoria de cada (nome, tipo) em `keys`, criando as que faltam.
+    Só toca o banco quando algum nome não está no mapa: recarrega o mapa
+    (pode ter sido criado por outro processo) e cria o que ainda faltar.
+    """
+    keys = set(keys)
+    found = _lookup(_mapping(user.pk), keys)
+    metrics.incr('category_cache.hit', len(found))
+    if len(found) == len(keys):
+        return found
+
+    metrics.incr('category_cache.miss', len(keys) - len(found))
+    found.update(_lookup(_load(user.pk), keys - found.keys()))
+    missing = {}
+    for name, kind in keys - found.keys():
+        missing.setdefault(_key(name, kind), (name, kind))
+    if missing:
+        # ignore_conflicts: se outra requisição criou o mesmo nome no meio
+        # tempo, o INSERT é ignorado e a categoria dela é lida abaixo
+        Category.objects.bulk_create(
+            [Category(user=user, name=name, type=kind) for name, kind in missing.values()],
+            ignore_conflicts=True
+        )
+        created = Category.objects.filter(user=user, name__in={name for name, _ in missing.values()})
+        by_key = {}
+        for category in created.order_by('id'):
+            by_key.setdefault(_key(category.name, category.type), category)
+            transaction.on_commit(lambda category=category: remember(category))
+        found.update({key: by_key[_key(*key)] for key in keys - found.keys()})
+    return found
+
+
+def resolve(user, name, kind) -> Category:
+    return resolve_many(user, [(name, kind)])[(name, kind)]
+
+
+def remember(category):
+    """
+    Adiciona uma categoria nova ao mapa do usuário, se ele estiver carregado.
+    """
+    with _lock:
+        entry = _cache().get(category.user_id)
+        if entry is not None:
+            entry[1].setdefault(_key(category.name, category.type), category)
+
+
+def forget(user_id):
+    """
+    Descarta o mapa do usuário neste processo e, pela versão compartilhada,
+    nos demais. Incrementa já e de novo no commit, como bump_data_version.
+    """
+    with _lock:
+        _cache().pop(user_id, None)
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def clear():
+    global _maps
+    with _lock:
+        _maps = None
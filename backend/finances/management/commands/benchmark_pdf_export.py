@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from finances.services import build_transactions_pdf
+
+
+def synthetic_rows(count, seed=42):
+    """
+    Gera linhas no mesmo formato de transaction_pdf_rows, sem tocar o banco.
+    """
+    rng = random.Random(seed)
+    categories = ['Mercado', 'Transporte', 'Restaurante', 'Salário', 'Farmácia', 'Lazer']
+    start = date.today()
+    for i in range(count):
+        yield [
+            (start - timedelta(days=i // 50)).isoformat(),
+            rng.choice(categories),
+            f"{rng.uniform(1, 2000):.2f}",
+            'expense' if rng.random() < 0.85 else 'income',
+            'Loja Centro',
+            f'compra número {i} no cartão',
+        ]
+
+
+def measure(size):
+    """
+    Roda em um processo filho para que o pico de RSS seja o desta medição.
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with tempfile.TemporaryFile() as output:
+        pages = build_transactions_pdf(synthetic_rows(size), output)
+        output_bytes = output.tell()
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'rows': size,
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(size / elapsed),
+        'peak_rss_mb': round(peak / 1024, 2),
+        'rss_growth_mb': round((peak - baseline) / 1024, 2),
+        'output_mb': round(output_bytes / 2**20, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede tempo e pico de memória do gerador de PDF de transações "
+        "para diferentes quantidades de linhas (saída em JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000],
+            help='Quantidades de linhas a medir.'
+        )
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context('fork')
+        results = []
+        for size in options['sizes']:
+            with ctx.Pool(1) as pool:
+                results.append(pool.apply(measure, (size,)))
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,54 @@
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from finances.models import Category, Transaction
+from finances.services import fast_parse_transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda o parser local sobre os textos já gravados e reporta, em JSON, a taxa "
+        "de acerto (textos que dispensariam o Gemini) e a concordância com o valor "
+        "e a categoria salvos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10000, help='Máximo de transações lidas (padrão: 10000).')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Restringe a um usuário (pode repetir).')
+
+    def handle(self, *args, **options):
+        transactions = (
+            Transaction.objects.select_related('category')
+            .only('user_id', 'raw_text', 'amount', 'category__name')
+            .order_by('-id')
+        )
+        if options['user_ids']:
+            transactions = transactions.filter(user_id__in=options['user_ids'])
+
+        categories = {}
+        for user_id, name, kind in Category.objects.values_list('user_id', 'name', 'type'):
+            categories.setdefault(user_id, []).append((name, kind))
+
+        total = hits = same_amount = same_category = 0
+        started = time.perf_counter()
+        for t in transactions[:options['limit']].iterator(chunk_size=2000):
+            total += 1
+            parsed = fast_parse_transaction(t.raw_text, categories.get(t.user_id, ()))
+            if parsed is None:
+                continue
+            hits += 1
+            same_amount += Decimal(str(parsed['amount'])) == t.amount
+            same_category += t.category is not None and parsed['category'] == t.category.name
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(json.dumps({
+            'transactions': total,
+            'fast_path_hits': hits,
+            'hit_rate': round(hits / total, 4) if total else None,
+            'amount_agreement': round(same_amount / hits, 4) if hits else None,
+            'category_agreement': round(same_category / hits, 4) if hits else None,
+            'elapsed_s': round(elapsed, 3),
+        }, indent=2))
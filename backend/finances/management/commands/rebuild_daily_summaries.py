@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from finances.services import rebuild_daily_summary
+
+
+class Command(BaseCommand):
+    help = "Recalcula a tabela de totais diários (DailySummary) a partir das transações."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='ID do usuário a recalcular (pode repetir). Padrão: todos.'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.only('id', 'timezone').order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        total = 0
+        for user in users.iterator():
+            rebuild_daily_summary(user)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Totais diários recalculados para {total} usuário(s).'))
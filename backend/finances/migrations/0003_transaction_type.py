@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+TYPES = ['expense', 'income']
+
+
+def fill_transaction_type(apps, schema_editor):
+    """
+    Copia metadata.type para a nova coluna; sem tipo válido no metadata,
+    usa o tipo da categoria (o padrão da coluna já é 'expense').
+    """
+    Transaction = apps.get_model('finances', 'Transaction')
+    Transaction.objects.filter(metadata__type='income').update(type='income')
+    Transaction.objects.filter(
+        ~Q(metadata__type__in=TYPES) | Q(metadata__type__isnull=True),
+        category__type='income'
+    ).update(type='income')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0002_daily_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='type',
+            field=models.CharField(choices=[('expense', 'Despesa'), ('income', 'Receita')], default='expense', max_length=7),
+        ),
+        migrations.RunPython(fill_transaction_type, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'timestamp'], name='transaction_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', 'timestamp'], name='transaction_user_type_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def _timezone(user):
+    try:
+        return ZoneInfo(user.timezone or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def merge_uncategorized_duplicates(apps, schema_editor):
+    """
+    Baldes sem categoria duplicados receberam os mesmos incrementos em todas
+    as cópias: recalcula cada um a partir das transações e deixa uma linha só.
+    """
+    DailySummary = apps.get_model('finances', 'DailySummary')
+    Transaction = apps.get_model('finances', 'Transaction')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    duplicates = (
+        DailySummary.objects.filter(category__isnull=True)
+        .values('user', 'day', 'type')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        tz = _timezone(User.objects.get(pk=row['user']))
+        start = datetime.combine(row['day'], time.min, tzinfo=tz)
+        totals = Transaction.objects.filter(
+            user_id=row['user'], category__isnull=True, type=row['type'],
+            timestamp__gte=start, timestamp__lt=start + timedelta(days=1),
+        ).aggregate(total=Sum('amount'), count=Count('id'))
+        DailySummary.objects.filter(
+            user_id=row['user'], day=row['day'], type=row['type'], category__isnull=True
+        ).delete()
+        if totals['count']:
+            DailySummary.objects.create(
+                user_id=row['user'], day=row['day'], category=None, type=row['type'],
+                total=totals['total'], count=totals['count'],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorized_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('category__isnull', True)),
+                fields=('user', 'day', 'type'),
+                name='daily_summary_unique_uncategorized',
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Category(models.Model):
     EXPENSE = 'expense'
@@ -17,10 +18,18 @@ class Transaction(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    type = models.CharField(max_length=7, choices=Category.TYPE_CHOICES, default=Category.EXPENSE)
+    timestamp = models.DateTimeField(default=timezone.now)
     raw_text = models.TextField()
     metadata = models.JSONField(default=dict)  # {amount:, date:, location:, type:}
 
+    class Meta:
+        indexes = [
+            # (user, timestamp, id): linha do tempo e paginação por cursor
+            models.Index(fields=['user', 'timestamp', 'id'], name='transaction_user_ts_idx'),
+            models.Index(fields=['user', 'type', 'timestamp'], name='transaction_user_type_ts_idx'),
+        ]
+
 class Goal(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
@@ -34,3 +43,41 @@ class Goal(models.Model):
     ]
     frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
     metadata = models.JSONField(default=dict)
+
+class DailySummary(models.Model):
+    """
+    Totais diários por usuário, categoria e tipo, mantidos pelos signals de
+    Transaction. O dia é contado no fuso horário do usuário.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
+    type = models.CharField(max_length=7, choices=Category.TYPE_CHOICES, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'day', 'category', 'type'],
+                name='daily_summary_unique_bucket'
+            ),
+            # NULLs são distintos na restrição acima: o balde sem categoria
+            # precisa da sua própria, senão inserts concorrentes o duplicam
+            models.UniqueConstraint(
+                fields=['user', 'day', 'type'],
+                condition=models.Q(category__isnull=True),
+                name='daily_summary_unique_uncategorized'
+            ),
+        ]
+
+class ParseCacheEntry(models.Model):
+    """
+    Resultado de um parse do Gemini, reaproveitado para textos equivalentes.
+    A chave é um hash do texto normalizado, do modelo e da versão do prompt.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=20)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
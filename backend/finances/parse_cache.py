@@ -0,0 +1,187 @@
+"""
+Cache dos resultados de parse do Gemini (transações e metas).
+
+Duas camadas: um LRU em memória por processo, na frente da tabela
+ParseCacheEntry, que é compartilhada entre processos. As duas respeitam o
+mesmo TTL; a tabela é podada pelo tamanho a cada EVICT_EVERY gravações.
+
+A chave inclui o dia (local do usuário) em que o texto foi interpretado:
+datas relativas ("ontem", "nos próximos 3 meses") viram datas absolutas no
+resultado, que só valem para aquele dia.
+"""
+import copy
+import hashlib
+import threading
+import unicodedata
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils import timezone
+
+from core import gemini, metrics
+from .models import ParseCacheEntry
+
+_lock = threading.RLock()
+_memory = None
+_writes = 0
+
+
+def _config(key):
+    return settings.PARSE_CACHE[key]
+
+
+def _lru():
+    global _memory
+    if _memory is None:
+        with _lock:
+            if _memory is None:
+                _memory = TTLCache(maxsize=_config('LRU_SIZE'), ttl=_config('TTL_SECONDS'))
+    return _memory
+
+
+def normalize_text(text):
+    """
+    Minúsculas, forma Unicode NFKC e espaços colapsados: "Uber  18 " == "uber 18".
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(text.split())
+
+
+def cache_key(kind, text, prompt_version, day=None):
+    day = day or timezone.localdate()
+    raw = f'{kind}|{gemini.model_id()}|{prompt_version}|{day.isoformat()}|{normalize_text(text)}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get(kind, text, prompt_version, day=None):
+    """
+    Retorna uma cópia do resultado em cache, ou None. `day` é a data local
+    do usuário (padrão: hoje no fuso do projeto).
+    """
+    key = cache_key(kind, text, prompt_version, day)
+    lru = _lru()
+    with _lock:
+        result = lru.get(key)
+    if result is not None:
+        metrics.incr('parse_cache.hit.memory')
+        return copy.deepcopy(result)
+
+    now = timezone.now()
+    expires = now - timedelta(seconds=_config('TTL_SECONDS'))
+    entry = ParseCacheEntry.objects.filter(key=key, created_at__gt=expires).only('result').first()
+    if entry is None:
+        metrics.incr('parse_cache.miss')
+        return None
+
+    ParseCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=now)
+    with _lock:
+        lru[key] = entry.result
+    metrics.incr('parse_cache.hit.db')
+    return copy.deepcopy(entry.result)
+
+
+def get_many(kind, texts, prompt_version, day=None):
+    """
+    Versão em lote de get(): uma única consulta ao banco para o que não
+    estiver em memória. Retorna uma lista alinhada a `texts` (None = miss).
+    """
+    keys = [cache_key(kind, text, prompt_version, day) for text in texts]
+    lru = _lru()
+    with _lock:
+        found = {key: lru[key] for key in keys if key in lru}
+    metrics.incr('parse_cache.hit.memory', sum(1 for key in keys if key in found))
+
+    missing = {key for key in keys if key not in found}
+    if missing:
+        now = timezone.now()
+        expires = now - timedelta(seconds=_config('TTL_SECONDS'))
+        entries = dict(
+            ParseCacheEntry.objects
+            .filter(key__in=missing, created_at__gt=expires)
+            .values_list('key', 'result')
+        )
+        if entries:
+            ParseCacheEntry.objects.filter(key__in=entries).update(last_used_at=now)
+            with _lock:
+                lru.update(entries)
+            found.update(entries)
+        metrics.incr('parse_cache.hit.db', len(entries))
+        metrics.incr('parse_cache.miss', len(missing) - len(entries))
+
+    return [copy.deepcopy(found[key]) if key in found else None for key in keys]
+
+
+def put(kind, text, prompt_version, result, day=None):
+    global _writes
+    key = cache_key(kind, text, prompt_version, day)
+    now = timezone.now()
+    with _lock:
+        _lru()[key] = copy.deepcopy(result)
+        _writes += 1
+        evict = _writes % _config('EVICT_EVERY') == 0
+    ParseCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={'kind': kind, 'result': result, 'created_at': now, 'last_used_at': now},
+    )
+    if evict:
+        evict_entries()
+
+
+def put_many(kind, items, prompt_version, day=None):
+    """
+    Versão em lote de put(): `items` é uma lista de pares (texto, resultado),
+    gravados com um único INSERT ... ON CONFLICT.
+    """
+    global _writes
+    if not items:
+        return
+    now = timezone.now()
+    entries = {
+        cache_key(kind, text, prompt_version, day): result
+        for text, result in items
+    }
+    with _lock:
+        lru = _lru()
+        for key, result in entries.items():
+            lru[key] = copy.deepcopy(result)
+        before = _writes
+        _writes += len(entries)
+        evict = _writes // _config('EVICT_EVERY') > before // _config('EVICT_EVERY')
+    ParseCacheEntry.objects.bulk_create(
+        [
+            ParseCacheEntry(key=key, kind=kind, result=result, created_at=now, last_used_at=now)
+            for key, result in entries.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['result', 'created_at', 'last_used_at'],
+    )
+    if evict:
+        evict_entries()
+
+
+def evict_entries():
+    """
+    Remove da tabela as entradas vencidas e as menos usadas além de MAX_ENTRIES.
+    """
+    expires = timezone.now() - timedelta(seconds=_config('TTL_SECONDS'))
+    ParseCacheEntry.objects.filter(created_at__lte=expires).delete()
+    max_entries = _config('MAX_ENTRIES')
+    cutoff = list(
+        ParseCacheEntry.objects
+        .order_by('-last_used_at')
+        .values_list('last_used_at', flat=True)[max_entries:max_entries + 1]
+    )
+    if cutoff:
+        ParseCacheEntry.objects.filter(last_used_at__lte=cutoff[0]).delete()
+        metrics.incr('parse_cache.evictions')
+
+
+def clear():
+    """
+    Esvazia a camada em memória deste processo.
+    """
+    with _lock:
+        _lru().clear()
+
@@ -1,5 +1,9 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Category, Transaction, Goal
+from .services import REPORT_GRANULARITIES, REPORT_MAX_DAYS, user_timezone
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,11 +16,41 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Transaction
-        fields = ['id','raw_text','amount','timestamp','category','metadata']
-        read_only_fields = ['id','timestamp','category','metadata']
+        fields = ['id','raw_text','amount','type','timestamp','category','metadata']
+        read_only_fields = ['id','type','timestamp','category','metadata']
+
+class TransactionBulkCreateSerializer(serializers.Serializer):
+    texts = serializers.ListField(
+        child=serializers.CharField(max_length=500),
+        min_length=1,
+        max_length=1000
+    )
 
 class GoalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Goal
         fields = ['id','name','target_amount','start_date','end_date','frequency','metadata']
         read_only_fields = ['id','metadata']
+
+class ReportQuerySerializer(serializers.Serializer):
+    """
+    Parâmetros de /transactions/report/. Sem start/end, cobre os últimos 30
+    dias (no fuso do usuário).
+    """
+    start       = serializers.DateField(required=False)
+    end         = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=REPORT_GRANULARITIES, default='day')
+    category    = serializers.IntegerField(required=False, min_value=1)
+    type        = serializers.ChoiceField(choices=Category.TYPE_CHOICES, required=False)
+
+    def validate(self, attrs):
+        today = timezone.localdate(timezone=user_timezone(self.context['request'].user))
+        attrs.setdefault('end', today)
+        attrs.setdefault('start', attrs['end'] - timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': 'Deve ser anterior ou igual a end.'})
+        if (attrs['end'] - attrs['start']).days >= REPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                {'end': f'O intervalo pode ter no máximo {REPORT_MAX_DAYS} dias.'}
+            )
+        return attrs
@@ -1,62 +1,398 @@
-import os, json
-from google import genai
-from google.genai import types
+import json
 import csv
-from io import StringIO
-from .models import Transaction
-from django.db.models import Sum, Count
+import logging
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from decimal import Decimal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from .models import Category, Transaction, DailySummary
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
 from datetime import timedelta
 from django.utils import timezone
-from django.http import FileResponse
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DecimalField
+import tempfile
+from types import SimpleNamespace
+from core import gemini, metrics, profiling
+from core.datacache import bump_data_version
+from . import category_cache, parse_cache
 
-MODEL_ID = 'gemini-2.0-flash'
+logger = logging.getLogger(__name__)
 
-def parse_transaction_text(raw_text: str) -> dict:
+# Incrementar ao mudar o prompt: invalida os resultados em cache
+TRANSACTION_PROMPT_VERSION = 1
+GOAL_PROMPT_VERSION = 1
+
+def strip_accents(text: str) -> str:
+    """
+    Minúsculas e sem acentos: "Almoço" -> "almoco".
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+# Valor em formato brasileiro: "R$ 1.234,56", "15 reais", "15,50", "23.5"
+_AMOUNT_RE = re.compile(
+    r'(?<![\w/.,])(?P<prefix>r\$\s*)?'
+    r'(?P<value>\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+    r'(?![\w/]|[.,]\d)(?:\s*(?P<suffix>reais|real|conto|contos)\b)?',
+    re.IGNORECASE
+)
+_DATE_RE = re.compile(r'(?<![\d/])(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?(?![\d/])')
+_RELATIVE_DAYS = {'hoje': 0, 'ontem': 1, 'anteontem': 2}
+_INCOME_RE = re.compile(r'\b(recebi|receb\w*|ganhei|salario|reembolso|rendimento|freela|vendi)\b')
+
+# Palavra-chave (sem acento) -> (categoria, tipo), usada quando o usuário
+# ainda não tem uma categoria com o nome citado no texto
+CATEGORY_KEYWORDS = {
+    'almoco': ('Alimentação', Category.EXPENSE),
+    'jantar': ('Alimentação', Category.EXPENSE),
+    'lanche': ('Alimentação', Category.EXPENSE),
+    'cafe': ('Alimentação', Category.EXPENSE),
+    'padaria': ('Alimentação', Category.EXPENSE),
+    'restaurante': ('Alimentação', Category.EXPENSE),
+    'ifood': ('Alimentação', Category.EXPENSE),
+    'mercado': ('Mercado', Category.EXPENSE),
+    'supermercado': ('Mercado', Category.EXPENSE),
+    'feira': ('Mercado', Category.EXPENSE),
+    'uber': ('Transporte', Category.EXPENSE),
+    'taxi': ('Transporte', Category.EXPENSE),
+    'onibus': ('Transporte', Category.EXPENSE),
+    'metro': ('Transporte', Category.EXPENSE),
+    'gasolina': ('Transporte', Category.EXPENSE),
+    'combustivel': ('Transporte', Category.EXPENSE),
+    'estacionamento': ('Transporte', Category.EXPENSE),
+    'farmacia': ('Saúde', Category.EXPENSE),
+    'remedio': ('Saúde', Category.EXPENSE),
+    'consulta': ('Saúde', Category.EXPENSE),
+    'aluguel': ('Moradia', Category.EXPENSE),
+    'condominio': ('Moradia', Category.EXPENSE),
+    'internet': ('Moradia', Category.EXPENSE),
+    'cinema': ('Lazer', Category.EXPENSE),
+    'netflix': ('Lazer', Category.EXPENSE),
+    'spotify': ('Lazer', Category.EXPENSE),
+    'salario': ('Salário', Category.INCOME),
+}
+
+def _parse_amount(text):
+    """
+    Valor do texto, ou None se não houver um único candidato claro.
+    Com vários números, só aceita se exatamente um tiver "R$" ou "reais".
+    """
+    candidates = [m for m in _AMOUNT_RE.finditer(text) if not _DATE_RE.match(text, m.start())]
+    marked = [m for m in candidates if m.group('prefix') or m.group('suffix')]
+    if len(marked) == 1:
+        match = marked[0]
+    elif len(candidates) == 1:
+        match = candidates[0]
+    else:
+        return None
+    value = match.group('value')
+    if ',' in value:
+        value = value.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(?:\.\d{3})+', value):
+        value = value.replace('.', '')
+    return float(value)
+
+def _parse_date(text, today):
+    for word, days in _RELATIVE_DAYS.items():
+        if re.search(rf'\b{word}\b', text):
+            return (today - timedelta(days=days)).isoformat()
+    match = _DATE_RE.search(text)
+    if match:
+        day, month, year = match.groups()
+        year = int(year) + 2000 if year and len(year) == 2 else int(year or today.year)
+        try:
+            return today.replace(year=year, month=int(month), day=int(day)).isoformat()
+        except ValueError:
+            return None
+    return None
+
+def _match_category(text, categories):
+    """
+    Procura no texto o nome de uma categoria do usuário (o mais longo vence)
+    e, se nenhuma aparecer, uma palavra-chave de CATEGORY_KEYWORDS.
+    """
+    best = None
+    for name, kind in categories:
+        key = strip_accents(name)
+        if key and re.search(rf'\b{re.escape(key)}\b', text) and (best is None or len(key) > len(best[0])):
+            best = (key, name, kind)
+    if best:
+        return best[1], best[2]
+    for word in re.findall(r'\w+', text):
+        if word in CATEGORY_KEYWORDS:
+            return CATEGORY_KEYWORDS[word]
+    return None
+
+def fast_parse_transaction(raw_text: str, categories=(), today=None):
+    """
+    Parser local e determinístico para os textos mais comuns
+    ("uber 18", "almoço 35 reais ontem", "R$ 1.234,56 aluguel").
+    `categories` são pares (nome, tipo) do usuário. Retorna o mesmo dict do
+    parse via Gemini, ou None quando não tem confiança (sem valor único ou
+    sem categoria reconhecida).
     """
-    Envia raw_text para o Gemini e espera um JSON com:
+    text = strip_accents(raw_text)
+    today = today or timezone.localdate()
+    amount = _parse_amount(text)
+    if amount is None:
+        return None
+    category = _match_category(text, categories)
+    if category is None:
+        return None
+
+    name, kind = category
+    if kind == Category.EXPENSE and _INCOME_RE.search(text):
+        kind = Category.INCOME
+    return {
+        'amount': amount,
+        'date': _parse_date(text, today) or today.isoformat(),
+        'category': name,
+        'location': None,
+        'type': kind,
+        'parser': 'fast_path',
+    }
+
+def user_categories(user):
+    return [(c.name, c.type) for c in category_cache.categories(user)]
+
+def _empty_transaction_parse():
+    return {
+        'amount': None,
+        'date': None,
+        'category': None,
+        'location': None,
+        'type': None
+    }
+
+def parse_transaction_text(raw_text: str, user=None) -> dict:
+    """
+    Interpreta raw_text e retorna um dict com:
       - amount, date, category, location, type
-    Se não estiver configurado (sem API_KEY), devolve todos os campos None.
+    Tenta primeiro o parser local (fast_parse_transaction, com as categorias
+    do usuário) e só recorre ao parse_cache/Gemini quando ele não tem
+    confiança. A chave 'parser' indica o caminho: fast_path, cache ou llm.
+    Sem parse possível (ou sem API_KEY), devolve todos os campos None.
     """
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        # Em ambiente de testes ou sem configuração, não tenta instanciar o client
-        return {
-            'amount': None,
-            'date': None,
-            'category': None,
-            'location': None,
-            'type': None
-        }
+    if user is not None:
+        fast = fast_parse_transaction(raw_text, user_categories(user), user_today(user))
+    else:
+        fast = fast_parse_transaction(raw_text)
+    if fast is not None:
+        metrics.incr('parser.fast_path')
+        return fast
+    return _parse_transaction_llm(raw_text, user)
+
+def _parse_transaction_llm(raw_text: str, user=None) -> dict:
+    if not gemini.is_configured():
+        # Em ambiente de testes ou sem configuração, não tenta chamar o Gemini
+        metrics.incr('parser.unparsed')
+        return _empty_transaction_parse()
+
+    today = user_today(user)
+    cached = parse_cache.get('transaction', raw_text, TRANSACTION_PROMPT_VERSION, today)
+    if cached is not None:
+        metrics.incr('parser.cache')
+        return {**cached, 'parser': 'cache'}
 
-    client = genai.Client(api_key=api_key)
     system_instruction = (
         "Você é um parser financeiro. "
         "Retorne apenas um JSON com amount, date, category, location, type."
     )
-    config = types.GenerateContentConfig(
-        system_instruction=system_instruction,
-        max_output_tokens=256,
-        temperature=0
-    )
-    chat = client.chats.create(model=MODEL_ID, config=config)
-    resposta = chat.send_message(f"Texto: \"{raw_text}\"").text
+    try:
+        resposta = gemini.generate_text(
+            f"Texto: \"{raw_text}\"",
+            system_instruction=system_instruction,
+            max_output_tokens=256,
+            temperature=0,
+            purpose='parse'
+        )
+    except gemini.GeminiUnavailable as exc:
+        # Circuito aberto, sem vaga ou prazo estourado: segue sem o parse
+        logger.warning("Parse de transação sem Gemini: %s", exc)
+        metrics.incr('parser.unparsed')
+        return _empty_transaction_parse()
 
     try:
-        return json.loads(resposta)
+        result = json.loads(resposta)
     except json.JSONDecodeError:
-        return {
-            'amount': None,
-            'date': None,
-            'category': None,
-            'location': None,
-            'type': None
-        }
+        result = None
+    if not isinstance(result, dict):
+        metrics.incr('parser.unparsed')
+        return _empty_transaction_parse()
+    parse_cache.put('transaction', raw_text, TRANSACTION_PROMPT_VERSION, result, today)
+    metrics.incr('parser.llm')
+    return {**result, 'parser': 'llm'}
+
+BULK_PARSE_CHUNK = 25
+BULK_PARSE_WORKERS = 4
+
+def _parse_transaction_chunk(texts):
+    """
+    Envia vários textos numerados em um único prompt e devolve {índice: dict}.
+    Índices ausentes ou inválidos na resposta simplesmente não aparecem.
+    """
+    numbered = '\n'.join(f'{i}. "{text}"' for i, text in enumerate(texts))
+    try:
+        resposta = gemini.generate_text(
+            f"Textos:\n{numbered}",
+            system_instruction=(
+                "Você é um parser financeiro. Para cada texto numerado, extraia "
+                "amount, date, category, location, type. Retorne apenas um JSON: "
+                "uma lista de objetos, cada um com a chave index (o número do texto) "
+                "e essas chaves."
+            ),
+            max_output_tokens=96 * len(texts),
+            temperature=0,
+            purpose='parse'
+        )
+    except gemini.GeminiUnavailable as exc:
+        logger.warning("Parse em lote sem Gemini: %s", exc)
+        return {}
+    try:
+        items = json.loads(resposta)
+    except json.JSONDecodeError:
+        return {}
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index = item.pop('index', None)
+        if isinstance(index, int) and 0 <= index < len(texts):
+            parsed[index] = item
+    return parsed
+
+def _split(indices, size):
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+def _parse_chunks(pool, texts, chunks, results, answered):
+    """
+    Parse dos blocos no pool. Preenche `results` e `answered` e devolve,
+    por bloco, os índices que ficaram sem resposta.
+    """
+    parse_chunk = profiling.in_profile(lambda chunk: _parse_transaction_chunk([texts[i] for i in chunk]))
+    unanswered = []
+    for chunk, parsed in zip(chunks, pool.map(parse_chunk, chunks)):
+        for position, index in enumerate(chunk):
+            if position in parsed:
+                results[index] = {**parsed[position], 'parser': 'llm'}
+                answered.append((texts[index], parsed[position]))
+        left = [index for position, index in enumerate(chunk) if position not in parsed]
+        if left:
+            unanswered.append(left)
+    return unanswered
 
-def parse_goal_text(raw_text: str) -> dict:
+def parse_transactions_batch(texts, user=None) -> list:
+    """
+    Versão em lote de parse_transaction_text. Roda o parser local em todos
+    os textos, consulta o cache para o resto com uma única query e envia os
+    demais ao Gemini em blocos de BULK_PARSE_CHUNK por prompt, com até
+    BULK_PARSE_WORKERS blocos em paralelo. O que um bloco não respondeu
+    (ex.: JSON cortado) é reenviado uma vez, em metades; o que sobrar volta
+    sem parse, sem uma chamada ao Gemini por texto. Retorna um dict por
+    texto, na mesma ordem.
+    """
+    categories = user_categories(user) if user is not None else ()
+    today = user_today(user)
+    results = [fast_parse_transaction(text, categories, today) for text in texts]
+    pending = [i for i, result in enumerate(results) if result is None]
+    metrics.incr('parser.fast_path', len(texts) - len(pending))
+    if pending and gemini.is_configured():
+        cached = parse_cache.get_many('transaction', [texts[i] for i in pending], TRANSACTION_PROMPT_VERSION, today)
+        missing = []
+        for index, hit in zip(pending, cached):
+            if hit is None:
+                missing.append(index)
+            else:
+                results[index] = {**hit, 'parser': 'cache'}
+        metrics.incr('parser.cache', len(pending) - len(missing))
+
+        answered = []
+        if missing:
+            with ThreadPoolExecutor(max_workers=BULK_PARSE_WORKERS) as pool:
+                failed = _parse_chunks(pool, texts, _split(missing, BULK_PARSE_CHUNK), results, answered)
+                retry = [half for chunk in failed for half in _split(chunk, (len(chunk) + 1) // 2)]
+                if retry:
+                    metrics.incr('parser.batch_retry', len(retry))
+                    _parse_chunks(pool, texts, retry, results, answered)
+        metrics.incr('parser.llm', len(answered))
+        parse_cache.put_many('transaction', answered, TRANSACTION_PROMPT_VERSION, today)
+
+    unparsed = [i for i, result in enumerate(results) if result is None]
+    metrics.incr('parser.unparsed', len(unparsed))
+    for i in unparsed:
+        results[i] = _empty_transaction_parse()
+    return results
+
+def category_name(parsed: dict) -> str:
+    """
+    Nome da categoria a partir do parse: espaços colapsados, cortado no
+    tamanho de Category.name e 'Outros' quando vazio. O nome vem do Gemini
+    e pode ser longo ou nem ser texto.
+    """
+    name = ' '.join(str(parsed.get('category') or '').split())
+    return name[:Category._meta.get_field('name').max_length].strip() or 'Outros'
+
+def transaction_type(parsed: dict) -> str:
+    """
+    Tipo da transação a partir do parse, com 'expense' para valores desconhecidos.
+    """
+    value = parsed.get('type')
+    return value if value in (Category.EXPENSE, Category.INCOME) else Category.EXPENSE
+
+def resolve_categories(user, keys) -> dict:
+    """
+    Busca (e cria, se preciso) as categorias (nome, tipo) do usuário em uma
+    passada, pelo mapa em memória de finances.category_cache.
+    """
+    return category_cache.resolve_many(user, keys)
+
+def bulk_create_transactions(user, texts, batch_size=500) -> list:
+    """
+    Cria transações a partir de uma lista de textos livres.
+    Retorna um resultado por item: {'index', 'status', 'transaction' | 'error'}.
+    """
+    amount_field = DecimalField(max_digits=10, decimal_places=2)
+    parsed_items = parse_transactions_batch(texts, user=user)
+
+    results = [None] * len(texts)
+    pending = []
+    for index, (text, parsed) in enumerate(zip(texts, parsed_items)):
+        try:
+            amount = amount_field.run_validation(parsed.get('amount'))
+        except ValidationError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': f"amount: {'; '.join(e.detail)}"}
+            continue
+        key = (category_name(parsed), transaction_type(parsed))
+        pending.append((index, text, parsed, amount, key))
+
+    categories = resolve_categories(user, [key for *_, key in pending])
+    objs = [
+        Transaction(
+            user=user,
+            category=categories[key],
+            type=key[1],
+            amount=amount,
+            raw_text=text,
+            metadata=parsed
+        )
+        for _, text, parsed, amount, key in pending
+    ]
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(objs, batch_size=batch_size)
+        # bulk_create não dispara signals: atualiza os totais diários e a versão dos dados aqui
+        apply_to_daily_summary(objs)
+        bump_data_version(user.pk)
+
+    for (index, *_), obj in zip(pending, objs):
+        results[index] = {'index': index, 'status': 'created', 'transaction': obj}
+    return results
+
+def parse_goal_text(raw_text: str, user=None) -> dict:
     """
     Recebe algo como "quero poupar 1000 até 31/12 criando mensalmente"
     e retorna um dict com chaves:
@@ -65,9 +401,9 @@ def parse_goal_text(raw_text: str) -> dict:
       - end_date:   'YYYY-MM-DD'
       - frequency:  'one-time'|'monthly'|'yearly'
       - name:       string resumida da meta
+    Também consulta o parse_cache (do dia local do usuário) antes de chamar o Gemini.
     """
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
+    if not gemini.is_configured():
         return {
             'target_amount': None,
             'start_date': None,
@@ -76,22 +412,29 @@ def parse_goal_text(raw_text: str) -> dict:
             'name': None
         }
 
-    client = genai.Client(api_key=api_key)
-    config = types.GenerateContentConfig(
-        system_instruction=(
-            "Você é um parser de metas financeiras. "
-            "Extraia do texto um JSON com as chaves: "
-            "target_amount, start_date, end_date, frequency, name."
-        ),
-        max_output_tokens=256,
-        temperature=0
-    )
-    chat = client.chats.create(model=MODEL_ID, config=config)
-    prompt = f"Meta: \"{raw_text}\""
-    resposta = chat.send_message(prompt).text
+    today = user_today(user)
+    cached = parse_cache.get('goal', raw_text, GOAL_PROMPT_VERSION, today)
+    if cached is not None:
+        return cached
 
     try:
-        return json.loads(resposta)
+        resposta = gemini.generate_text(
+            f"Meta: \"{raw_text}\"",
+            system_instruction=(
+                "Você é um parser de metas financeiras. "
+                "Extraia do texto um JSON com as chaves: "
+                "target_amount, start_date, end_date, frequency, name."
+            ),
+            max_output_tokens=256,
+            temperature=0,
+            purpose='parse'
+        )
+    except gemini.GeminiUnavailable as exc:
+        logger.warning("Parse de meta sem Gemini: %s", exc)
+        resposta = ''
+
+    try:
+        result = json.loads(resposta)
     except json.JSONDecodeError:
         return {
             'target_amount': None,
@@ -100,90 +443,350 @@ def parse_goal_text(raw_text: str) -> dict:
             'frequency': None,
             'name': None
         }
-    
+    if isinstance(result, dict):
+        parse_cache.put('goal', raw_text, GOAL_PROMPT_VERSION, result, today)
+    return result
+
+CSV_CHUNK_SIZE = 2000
+
+class _Echo:
+    """
+    Pseudo-buffer para o csv.writer: em vez de acumular, devolve a linha escrita.
+    """
+    def write(self, value):
+        return value
+
 def generate_transactions_csv(user):
     """
-    Retorna um buffer CSV com todas as transações do usuário.
+    Gera o CSV com todas as transações do usuário como um iterador de bytes.
+    As linhas são lidas do banco em blocos (server-side) com a categoria já
+    unida via JOIN, de modo que a memória fica constante e o cabeçalho sai
+    antes de qualquer consulta terminar.
     """
-    qs = Transaction.objects.filter(user=user).order_by('-timestamp')
-    buffer = StringIO()
-    writer = csv.writer(buffer)
+    qs = (
+        Transaction.objects
+        .filter(user=user)
+        .select_related('category')
+        .only('id', 'timestamp', 'amount', 'type', 'metadata', 'raw_text', 'category__name')
+        .order_by('-timestamp')
+    )
+    writer = csv.writer(_Echo())
     # Cabeçalho
-    writer.writerow(['ID','Data','Categoria','Valor','Tipo','Local','Descrição'])
-    # Linhas
-    for t in qs:
-        writer.writerow([
+    yield writer.writerow(['ID','Data','Categoria','Valor','Tipo','Local','Descrição']).encode('utf-8')
+    # Linhas, agrupadas por bloco lido do banco
+    lines = []
+    for t in qs.iterator(chunk_size=CSV_CHUNK_SIZE):
+        lines.append(writer.writerow([
             t.id,
             t.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             t.category.name if t.category else '',
             f"{t.amount:.2f}",
-            t.metadata.get('type',''),
+            t.type,
             t.metadata.get('location',''),
             t.raw_text
-        ])
-    buffer.seek(0)
-    return buffer
+        ]))
+        if len(lines) >= CSV_CHUNK_SIZE:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
 
-def generate_30day_report(user):
+def user_timezone(user):
     """
-    Retorna um dict com totais de receitas, despesas e por categoria nos últimos 30 dias.
+    Fuso horário do usuário (campo `timezone`), ou o padrão do projeto.
     """
-    now = timezone.now()
-    since = now - timedelta(days=30)
-    qs = Transaction.objects.filter(user=user, timestamp__gte=since)
+    try:
+        return ZoneInfo(user.timezone) if user.timezone else timezone.get_default_timezone()
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.get_default_timezone()
 
-    total_expense = qs.filter(metadata__type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_income  = qs.filter(metadata__type='income').aggregate(Sum('amount'))['amount__sum'] or 0
+def user_today(user=None):
+    """
+    Data de hoje no fuso do usuário (ou no do projeto, sem usuário).
+    """
+    if user is None:
+        return timezone.localdate()
+    return timezone.localdate(timezone=user_timezone(user))
 
-    by_category = (
-        qs
-        .values('category__name')
-        .annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        )
-        .order_by('-total')
+def _summary_key(t, tz):
+    return (
+        t.user_id,
+        timezone.localdate(t.timestamp, tz),
+        t.category_id,
+        t.type,
     )
 
+def _bump_summary(user_id, day, category_id, kind, total, count):
+    bucket = DailySummary.objects.filter(user_id=user_id, day=day, category_id=category_id, type=kind)
+    if bucket.update(total=F('total') + total, count=F('count') + count):
+        return
+    try:
+        with db_transaction.atomic():
+            DailySummary.objects.create(
+                user_id=user_id, day=day, category_id=category_id,
+                type=kind, total=total, count=count
+            )
+    except IntegrityError:
+        # Outra requisição criou o mesmo balde entre o UPDATE e o INSERT
+        bucket.update(total=F('total') + total, count=F('count') + count)
+
+def apply_to_daily_summary(transactions, sign=1):
+    """
+    Soma (sign=1) ou subtrai (sign=-1) as transações dos totais diários,
+    agrupando antes por balde para fazer uma escrita por balde.
+    """
+    buckets = defaultdict(lambda: [Decimal(0), 0])
+    timezones = {}
+    for t in transactions:
+        if t.user_id not in timezones:
+            timezones[t.user_id] = user_timezone(t.user)
+        bucket = buckets[_summary_key(t, timezones[t.user_id])]
+        bucket[0] += Decimal(str(t.amount)) * sign
+        bucket[1] += sign
+    for (user_id, day, category_id, kind), (total, count) in buckets.items():
+        _bump_summary(user_id, day, category_id, kind, total, count)
+    if sign < 0 and buckets:
+        DailySummary.objects.filter(
+            user_id__in=timezones, count__lte=0
+        ).delete()
+
+def rebuild_daily_summary(user, days=None):
+    """
+    Recalcula os totais diários do usuário a partir das transações, com um
+    único GROUP BY. Se `days` for informado, refaz apenas esses dias.
+    """
+    tz = user_timezone(user)
+    txs = (
+        Transaction.objects
+        .filter(user=user)
+        .annotate(day=TruncDate('timestamp', tzinfo=tz))
+    )
+    summaries = DailySummary.objects.filter(user=user)
+    if days is not None:
+        if not days:
+            return
+        txs = txs.filter(day__in=days)
+        summaries = summaries.filter(day__in=days)
+
+    grouped = list(
+        txs.values('day', 'category', 'type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+    with db_transaction.atomic():
+        summaries.delete()
+        DailySummary.objects.bulk_create([
+            DailySummary(
+                user=user, day=row['day'], category_id=row['category'],
+                type=row['type'], total=row['total'], count=row['count']
+            )
+            for row in grouped
+        ], batch_size=1000)
+
+def generate_30day_report(user):
+    """
+    Retorna um dict com totais de receitas, despesas e por categoria nos últimos 30 dias.
+    Lê dos totais diários (DailySummary), então o custo depende do número de dias.
+    """
+    today = timezone.localdate(timezone=user_timezone(user))
+    since = today - timedelta(days=30)
+    rows = (
+        DailySummary.objects
+        .filter(user=user, day__gte=since, day__lte=today)
+        .values('category__name', 'type')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by()
+    )
+
+    totals = {Category.EXPENSE: Decimal(0), Category.INCOME: Decimal(0)}
+    by_category = defaultdict(lambda: {'total': Decimal(0), 'count': 0})
+    for row in rows:
+        if row['type'] in totals:
+            totals[row['type']] += row['total']
+        entry = by_category[row['category__name']]
+        entry['total'] += row['total']
+        entry['count'] += row['count']
+
     return {
-        'period_start': since.date().isoformat(),
-        'period_end': now.date().isoformat(),
-        'total_expense': float(total_expense),
-        'total_income': float(total_income),
+        'period_start': since.isoformat(),
+        'period_end': today.isoformat(),
+        'total_expense': float(totals[Category.EXPENSE]),
+        'total_income': float(totals[Category.INCOME]),
         'by_category': [
             {
-                'category': entry['category__name'],
+                'category': name,
                 'total': float(entry['total']),
                 'count': entry['count']
             }
-            for entry in by_category
+            for name, entry in sorted(by_category.items(), key=lambda item: item[1]['total'], reverse=True)
         ]
     }
 
 
-def generate_transactions_pdf(user):
+REPORT_GRANULARITIES = ('day', 'week', 'month')
+REPORT_MAX_DAYS = 5 * 366
+
+def _report_buckets(start, end, granularity):
     """
-    Gera um PDF com uma tabela das transações do usuário.
+    Início de cada período entre start e end: o próprio dia, a segunda-feira
+    da semana ou o dia 1 do mês.
     """
-    qs = Transaction.objects.filter(user=user).order_by('-timestamp')
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    data = [['Data','Categoria','Valor','Tipo','Local','Descrição']]
-    for t in qs:
-        data.append([
+    if granularity == 'week':
+        current = start - timedelta(days=start.weekday())
+    elif granularity == 'month':
+        current = start.replace(day=1)
+    else:
+        current = start
+    while current <= end:
+        yield current
+        if granularity == 'month':
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if granularity == 'week' else 1)
+
+def generate_report(user, start, end, granularity='day', category=None, type=None):
+    """
+    Série de receitas e despesas entre start e end (inclusive), por dia,
+    semana ou mês, opcionalmente só de uma categoria (id) ou de um tipo.
+    Uma única consulta agrupada sobre DailySummary, cujos dias já estão no
+    fuso do usuário; períodos sem movimento aparecem zerados. Semanas e meses
+    das pontas só contam os dias dentro do intervalo.
+    """
+    qs = DailySummary.objects.filter(user=user, day__gte=start, day__lte=end)
+    if category is not None:
+        qs = qs.filter(category_id=category)
+    if type:
+        qs = qs.filter(type=type)
+    bucket = {'day': F('day'), 'week': TruncWeek('day'), 'month': TruncMonth('day')}[granularity]
+    rows = (
+        qs.annotate(bucket=bucket)
+        .values('bucket', 'type')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by()
+    )
+
+    series = {
+        period: {Category.EXPENSE: Decimal(0), Category.INCOME: Decimal(0), 'count': 0}
+        for period in _report_buckets(start, end, granularity)
+    }
+    totals = {Category.EXPENSE: Decimal(0), Category.INCOME: Decimal(0)}
+    for row in rows:
+        entry = series[row['bucket']]
+        entry['count'] += row['count']
+        if row['type'] in totals:
+            entry[row['type']] += row['total']
+            totals[row['type']] += row['total']
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'category': category,
+        'type': type or None,
+        'total_expense': float(totals[Category.EXPENSE]),
+        'total_income': float(totals[Category.INCOME]),
+        'series': [
+            {
+                'period': period.isoformat(),
+                'expense': float(entry[Category.EXPENSE]),
+                'income': float(entry[Category.INCOME]),
+                'count': entry['count']
+            }
+            for period, entry in series.items()
+        ]
+    }
+
+PDF_HEADER = ['Data','Categoria','Valor','Tipo','Local','Descrição']
+PDF_COL_WIDTHS = [58, 80, 58, 48, 80, 144]
+PDF_ROW_HEIGHT = 15
+PDF_MARGIN = 72
+
+def _pdf_cell(value, limit):
+    text = str(value or '').replace('\n', ' ')
+    return text[:limit] + ('...' if len(text) > limit else '')
+
+def transaction_pdf_rows(user):
+    """
+    Itera as linhas da tabela do PDF lendo as transações do banco em blocos,
+    com a categoria unida via JOIN.
+    """
+    qs = (
+        Transaction.objects
+        .filter(user=user)
+        .select_related('category')
+        .only('timestamp', 'amount', 'type', 'metadata', 'raw_text', 'category__name')
+        .order_by('-timestamp')
+    )
+    for t in qs.iterator(chunk_size=CSV_CHUNK_SIZE):
+        yield [
             t.timestamp.strftime('%Y-%m-%d'),
-            t.category.name if t.category else '',
+            _pdf_cell(t.category.name if t.category else '', 15),
             f"{t.amount:.2f}",
-            t.metadata.get('type',''),
-            t.metadata.get('location',''),
-            t.raw_text[:30] + ('...' if len(t.raw_text)>30 else '')
-        ])
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('GRID',       (0,0), (-1,-1), 0.5, colors.grey),
+            t.type,
+            _pdf_cell(t.metadata.get('location',''), 15),
+            _pdf_cell(t.raw_text, 30)
+        ]
+
+def _reportlab():
+    """
+    Partes do reportlab usadas no PDF. A importação (~0,2 s) só acontece na
+    primeira exportação, não em todo processo que carrega este módulo.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+    return SimpleNamespace(colors=colors, letter=letter, canvas=canvas, Table=Table, TableStyle=TableStyle)
+
+def build_transactions_pdf(rows, output, pagesize=None):
+    """
+    Desenha as linhas em `output`, uma tabela de tamanho fixo por página
+    (carta, se `pagesize` não for informado).
+    Cada página é montada e descartada antes da próxima, então o custo de
+    layout é linear no número de linhas e só um bloco fica em memória.
+    Retorna o número de páginas geradas.
+    """
+    rl = _reportlab()
+    pagesize = pagesize or rl.letter
+    width, height = pagesize
+    rows_per_page = int((height - 2 * PDF_MARGIN) // PDF_ROW_HEIGHT) - 1
+    style = rl.TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), rl.colors.lightgrey),
+        ('GRID',       (0,0), (-1,-1), 0.5, rl.colors.grey),
         ('FONTNAME',   (0,0), (-1,0), 'Helvetica-Bold'),
-    ]))
-    doc.build([table])
+        ('FONTSIZE',   (0,0), (-1,-1), 8),
+    ])
+    canv = rl.canvas.Canvas(output, pagesize=pagesize, pageCompression=1)
+    pages = 0
+
+    def draw_page(chunk):
+        table = rl.Table([PDF_HEADER] + chunk, colWidths=PDF_COL_WIDTHS, rowHeights=PDF_ROW_HEIGHT)
+        table.setStyle(style)
+        _, table_height = table.wrapOn(canv, width - 2 * PDF_MARGIN, height - 2 * PDF_MARGIN)
+        table.drawOn(canv, PDF_MARGIN, height - PDF_MARGIN - table_height)
+        canv.showPage()
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == rows_per_page:
+            draw_page(chunk)
+            pages += 1
+            chunk = []
+    if chunk or not pages:
+        draw_page(chunk)
+        pages += 1
+    canv.save()
+    return pages
+
+def generate_transactions_pdf(user):
+    """
+    Gera um PDF com uma tabela das transações do usuário, paginado e gravado
+    em arquivo temporário em vez de memória.
+    """
+    buffer = tempfile.TemporaryFile()
+    with profiling.span('pdf'):
+        build_transactions_pdf(transaction_pdf_rows(user), buffer)
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from core.datacache import bump_data_version
+from . import category_cache
+from .models import Category, Transaction, Goal, DailySummary
+from .services import apply_to_daily_summary, rebuild_daily_summary
+
+
+def _deleted_directly(origin, model):
+    """
+    True quando o delete partiu do próprio modelo (instância ou queryset),
+    e não de um CASCADE vindo do usuário.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, **kwargs):
+    instance._summary_previous = None
+    if instance.pk:
+        instance._summary_previous = (
+            Transaction.objects
+            .select_related('user')
+            .only('user__timezone', 'timestamp', 'category', 'amount', 'type')
+            .filter(pk=instance.pk)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Transaction)
+def update_daily_summary_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_summary_previous', None)
+    if previous is not None:
+        apply_to_daily_summary([previous], sign=-1)
+    apply_to_daily_summary([instance])
+
+
+@receiver(post_delete, sender=Transaction)
+def update_daily_summary_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Transaction):
+        apply_to_daily_summary([instance], sign=-1)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_days(sender, instance, **kwargs):
+    instance._summary_days = list(
+        DailySummary.objects.filter(category=instance).values_list('day', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Category)
+def rebuild_days_of_deleted_category(sender, instance, origin=None, **kwargs):
+    # As transações ficaram sem categoria (SET_NULL) e os totais da categoria
+    # foram apagados em cascata: refaz os dias afetados.
+    if _deleted_directly(origin, Category):
+        rebuild_daily_summary(instance.user, days=instance._summary_days)
+
+
+@receiver(post_save, sender=Category)
+def update_category_cache_on_save(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: category_cache.remember(instance))
+    else:
+        # Renomeada ou mudou de tipo: o mapa do usuário é recarregado na próxima vez
+        category_cache.forget(instance.user_id)
+
+
+@receiver(post_delete, sender=Category)
+def update_category_cache_on_delete(sender, instance, **kwargs):
+    category_cache.forget(instance.user_id)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def invalidate_user_data_cache(sender, instance, **kwargs):
+    # Respostas em cache (relatórios, listagens) dependem desses dados
+    bump_data_version(instance.user_id)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_previous_timezone(sender, instance, update_fields=None, **kwargs):
+    instance._summary_timezone_changed = False
+    if not instance.pk or (update_fields is not None and 'timezone' not in update_fields):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list('timezone', flat=True).first()
+    instance._summary_timezone_changed = previous != instance.timezone
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def rebuild_daily_summary_on_timezone_change(sender, instance, **kwargs):
+    # Os dias dos totais são contados no fuso do usuário
+    if getattr(instance, '_summary_timezone_changed', False):
+        rebuild_daily_summary(instance)
+        bump_data_version(instance.pk)
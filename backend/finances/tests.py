@@ -1,26 +1,46 @@
 import json
 from io import StringIO, BytesIO
-from datetime import timedelta
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, connection, transaction
+from django.db.models.query import QuerySet
+from django.db.models import Q, Sum
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch, MagicMock
 
-from finances.models import Category, Transaction, Goal
+from finances.models import Category, Transaction, Goal, DailySummary, ParseCacheEntry
+from core import metrics
+from finances import category_cache, parse_cache
 from finances.services import (
     parse_transaction_text,
+    parse_transactions_batch,
     parse_goal_text,
-    generate_30day_report
+    fast_parse_transaction,
+    generate_30day_report,
+    generate_report,
+    rebuild_daily_summary,
+    generate_transactions_csv,
+    generate_transactions_pdf,
+    build_transactions_pdf,
+    _bump_summary
 )
 
 User = get_user_model()
 
 class ParseServicesTestCase(TestCase):
+    def setUp(self):
+        parse_cache.clear()
+
     def test_parse_transaction_no_api_key(self):
-        with patch('finances.services.os.getenv', return_value=None):
-            result = parse_transaction_text("gastei 15 reais na padaria")
+        with patch('core.gemini.os.getenv', return_value=None):
+            result = parse_transaction_text("gastei 15 reais naquele lugar")
         self.assertEqual(result, {
             'amount': None,
             'date': None,
@@ -29,8 +49,8 @@ class ParseServicesTestCase(TestCase):
             'type': None
         })
 
-    @patch('finances.services.genai.Client')
-    def test_parse_transaction_success(self, mock_Client):
+    @patch('core.gemini.get_client')
+    def test_parse_transaction_success(self, mock_get_client):
         dummy = {
             'amount': 23.5,
             'date': '2025-05-17',
@@ -38,24 +58,20 @@ class ParseServicesTestCase(TestCase):
             'location': 'Padaria Central',
             'type': 'expense'
         }
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': json.dumps(dummy)})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(dummy)})()
+            mock_get_client.return_value = inst
 
-            result = parse_transaction_text("gastei 23.5 na padaria")
-        self.assertEqual(result, dummy)
+            result = parse_transaction_text("gastei 23.5 naquele lugar")
+        self.assertEqual(result, {**dummy, 'parser': 'llm'})
 
-    @patch('finances.services.genai.Client')
-    def test_parse_transaction_invalid_json(self, mock_Client):
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+    @patch('core.gemini.get_client')
+    def test_parse_transaction_invalid_json(self, mock_get_client):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': 'não é JSON'})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': 'não é JSON'})()
+            mock_get_client.return_value = inst
 
             result = parse_transaction_text("texto irreconhecível")
         self.assertEqual(result, {
@@ -67,7 +83,7 @@ class ParseServicesTestCase(TestCase):
         })
 
     def test_parse_goal_no_api_key(self):
-        with patch('finances.services.os.getenv', return_value=None):
+        with patch('core.gemini.os.getenv', return_value=None):
             result = parse_goal_text("quero poupar 1000 até fim do ano mensalmente")
         self.assertEqual(result, {
             'target_amount': None,
@@ -77,8 +93,8 @@ class ParseServicesTestCase(TestCase):
             'name': None
         })
 
-    @patch('finances.services.genai.Client')
-    def test_parse_goal_success(self, mock_Client):
+    @patch('core.gemini.get_client')
+    def test_parse_goal_success(self, mock_get_client):
         dummy = {
             'target_amount': 1000.0,
             'start_date': '2025-01-01',
@@ -86,24 +102,20 @@ class ParseServicesTestCase(TestCase):
             'frequency': 'monthly',
             'name': 'Poupança Anual'
         }
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': json.dumps(dummy)})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(dummy)})()
+            mock_get_client.return_value = inst
 
             result = parse_goal_text("quero poupar 1000 até dezembro de forma mensal")
         self.assertEqual(result, dummy)
 
-    @patch('finances.services.genai.Client')
-    def test_parse_goal_invalid_json(self, mock_Client):
-        with patch('finances.services.os.getenv', return_value='fake-key'):
+    @patch('core.gemini.get_client')
+    def test_parse_goal_invalid_json(self, mock_get_client):
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
             inst = MagicMock()
-            chat = MagicMock()
-            chat.send_message.return_value = type('R', (), {'text': 'oops'})()
-            inst.chats.create.return_value = chat
-            mock_Client.return_value = inst
+            inst.models.generate_content.return_value = type('R', (), {'text': 'oops'})()
+            mock_get_client.return_value = inst
 
             result = parse_goal_text("texto irreconhecível")
         self.assertEqual(result, {
@@ -115,6 +127,122 @@ class ParseServicesTestCase(TestCase):
         })
 
 
+@override_settings(PARSE_CACHE={**settings.PARSE_CACHE, 'MAX_ENTRIES': 2, 'EVICT_EVERY': 1})
+class ParseCacheTestCase(TestCase):
+    dummy = {'amount': 18, 'date': None, 'category': 'Transporte', 'location': None, 'type': 'expense'}
+
+    def setUp(self):
+        parse_cache.clear()
+        self.env = patch('core.gemini.os.getenv', return_value='fake-key')
+        self.env.start()
+        self.client_patch = patch('core.gemini.get_client')
+        inst = MagicMock()
+        inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(self.dummy)})()
+        self.client_patch.start().return_value = inst
+        self.llm = inst.models.generate_content
+
+    def tearDown(self):
+        self.client_patch.stop()
+        self.env.stop()
+
+    def test_normalized_repeat_hits_memory(self):
+        self.assertEqual(parse_transaction_text('Paguei 18 pro João'), {**self.dummy, 'parser': 'llm'})
+        with self.assertNumQueries(0):
+            self.assertEqual(parse_transaction_text('  paguei   18 pro joão '), {**self.dummy, 'parser': 'cache'})
+        self.assertEqual(self.llm.call_count, 1)
+
+    def test_database_layer_shared_between_processes(self):
+        parse_transaction_text('paguei 18 pro joão')
+        parse_cache.clear()  # simula outro processo, com LRU vazio
+        self.assertEqual(parse_transaction_text('paguei 18 pro joão'), {**self.dummy, 'parser': 'cache'})
+        self.assertEqual(self.llm.call_count, 1)
+
+    def test_expired_entry_is_a_miss(self):
+        parse_transaction_text('paguei 18 pro joão')
+        parse_cache.clear()
+        ParseCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=2))
+        parse_transaction_text('paguei 18 pro joão')
+        self.assertEqual(self.llm.call_count, 2)
+
+    def test_entries_are_anchored_to_the_local_day(self):
+        # "nos próximos 3 meses" vira datas absolutas: não vale no dia seguinte
+        text = 'poupar 1000 nos próximos 3 meses'
+        with patch('finances.services.user_today', return_value=date(2025, 1, 10)):
+            parse_goal_text(text)
+            parse_goal_text(text)
+        self.assertEqual(self.llm.call_count, 1)
+        with patch('finances.services.user_today', return_value=date(2025, 1, 11)):
+            parse_goal_text(text)
+        self.assertEqual(self.llm.call_count, 2)
+
+    def test_unanswered_batch_is_retried_once_in_halves(self):
+        def reply(**kwargs):
+            count = kwargs['contents'].count('\n')
+            if count > 13 or count <= 2:
+                return type('R', (), {'text': '[{"index": 0, "amount'})()  # JSON cortado
+            items = [{'index': i, 'amount': i, 'category': 'Outros', 'type': 'expense'} for i in range(count)]
+            return type('R', (), {'text': json.dumps(items)})()
+
+        self.llm.side_effect = reply
+        metrics.reset()
+        results = parse_transactions_batch([f'coisa {chr(97 + i % 26) * (1 + i // 26)}' for i in range(27)])
+        # Blocos de 25 e 2 falham; as metades 13 e 12 respondem, as de 1 ficam sem parse
+        self.assertEqual(self.llm.call_count, 6)
+        self.assertEqual([r['amount'] is None for r in results].count(True), 2)
+        self.assertEqual(metrics.counter('parser.unparsed'), 2)
+
+    def test_table_is_bounded(self):
+        for value in (18, 19, 20, 21):
+            parse_transaction_text(f'paguei {value} pro joão')
+        self.assertLessEqual(ParseCacheEntry.objects.count(), 2)
+
+
+class FastParserTestCase(TestCase):
+    today = date(2025, 5, 20)
+
+    def parse(self, text, categories=()):
+        return fast_parse_transaction(text, categories, self.today)
+
+    def test_brazilian_amounts(self):
+        self.assertEqual(self.parse('almoço 35 reais')['amount'], 35.0)
+        self.assertEqual(self.parse('R$ 1.234,56 aluguel')['amount'], 1234.56)
+        self.assertEqual(self.parse('gasolina 15,50')['amount'], 15.5)
+        self.assertEqual(self.parse('farmácia 1.234')['amount'], 1234.0)
+
+    def test_dates(self):
+        self.assertEqual(self.parse('uber 18')['date'], '2025-05-20')
+        self.assertEqual(self.parse('uber 18 ontem')['date'], '2025-05-19')
+        parsed = self.parse('mercado dia 15/05 120 reais')
+        self.assertEqual((parsed['amount'], parsed['date']), (120.0, '2025-05-15'))
+
+    def test_user_category_wins_over_keywords(self):
+        parsed = self.parse('uber 18 pra academia', [('Academia', 'expense')])
+        self.assertEqual((parsed['category'], parsed['type']), ('Academia', 'expense'))
+        self.assertEqual(self.parse('uber 18')['category'], 'Transporte')
+
+    def test_income(self):
+        parsed = self.parse('recebi salário 5.000')
+        self.assertEqual((parsed['amount'], parsed['category'], parsed['type']), (5000.0, 'Salário', 'income'))
+        self.assertEqual(self.parse('recebi 200 do freela', [('Freela', 'expense')])['type'], 'income')
+
+    def test_low_confidence_returns_none(self):
+        self.assertIsNone(self.parse('texto sem valor'))
+        self.assertIsNone(self.parse('paguei 18 pro joão'))
+        self.assertIsNone(self.parse('uber 18 e 25'))
+
+    @patch('core.gemini.get_client')
+    def test_fast_path_skips_llm(self, mock_get_client):
+        user = User.objects.create_user('fp', 'fp@x.com', 'pass')
+        Category.objects.create(user=user, name='Academia', type='expense')
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
+            parsed = parse_transaction_text('academia 99,90', user=user)
+        mock_get_client.assert_not_called()
+        self.assertEqual(
+            (parsed['amount'], parsed['category'], parsed['parser']),
+            (99.9, 'Academia', 'fast_path')
+        )
+
+
 class ReportServicesTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user('u', 'u@u.com', 'pass')
@@ -143,8 +271,233 @@ class ReportServicesTestCase(TestCase):
         self.assertEqual(entry['count'], 1)
 
 
+class RangeReportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('r', 'r@r.com', 'pass', timezone='America/Sao_Paulo')
+        self.food = Category.objects.create(user=self.user, name='Comida', type='expense')
+        self.salary = Category.objects.create(user=self.user, name='Salário', type='income')
+        utc = timezone.get_fixed_timezone(0)
+        for when, category, amount in [
+            (timezone.datetime(2025, 1, 6, 15, tzinfo=utc), self.food, 10),
+            (timezone.datetime(2025, 1, 8, 15, tzinfo=utc), self.food, 20),
+            (timezone.datetime(2025, 1, 20, 15, tzinfo=utc), self.salary, 1000),
+            # 01:00 UTC de 1º de fevereiro ainda é 31 de janeiro em São Paulo
+            (timezone.datetime(2025, 2, 1, 1, tzinfo=utc), self.food, 5),
+            (timezone.datetime(2025, 3, 3, 15, tzinfo=utc), self.food, 40),
+        ]:
+            Transaction.objects.create(
+                user=self.user, category=category, type=category.type, amount=amount,
+                raw_text='r', timestamp=when
+            )
+
+    def test_monthly_series_in_user_timezone(self):
+        with self.assertNumQueries(1):
+            report = generate_report(self.user, date(2025, 1, 1), date(2025, 3, 31), 'month')
+        self.assertEqual([p['period'] for p in report['series']], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        self.assertEqual(report['series'][0]['expense'], 35.0)
+        self.assertEqual(report['series'][0]['income'], 1000.0)
+        self.assertEqual(report['series'][1], {'period': '2025-02-01', 'expense': 0.0, 'income': 0.0, 'count': 0})
+        self.assertEqual(report['total_expense'], 75.0)
+
+    def test_weekly_and_daily_buckets(self):
+        weekly = generate_report(self.user, date(2025, 1, 8), date(2025, 1, 21), 'week')
+        # Semanas começam na segunda; a primeira só conta a partir de start
+        self.assertEqual([p['period'] for p in weekly['series']], ['2025-01-06', '2025-01-13', '2025-01-20'])
+        self.assertEqual([p['expense'] for p in weekly['series']], [20.0, 0.0, 0.0])
+        daily = generate_report(self.user, date(2025, 1, 1), date(2025, 12, 31), 'day')
+        self.assertEqual(len(daily['series']), 365)
+
+    def test_filters(self):
+        report = generate_report(self.user, date(2025, 1, 1), date(2025, 3, 31), 'month', type='income')
+        self.assertEqual((report['total_expense'], report['total_income']), (0.0, 1000.0))
+        report = generate_report(self.user, date(2025, 1, 1), date(2025, 3, 31), 'month', category=self.food.id)
+        self.assertEqual((report['total_expense'], report['total_income']), (75.0, 0.0))
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = '/finances/transactions/report/'
+        resp = client.get(url, {'start': '2025-01-01', 'end': '2025-03-31', 'granularity': 'month'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()['series']), 3)
+        self.assertIn('ETag', resp)
+
+        resp = client.get(url)
+        self.assertEqual(len(resp.json()['series']), 30)
+
+        self.assertEqual(client.get(url, {'start': '2025-02-01', 'end': '2025-01-01'}).status_code, 400)
+        self.assertEqual(client.get(url, {'granularity': 'year'}).status_code, 400)
+        self.assertEqual(client.get(url, {'start': '2015-01-01', 'end': '2025-01-01'}).status_code, 400)
+
+
+class DailySummaryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('roll', 'roll@x.com', 'pass')
+        self.cat = Category.objects.create(user=self.user, name='Mercado', type='expense')
+
+    def buckets(self):
+        return sorted(
+            DailySummary.objects.filter(user=self.user)
+            .values_list('category__name', 'type', 'total', 'count')
+        )
+
+    def test_create_update_delete_keep_totals(self):
+        t = Transaction.objects.create(
+            user=self.user, category=self.cat, amount=50,
+            raw_text='r', metadata={'type': 'expense'}
+        )
+        Transaction.objects.create(
+            user=self.user, category=self.cat, amount=25,
+            raw_text='r', metadata={'type': 'expense'}
+        )
+        self.assertEqual(self.buckets(), [('Mercado', 'expense', 75, 2)])
+
+        t.amount = 10
+        t.save()
+        self.assertEqual(self.buckets(), [('Mercado', 'expense', 35, 2)])
+
+        t.delete()
+        self.assertEqual(self.buckets(), [('Mercado', 'expense', 25, 1)])
+
+    def test_category_delete_moves_totals_to_uncategorized(self):
+        Transaction.objects.create(
+            user=self.user, category=self.cat, amount=40,
+            raw_text='r', metadata={'type': 'expense'}
+        )
+        self.cat.delete()
+        self.assertEqual(self.buckets(), [(None, 'expense', 40, 1)])
+
+    def test_rebuild_matches_incremental(self):
+        for days in (0, 1, 1, 5):
+            Transaction.objects.create(
+                user=self.user, category=self.cat, amount=10,
+                raw_text='r', metadata={'type': 'expense'},
+                timestamp=timezone.now() - timedelta(days=days)
+            )
+        incremental = sorted(DailySummary.objects.values_list('day', 'total', 'count'))
+        rebuild_daily_summary(self.user)
+        rebuilt = sorted(DailySummary.objects.values_list('day', 'total', 'count'))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(len(rebuilt), 3)
+
+    def test_uncategorized_bucket_is_unique(self):
+        day = timezone.localdate()
+        DailySummary.objects.create(user=self.user, day=day, category=None, type='expense', total=10, count=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySummary.objects.create(user=self.user, day=day, category=None, type='expense', total=5, count=1)
+
+    def test_concurrent_first_insert_of_uncategorized_bucket(self):
+        # Simula outra requisição criando o balde entre o UPDATE e o INSERT
+        day = timezone.localdate()
+        DailySummary.objects.create(user=self.user, day=day, category=None, type='expense', total=10, count=1)
+        original = QuerySet.update
+        calls = []
+
+        def update(qs, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else original(qs, **kwargs)
+
+        with patch.object(QuerySet, 'update', update):
+            _bump_summary(self.user.id, day, None, 'expense', Decimal(5), 1)
+        self.assertEqual(self.buckets(), [(None, 'expense', 15, 2)])
+
+    def test_report_reads_rollup_in_one_query(self):
+        Transaction.objects.create(
+            user=self.user, category=self.cat, amount=10,
+            raw_text='r', metadata={'type': 'expense'}
+        )
+        with self.assertNumQueries(1):
+            report = generate_30day_report(self.user)
+        self.assertEqual(report['total_expense'], 10.0)
+
+
+class TransactionIndexTestCase(TestCase):
+    """
+    Garante (via EXPLAIN) que as consultas de relatórios e exportação usam
+    os índices compostos de Transaction.
+    """
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('planos verificados apenas no SQLite')
+        self.user = User.objects.create_user('idx', 'idx@x.com', 'pass')
+        cat = Category.objects.create(user=self.user, name='Cat', type='expense')
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, category=cat, amount=i, raw_text='r',
+                        type='income' if i % 3 == 0 else 'expense')
+            for i in range(50)
+        ])
+
+    def test_user_timeline_uses_user_timestamp_index(self):
+        plan = Transaction.objects.filter(user=self.user).order_by('-timestamp').explain()
+        self.assertIn('transaction_user_ts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_keyset_page_uses_index_without_sort(self):
+        now = timezone.now()
+        plan = (
+            Transaction.objects
+            .filter(Q(timestamp__lt=now) | Q(timestamp=now, id__lt=10), user=self.user, timestamp__lte=now)
+            .order_by('-timestamp', '-id')[:51]
+            .explain()
+        )
+        # Faixa no índice: as linhas mais novas que o cursor nem são lidas
+        self.assertIn('transaction_user_ts_idx (user_id=? AND timestamp<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_type_range_uses_user_type_timestamp_index(self):
+        since = timezone.now() - timedelta(days=30)
+        plan = (
+            Transaction.objects
+            .filter(user=self.user, type='expense', timestamp__gte=since)
+            .order_by('-timestamp')
+            .explain()
+        )
+        self.assertIn('transaction_user_type_ts_idx', plan)
+
+
+class ExportServicesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('exp', 'exp@x.com', 'pass')
+        for i in range(3):
+            cat = Category.objects.create(user=self.user, name=f'Cat{i}', type='expense')
+            Transaction.objects.create(
+                user=self.user, category=cat, amount=10 + i,
+                raw_text=f'gasto {i}', metadata={'type': 'expense', 'location': 'Loja'}
+            )
+        Transaction.objects.create(user=self.user, amount=5, raw_text='sem categoria')
+
+    def test_csv_is_lazy_generator(self):
+        gen = generate_transactions_csv(self.user)
+        # Cabeçalho sai sem tocar o banco
+        with self.assertNumQueries(0):
+            header = next(gen)
+        self.assertTrue(header.startswith(b'ID,Data,Categoria'))
+
+    def test_csv_rows_in_single_query(self):
+        with self.assertNumQueries(1):
+            content = b''.join(generate_transactions_csv(self.user)).decode('utf-8')
+        lines = content.strip().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn('Cat0', content)
+        self.assertIn('sem categoria', content)
+
+    def test_pdf_rows_in_single_query(self):
+        with self.assertNumQueries(1):
+            buffer = generate_transactions_pdf(self.user)
+        with buffer:
+            self.assertEqual(buffer.read(4), b'%PDF')
+
+    def test_pdf_paginates_in_fixed_chunks(self):
+        rows = ([f'2025-01-{i % 28 + 1:02d}', 'Cat', '1.00', 'expense', '', 'linha'] for i in range(100))
+        output = BytesIO()
+        pages = build_transactions_pdf(rows, output)
+        self.assertEqual(pages, 3)
+        self.assertTrue(output.getvalue().startswith(b'%PDF'))
+
+
 class FinancesAPITestCase(TestCase):
     def setUp(self):
+        category_cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user('fin', 'fin@x.com', 'pass')
         self.client.force_authenticate(user=self.user)
@@ -193,16 +546,218 @@ class FinancesAPITestCase(TestCase):
         payload = {'raw_text': 'gastei 15 reais na padaria', 'amount':'0'}
         resp = self.client.post(self.trans_url, payload, format='json')
         self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
-        mock_parse.assert_called_once_with('gastei 15 reais na padaria')
+        mock_parse.assert_called_once_with('gastei 15 reais na padaria', user=self.user)
         self.assertEqual(resp.data['metadata'], mock_parse.return_value)
         self.assertEqual(resp.data['amount'], '15.00')
         cat = Category.objects.get(user=self.user, name='Padaria', type='expense')
         self.assertEqual(resp.data['category'], cat.id)
 
+    @patch('core.gemini.get_client')
+    def test_bulk_create_endpoint(self, mock_get_client):
+        parse_cache.clear()
+        # "uber 18" e "salário 5000" saem do parser local; só os outros vão ao Gemini
+        batch = [
+            {'index': 0, 'amount': 35, 'category': 'Alimentação', 'type': 'expense'},
+            {'index': 1, 'amount': None, 'category': 'Alimentação', 'type': 'expense'},
+        ]
+        inst = MagicMock()
+        inst.models.generate_content.return_value = type('R', (), {'text': json.dumps(batch)})()
+        mock_get_client.return_value = inst
+        texts = ['uber 18', 'comida 35 pila', 'comida', 'salário 5000']
+
+        with patch('core.gemini.os.getenv', return_value='fake-key'):
+            resp = self.client.post(f'{self.trans_url}bulk_create/', {'texts': texts}, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(inst.models.generate_content.call_count, 1)
+        self.assertEqual((resp.data['created'], resp.data['failed']), (3, 1))
+        self.assertEqual([r['status'] for r in resp.data['results']], ['created', 'created', 'error', 'created'])
+        self.assertEqual(resp.data['results'][3]['transaction']['type'], 'income')
+        self.assertEqual(
+            [resp.data['results'][i]['transaction']['metadata']['parser'] for i in (0, 1, 3)],
+            ['fast_path', 'llm', 'fast_path']
+        )
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            DailySummary.objects.filter(user=self.user, type='expense').aggregate(Sum('total'))['total__sum'],
+            53
+        )
+
+    def test_bulk_create_queries_do_not_grow_with_items(self):
+        def run(count):
+            parsed = [{'amount': 10, 'category': f'Cat{i % 3}', 'type': 'expense'} for i in range(count)]
+            with patch('finances.services.parse_transactions_batch', return_value=parsed), \
+                 self.captureOnCommitCallbacks(execute=True), \
+                 CaptureQueriesContext(connection) as ctx:
+                self.client.post(f'{self.trans_url}bulk_create/', {'texts': ['x'] * count}, format='json')
+            return len(ctx.captured_queries)
+
+        run(3)  # categorias já existem nas próximas chamadas
+        self.assertEqual(run(5), run(50))
+
+    def test_long_llm_category_names_are_truncated(self):
+        long_name = 'Despesas ' + 'muito ' * 20
+        parsed = [
+            {'amount': 10, 'category': long_name, 'type': 'expense'},
+            {'amount': 5, 'category': ['não', 'é', 'texto'], 'type': 'expense'},
+        ]
+        with patch('finances.services.parse_transactions_batch', return_value=parsed):
+            resp = self.client.post(f'{self.trans_url}bulk_create/', {'texts': ['a', 'b']}, format='json')
+        self.assertEqual(resp.data['created'], 2)
+        with patch('finances.views.parse_transaction_text', return_value={'amount': 1, 'category': long_name}):
+            resp = self.client.post(self.trans_url, {'raw_text': 'c', 'amount': '1'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        names = Category.objects.filter(user=self.user).values_list('name', flat=True)
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(len(name) <= 50 for name in names))
+
+    def test_category_resolution_is_cached_and_normalized(self):
+        Category.objects.create(user=self.user, name='Alimentação', type='expense')
+        first = category_cache.resolve(self.user, 'alimentacao', 'expense')
+        with self.assertNumQueries(0):
+            self.assertEqual(category_cache.resolve(self.user, ' ALIMENTAÇÃO ', 'expense'), first)
+        # Tipo diferente é outra categoria, que entra no mapa após o commit
+        with self.captureOnCommitCallbacks(execute=True):
+            income = category_cache.resolve(self.user, 'Alimentação', 'income')
+        with self.assertNumQueries(0):
+            self.assertEqual(category_cache.resolve(self.user, 'alimentação', 'income'), income)
+        self.assertNotEqual(first, income)
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+
+    def test_category_cache_follows_rename_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cat = category_cache.resolve(self.user, 'Mercado', 'expense')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'{self.cat_url}{cat.id}/', {'name': 'Supermercado'}, format='json')
+        self.assertEqual(category_cache.resolve(self.user, 'supermercado', 'expense').id, cat.id)
+        self.assertNotEqual(category_cache.resolve(self.user, 'mercado', 'expense').id, cat.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{self.cat_url}{cat.id}/')
+        recreated = category_cache.resolve(self.user, 'Supermercado', 'expense')
+        self.assertNotEqual(recreated.id, cat.id)
+        self.assertTrue(Category.objects.filter(pk=recreated.pk).exists())
+
+    def test_category_changed_by_another_process_is_not_reused(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cat = category_cache.resolve(self.user, 'Mercado', 'expense')
+        # Este processo guarda o mapa; outro renomeia e depois apaga a categoria
+        stale = dict(category_cache._cache())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'{self.cat_url}{cat.id}/', {'name': 'Supermercado'}, format='json')
+        category_cache._cache().update(stale)
+        self.assertNotEqual(category_cache.resolve(self.user, 'mercado', 'expense').id, cat.id)
+
+        stale = dict(category_cache._cache())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{self.cat_url}{cat.id}/')
+        category_cache._cache().update(stale)
+        with patch('finances.views.parse_transaction_text', return_value={'amount': 5, 'category': 'Supermercado'}):
+            resp = self.client.post(self.trans_url, {'raw_text': 'feira', 'amount': '5'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(Transaction.objects.get(pk=resp.data['id']).category_id, cat.id)
+
+    def test_category_created_by_another_process_is_reused(self):
+        category_cache.resolve(self.user, 'Outros', 'expense')  # mapa carregado
+        # Outro processo cria a categoria sem passar pelos signals deste
+        Category.objects.bulk_create([Category(user=self.user, name='Farmácia', type='expense')])
+        cat = category_cache.resolve(self.user, 'farmacia', 'expense')
+        self.assertEqual(cat.name, 'Farmácia')
+        self.assertEqual(Category.objects.filter(user=self.user, type='expense').count(), 2)
+
+    def test_concurrent_creation_of_same_category(self):
+        # A outra requisição insere o mesmo nome entre a recarga do mapa e o INSERT
+        original = Category.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            original([Category(user=self.user, name='Padaria', type='expense')])
+            return original(objs, **kwargs)
+
+        with patch.object(Category.objects, 'bulk_create', side_effect=racing_bulk_create):
+            cat = category_cache.resolve(self.user, 'Padaria', 'expense')
+        self.assertEqual(Category.objects.filter(user=self.user, name='Padaria').get(), cat)
+
+    def test_transactions_keyset_pagination(self):
+        cat = Category.objects.create(user=self.user, name='Cat', type='expense')
+        same = timezone.now() - timedelta(days=1)
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, category=cat, amount=i, raw_text=f't{i}',
+                        timestamp=same if i < 4 else timezone.now() - timedelta(hours=i))
+            for i in range(7)
+        ])
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-timestamp', '-id').values_list('id', flat=True))
+
+        seen, pages, url = [], [], f'{self.trans_url}?page_size=3'
+        while url:
+            with self.assertNumQueries(1):
+                resp = self.client.get(url)
+            pages.append(resp.data)
+            seen += [t['id'] for t in resp.data['results']]
+            url = resp.data['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p['results']) for p in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.client.get(pages[2]['previous'])
+        self.assertEqual([t['id'] for t in back.data['results']], expected[3:6])
+        self.assertEqual(self.client.get(back.data['previous']).data['results'], pages[0]['results'])
+
+        with self.settings(PAGINATION={'PAGE_SIZE': 50, 'MAX_PAGE_SIZE': 2}):
+            self.assertEqual(len(self.client.get(f'{self.trans_url}?page_size=500').data['results']), 2)
+        self.assertEqual(self.client.get(f'{self.trans_url}?cursor=lixo').status_code, 404)
+
+    def test_report_etag_and_version_cache(self):
+        cache.clear()
+        url = f'{self.trans_url}report_30days/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            cached = self.client.get(url)
+        self.assertEqual((cached.data, cached['ETag']), (first.data, etag))
+
+        cat = Category.objects.create(user=self.user, name='Lazer', type='expense')
+        Transaction.objects.create(user=self.user, category=cat, amount=40, raw_text='cinema')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.data['total_expense'], 40)
+        self.assertIsNotNone(metrics.snapshot()['gauges']['data_cache.hit_ratio'])
+
+    def test_report_etag_follows_the_users_local_date(self):
+        cache.clear()
+        url = f'{self.trans_url}report_30days/'
+        etags = []
+        # UTC+14 e UTC-11 nunca estão no mesmo dia
+        for tz in ('Pacific/Kiritimati', 'Pacific/Niue'):
+            self.user.timezone = tz
+            self.user.save(update_fields=['timezone'])
+            etags.append(self.client.get(url)['ETag'])
+        self.assertNotEqual(*etags)
+
+    def test_bulk_create_invalidates_goal_and_transaction_lists(self):
+        cache.clear()
+        before = self.client.get(self.trans_url)
+        with patch('finances.services.parse_transactions_batch',
+                   return_value=[{'amount': 10, 'category': 'Cat', 'type': 'expense'}]):
+            self.client.post(f'{self.trans_url}bulk_create/', {'texts': ['x']}, format='json')
+        after = self.client.get(self.trans_url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual((after.status_code, len(after.data['results'])), (200, 1))
+
+        goals = self.client.get(self.goal_url)
+        Goal.objects.create(user=self.user, name='Viagem', target_amount=1000,
+                            start_date='2025-01-01', end_date='2025-12-31', frequency='monthly')
+        self.assertEqual(len(self.client.get(self.goal_url, HTTP_IF_NONE_MATCH=goals['ETag']).data), 1)
+
     def test_export_csv_endpoint(self):
         resp = self.client.get(f'{self.trans_url}export_csv/')
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp['Content-Type'], 'text/csv')
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('ID,Data,Categoria'))
 
     def test_export_pdf_endpoint(self):
         resp = self.client.get(f'{self.trans_url}export_pdf/')
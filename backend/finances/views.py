@@ -1,12 +1,22 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
 from django.http import StreamingHttpResponse
 from rest_framework.decorators import action
+from . import category_cache
 from .models import Category, Transaction, Goal
-from .serializers import CategorySerializer, TransactionSerializer, GoalSerializer
-from .services import parse_transaction_text, parse_goal_text, generate_transactions_csv, generate_30day_report, generate_transactions_pdf
+from .serializers import (
+    CategorySerializer, TransactionSerializer, GoalSerializer, TransactionBulkCreateSerializer,
+    ReportQuerySerializer
+)
+from .services import (
+    parse_transaction_text, parse_goal_text, generate_transactions_csv, generate_30day_report, generate_report,
+    generate_transactions_pdf, transaction_type, category_name, bulk_create_transactions
+)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.http import FileResponse
+from core.datacache import cache_by_data_version
+from core.pagination import KeysetPagination
+from core.throttling import LLMThrottleMixin
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -19,43 +29,66 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(LLMThrottleMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class   = TransactionSerializer
+    pagination_class   = KeysetPagination
+    llm_actions        = ('create', 'bulk_create')
 
     def get_queryset(self):
         return Transaction.objects.filter(user=self.request.user)
 
+    @cache_by_data_version('transactions')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         raw = serializer.validated_data.get('raw_text')
-        parsed = parse_transaction_text(raw)
+        parsed = parse_transaction_text(raw, user=self.request.user)
 
-        # Trata categoria (cria se não existir)
-        cat_name = parsed.get('category') or 'Outros'
-        cat_type = parsed.get('type') or Category.EXPENSE
-        category, _ = Category.objects.get_or_create(
-            user=self.request.user,
-            name=cat_name,
-            type=cat_type
-        )
+        # Trata categoria (cria se não existir), pelo mapa em memória do usuário
+        cat_name = category_name(parsed)
+        cat_type = transaction_type(parsed)
+        category = category_cache.resolve(self.request.user, cat_name, cat_type)
 
         # Salva a transação com os dados parseados
         serializer.save(
             user=self.request.user,
             category=category,
+            type=cat_type,
             amount=parsed.get('amount') or serializer.validated_data['amount'],
             metadata=parsed
         )
 
+    @action(detail=False, methods=['post'], url_path='bulk_create')
+    def bulk_create(self, request):
+        """
+        POST /finances/transactions/bulk_create/
+        Recebe {"texts": [...]} e cria uma transação por texto, com parse em lote.
+        Retorna o resultado de cada item (criado ou erro) na ordem enviada.
+        """
+        serializer = TransactionBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_create_transactions(request.user, serializer.validated_data['texts'])
+
+        created = 0
+        for item in results:
+            if item['status'] == 'created':
+                item['transaction'] = TransactionSerializer(item['transaction']).data
+                created += 1
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def export_csv(self, request):
         """
         GET /finances/transactions/export_csv/
-        Retorna todas as transações do usuário em CSV.
+        Retorna todas as transações do usuário em CSV, enviado à medida que é gerado.
         """
-        buffer = generate_transactions_csv(request.user)
         resp = StreamingHttpResponse(
-            buffer,
+            generate_transactions_csv(request.user),
             content_type='text/csv'
         )
         resp['Content-Disposition'] = (
@@ -78,6 +111,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @cache_by_data_version('report_30days')
     def report_30days(self, request):
         """
         GET /finances/transactions/report_30days/
@@ -86,16 +120,33 @@ class TransactionViewSet(viewsets.ModelViewSet):
         data = generate_30day_report(request.user)
         return Response(data)
 
-class GoalViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @cache_by_data_version('report')
+    def report(self, request):
+        """
+        GET /finances/transactions/report/?start=&end=&granularity=day|week|month&category=&type=
+        Receitas e despesas por período entre start e end (padrão: últimos 30 dias).
+        """
+        params = ReportQuerySerializer(data=request.query_params, context={'request': request})
+        params.is_valid(raise_exception=True)
+        data = generate_report(request.user, **params.validated_data)
+        return Response(data)
+
+class GoalViewSet(LLMThrottleMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class   = GoalSerializer
+    llm_actions        = ('create',)
     
     def get_queryset(self):
         return Goal.objects.filter(user=self.request.user)
 
+    @cache_by_data_version('goals')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         raw = serializer.validated_data.get('name')  # ou outro campo que você use para descrever
-        parsed = parse_goal_text(raw)
+        parsed = parse_goal_text(raw, self.request.user)
 
         # Salva a Goal usando os campos parseados
         serializer.save(
@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 
@@ -88,6 +89,39 @@ class UserAPITestCase(TestCase):
         self.assertEqual(resp2.cookies['access'].value, '')
         self.assertEqual(resp2.cookies['refresh'].value, '')
 
+    def test_cached_user_resolution(self):
+        self.client.post(self.register_url, self.user_data, format='json')
+        login = self.client.post(self.login_url, {
+            'username': self.user_data['username'],
+            'password': self.user_data['password']
+        }, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + login.cookies['access'].value)
+
+        self.client.get(self.profile_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_200_OK)
+
+        # alterar o perfil invalida a entrada; a próxima leitura vê o nome novo
+        self.client.put(self.update_url, {'first_name': 'Changed'}, format='json')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.profile_url).data['first_name'], 'Changed')
+
+        self.client.post(self.logout_url, {}, format='json')
+        with self.assertNumQueries(1):
+            self.client.get(self.profile_url)
+
+    @override_settings(AUTH_CACHE={**settings.AUTH_CACHE, 'ENABLED': False})
+    def test_user_cache_disabled(self):
+        self.client.post(self.register_url, self.user_data, format='json')
+        login = self.client.post(self.login_url, {
+            'username': self.user_data['username'],
+            'password': self.user_data['password']
+        }, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + login.cookies['access'].value)
+        self.client.get(self.profile_url)
+        with self.assertNumQueries(1):
+            self.client.get(self.profile_url)
+
     def test_invalid_login(self):
         resp = self.client.post(self.login_url, {
             'username': 'wrong',
@@ -7,7 +7,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import User
 from .serializers import UserSerializer
-from core.authentication import CookieJWTAuthentication
+from core.authentication import CookieJWTAuthentication, forget_token
 
 
 class UserViewSet(viewsets.GenericViewSet):
@@ -108,6 +108,7 @@ class UserViewSet(viewsets.GenericViewSet):
                 token.blacklist()
             except Exception:
                 pass
+        forget_token(request.auth)
 
         resp = Response({'message': 'Logout realizado com sucesso.'}, status=status.HTTP_200_OK)
         resp.delete_cookie('access', path='/')